@@ -1,17 +1,199 @@
-from typing import Dict, DefaultDict, List, Optional, Tuple
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    DefaultDict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    OrderedDict,
+    Tuple,
+    Union,
+)
+import bisect
 import collections
 import dataclasses
 import hashlib
+import struct
 
 from cryptography.hazmat.primitives.asymmetric import ec
 
 import blocks
 import crypto
 import transactions as transacts
+import verification
+
+
+class Outputs:
+    """Unspent outputs of an address in order of creation, as a list would keep them. Outputs are
+    indexed by hash, so appending, removing and checking for an output take constant time. The
+    same hash can occur more than once, e.g. rewards to the same receiver, in which case the
+    first is removed as with a list. Outputs restored by an undo regain their position, with the
+    order repaired on the next read if they were put back in the middle."""
+
+    def __init__(self, output_hashes: Iterable[transacts.Hash] = ()):
+        self.order: OrderedDict[int, transacts.Hash] = collections.OrderedDict()
+        # Position of each output, or positions in order if the hash occurs more than once.
+        self.positions: Dict[transacts.Hash, Union[int, Deque[int]]] = {}
+        self.counter = 0
+        self.is_sorted = True
+
+        for output_hash in output_hashes:
+            self.append(output_hash)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, output_hash: Any) -> bool:
+        return output_hash in self.positions
+
+    def __iter__(self) -> Iterator[transacts.Hash]:
+        self.sort()
+        return iter(list(self.order.values()))
+
+    def __getitem__(self, index: int) -> transacts.Hash:
+        self.sort()
+
+        if index == 0 and self.order:
+            return next(iter(self.order.values()))
+
+        return list(self.order.values())[index]
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Outputs) and list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"Outputs({[bytes.hex(output_hash) for output_hash in self]})"
+
+    def sort(self):
+        """ """
+        if not self.is_sorted:
+            self.order = collections.OrderedDict(sorted(self.order.items()))
+            self.is_sorted = True
+
+    def append(self, output_hash: transacts.Hash) -> int:
+        """Return position of the new output."""
+        position = self.counter
+        self.order[position] = output_hash
+        self.counter += 1
+
+        positions = self.positions.get(output_hash)
+
+        if positions is None:
+            self.positions[output_hash] = position
+        elif isinstance(positions, int):
+            self.positions[output_hash] = collections.deque([positions, position])
+        else:
+            positions.append(position)
+
+        return position
+
+    def remove(
+        self, output_hash: transacts.Hash, position: Optional[int] = None
+    ) -> int:
+        """Remove the first output with the hash, or the one at the position if specified, and
+        return its position. Raises ValueError if not found, like a list."""
+        positions = self.positions.get(output_hash)
+
+        if positions is None:
+            raise ValueError("output not found")
+
+        if isinstance(positions, int):
+            if position is not None and position != positions:
+                raise ValueError("output not found")
+
+            position = positions
+            del self.positions[output_hash]
+
+        else:
+            if position is None or position == positions[0]:
+                position = positions.popleft()
+            elif position == positions[-1]:
+                positions.pop()
+            else:
+                positions.remove(position)
+
+            if len(positions) == 1:
+                self.positions[output_hash] = positions[0]
+
+        del self.order[position]
+
+        return position
+
+    def restore(self, output_hash: transacts.Hash, position: int):
+        """Put back output at its position, which is quick at either end."""
+        positions = self.positions.get(output_hash)
+
+        if positions is None:
+            self.positions[output_hash] = position
+        elif isinstance(positions, int):
+            self.positions[output_hash] = collections.deque(
+                sorted([positions, position])
+            )
+        elif position < positions[0]:
+            positions.appendleft(position)
+        else:
+            bisect.insort(positions, position)
+
+        is_last = not self.order or next(reversed(self.order)) < position
+        is_first = not is_last and position < next(iter(self.order))
+        self.order[position] = output_hash
+
+        if is_first:
+            self.order.move_to_end(position, last=False)
+        elif not is_last:
+            self.is_sorted = False
+
+    def pop(self, index: int = -1) -> transacts.Hash:
+        """Remove first or last output."""
+        assert index in (0, -1)
+        self.sort()
+
+        position = next(iter(self.order) if index == 0 else reversed(self.order))
+        output_hash = self.order[position]
+        self.remove(output_hash, position)
+
+        return output_hash
 
 
 Keychain = Dict[transacts.Hash, ec.EllipticCurvePublicKey]
-Accounts = DefaultDict[transacts.Hash, List[transacts.Hash]]
+Accounts = DefaultDict[transacts.Hash, Outputs]
+
+# Number of signatures collected across blocks before they are verified together.
+BATCH_SIZE = 1024
+
+# Number of batches of signatures verified on the process pool at once, while the balance checks
+# of later blocks are run.
+PIPELINE_DEPTH = 4
+
+# Number of latest blocks with undo records kept, with deeper forks replayed from genesis.
+UNDO_DEPTH = 1024
+
+# Snapshot of a balance starts with the latest hash and the number of accounts, then each account
+# starts with the address and the number of outputs followed by the output hashes. The snapshot
+# ends with a digest of the rest, to detect corruption.
+SNAPSHOT_HEADER_FORMAT = ">32sI"
+ACCOUNT_HEADER_FORMAT = ">32sI"
+SNAPSHOT_HEADER_SIZE = struct.calcsize(SNAPSHOT_HEADER_FORMAT)
+ACCOUNT_HEADER_SIZE = struct.calcsize(ACCOUNT_HEADER_FORMAT)
+
+# Output created by a transaction, i.e. the receiver, the transaction hash and its position in
+# the account of the receiver.
+Created = Tuple[transacts.Hash, transacts.Hash, int]
+
+# Output spent by a transaction, i.e. the sender, its position in the account of the sender and
+# the reference hash.
+Spent = Tuple[transacts.Hash, int, transacts.Hash]
+
+
+@dataclasses.dataclass
+class Undo:
+    """Created and spent output of each transaction of a block, to revert its changes to the
+    accounts."""
+
+    created: List[Created]
+    spent: List[Optional[Spent]]
 
 
 @dataclasses.dataclass
@@ -21,43 +203,196 @@ class Balance:
     latest_hash: transacts.Hash
     keychain: Optional[Keychain]
     accounts: Accounts
+    cache: Optional[verification.Cache] = None
+    undos: OrderedDict[transacts.Hash, Undo] = dataclasses.field(
+        default_factory=collections.OrderedDict
+    )
 
 
-def update_accounts(accounts: Accounts, block: blocks.Block) -> Accounts:
-    """ """
+def update_accounts(
+    accounts: Accounts, block: blocks.Block, undo: Optional[Undo] = None
+) -> Accounts:
+    """Record the changes in the undo record if provided."""
     for transaction in block.transactions:
+        spent = None
+
         if transaction.sender != transacts.REWARD_SENDER:
-            accounts[transaction.sender].remove(transaction.reference_hash)
+            position = accounts[transaction.sender].remove(transaction.reference_hash)
+            spent = (transaction.sender, position, transaction.reference_hash)
 
-        reference_hash = hashlib.sha256(transaction.encode()).digest()
-        accounts[transaction.receiver].append(reference_hash)
+        transaction_hash = transaction.hash()
+        position = accounts[transaction.receiver].append(transaction_hash)
+
+        if undo is not None:
+            undo.created.append((transaction.receiver, transaction_hash, position))
+            undo.spent.append(spent)
+
+    return accounts
+
+
+def revert_accounts(accounts: Accounts, undo: Undo) -> Accounts:
+    """Revert changes of each transaction in reverse order."""
+    for created, spent in zip(reversed(undo.created), reversed(undo.spent)):
+        receiver, transaction_hash, position = created
+        accounts[receiver].remove(transaction_hash, position)
+
+        if spent is not None:
+            sender, position, reference_hash = spent
+            accounts[sender].restore(reference_hash, position)
 
     return accounts
 
 
 def init_balance(
-    blockchain: blocks.Blockchain, keychain: Optional[Keychain] = None
+    blockchain: blocks.Blockchain,
+    keychain: Optional[Keychain] = None,
+    cache: Optional[verification.Cache] = None,
 ) -> Balance:
     """ """
-    accounts: Accounts = collections.defaultdict(list)
+    balance = Balance(
+        latest_hash=blockchain.chain[0],
+        keychain=keychain,
+        accounts=collections.defaultdict(Outputs),
+        cache=cache,
+    )
 
     for block_hash in blockchain.chain:
         block = blockchain.blocks[block_hash]
-        accounts = update_accounts(accounts, block)
+        balance = update_balance(balance, block)
+
+    return balance
+
+
+def encode_balance(balance: Balance) -> bytes:
+    """Encode latest hash and unspent outputs in order, without the undo records."""
+    accounts = [
+        (address, outputs) for address, outputs in balance.accounts.items() if outputs
+    ]
+    parts = [struct.pack(SNAPSHOT_HEADER_FORMAT, balance.latest_hash, len(accounts))]
+
+    for address, outputs in accounts:
+        parts.append(struct.pack(ACCOUNT_HEADER_FORMAT, address, len(outputs)))
+        parts.extend(outputs)
+
+    snapshot_bytes = b"".join(parts)
+
+    return snapshot_bytes + hashlib.sha256(snapshot_bytes).digest()
+
+
+def decode_balance(
+    snapshot_bytes: bytes,
+    keychain: Optional[Keychain] = None,
+    cache: Optional[verification.Cache] = None,
+) -> Optional[Balance]:
+    """Return None if the snapshot is truncated or corrupted."""
+    size = len(snapshot_bytes) - transacts.HASH_SIZE
+
+    if size < SNAPSHOT_HEADER_SIZE:
+        return None
+
+    if hashlib.sha256(snapshot_bytes[:size]).digest() != snapshot_bytes[size:]:
+        return None
+
+    latest_hash, account_counter = struct.unpack_from(
+        SNAPSHOT_HEADER_FORMAT, snapshot_bytes
+    )
+    accounts: Accounts = collections.defaultdict(Outputs)
+    offset = SNAPSHOT_HEADER_SIZE
+
+    for _ in range(account_counter):
+        if offset + ACCOUNT_HEADER_SIZE > size:
+            return None
+
+        address, output_counter = struct.unpack_from(
+            ACCOUNT_HEADER_FORMAT, snapshot_bytes, offset
+        )
+        offset += ACCOUNT_HEADER_SIZE
+        end = offset + output_counter * transacts.HASH_SIZE
+
+        if end > size:
+            return None
+
+        accounts[address] = Outputs(
+            snapshot_bytes[i : i + transacts.HASH_SIZE]
+            for i in range(offset, end, transacts.HASH_SIZE)
+        )
+        offset = end
+
+    if offset != size:
+        return None
+
+    return Balance(
+        latest_hash=latest_hash, keychain=keychain, accounts=accounts, cache=cache
+    )
+
+
+def restore_balance(
+    blockchain: blocks.Blockchain,
+    snapshot_bytes: Optional[bytes],
+    keychain: Optional[Keychain] = None,
+    cache: Optional[verification.Cache] = None,
+) -> Balance:
+    """Replay only the blocks after the snapshot, or all blocks if the snapshot is missing or
+    invalid, or its latest hash is no longer on the chain."""
+    balance = None
+    height = None
+
+    if snapshot_bytes is not None:
+        balance = decode_balance(snapshot_bytes, keychain, cache)
+
+    if balance is not None:
+        height = blockchain.height(balance.latest_hash)
+
+    if balance is None or height is None:
+        return init_balance(blockchain, keychain, cache)
+
+    for block_hash in blockchain.chain[height + 1 :]:
+        block = blockchain.blocks[block_hash]
+        balance = update_balance(balance, block)
 
-    return Balance(latest_hash=block_hash, keychain=keychain, accounts=accounts)
+    return balance
 
 
 def update_balance(balance: Balance, block: blocks.Block) -> Balance:
-    """ """
-    block_hash = hashlib.sha256(hashlib.sha256(block.header.encode()).digest()).digest()
-    balance.latest_hash = block_hash
+    """Keep undo records of the latest blocks, so the balance can be rolled back on a fork."""
+    balance.latest_hash = block.header.hash()
+
+    undo = Undo(created=[], spent=[])
+    balance.accounts = update_accounts(balance.accounts, block, undo)
 
-    balance.accounts = update_accounts(balance.accounts, block)
+    balance.undos[balance.latest_hash] = undo
+
+    while len(balance.undos) > UNDO_DEPTH:
+        balance.undos.popitem(last=False)
 
     return balance
 
 
+def rollback_balance(
+    balance: Balance, blockchain: blocks.Blockchain, fork_hash: transacts.Hash
+) -> bool:
+    """Revert blocks from the latest hash of the balance back to the fork, if undo records are
+    kept for all of them. Otherwise the balance is left unchanged."""
+    block_hashes = []
+    block_hash = balance.latest_hash
+
+    while block_hash != fork_hash:
+        if block_hash not in balance.undos:
+            return False
+
+        block_hashes.append(block_hash)
+        block_hash = blockchain.blocks[block_hash].header.previous_hash
+
+    for block_hash in block_hashes:
+        balance.accounts = revert_accounts(
+            balance.accounts, balance.undos.pop(block_hash)
+        )
+
+    balance.latest_hash = fork_hash
+
+    return True
+
+
 def init_transfer(
     balance: Balance, sender: transacts.Hash, receiver: transacts.Hash, signature: bytes
 ) -> Tuple[Optional[Balance], Optional[transacts.Transaction]]:
@@ -76,7 +411,9 @@ def init_transfer(
     return balance, transaction
 
 
-def validate_transaction(balance: Balance, transaction: transacts.Transaction) -> bool:
+def validate_transaction(
+    balance: Balance, transaction: transacts.AnyTransaction
+) -> bool:
     """ """
     sender = transaction.sender
 
@@ -90,20 +427,155 @@ def validate_transaction(balance: Balance, transaction: transacts.Transaction) -
         return False
 
     is_not_spent = transaction.reference_hash in balance.accounts[transaction.sender]
-    is_valid_signature = crypto.verify(
-        transaction.signature,
-        balance.keychain[sender],
-        transaction.reference_hash + transaction.receiver,
+    is_valid_signature = verify_transaction(
+        balance, transaction, balance.keychain[sender]
     )
 
     return is_not_spent and is_valid_signature
 
 
+def verify_transaction(
+    balance: Balance,
+    transaction: transacts.AnyTransaction,
+    public_key: ec.EllipticCurvePublicKey,
+) -> bool:
+    """Verify signature of the transfer, or look up the result in the cache of the balance, so
+    validating transactions again after a fork costs a lookup instead."""
+    message = transaction.reference_hash + transaction.receiver
+
+    if balance.cache is None:
+        return crypto.verify(transaction.signature, public_key, message)
+
+    key = (transaction.hash(), transaction.sender)
+    result = verification.lookup_cache(balance.cache, key)
+
+    if result is None:
+        result = crypto.verify(transaction.signature, public_key, message)
+        verification.update_cache(balance.cache, key, result)
+
+    return result
+
+
+def check_transaction(
+    balance: Balance,
+    transaction: transacts.AnyTransaction,
+    verifications: List[verification.Verification],
+    keys: List[verification.CacheKey],
+) -> bool:
+    """Run the checks of validate_transaction except for the signature, which is added to the
+    verifications to be checked later in a batch, and its cache key to the keys."""
+    sender = transaction.sender
+
+    if sender == transacts.REWARD_SENDER:
+        return transacts.validate_reward(transaction)
+
+    if sender not in balance.accounts or len(balance.accounts[sender]) == 0:
+        return False
+
+    if balance.keychain is None or sender not in balance.keychain:
+        return False
+
+    if transaction.reference_hash not in balance.accounts[transaction.sender]:
+        return False
+
+    # Signatures already verified are not checked again.
+    if balance.cache is not None:
+        key = (transaction.hash(), sender)
+        result = verification.lookup_cache(balance.cache, key)
+
+        if result is not None:
+            return result
+
+        keys.append(key)
+
+    verifications.append(
+        (
+            transaction.signature,
+            crypto.encode_public_key(balance.keychain[sender]),
+            transaction.reference_hash + transaction.receiver,
+        )
+    )
+
+    return True
+
+
+def validate_references(block: blocks.Block) -> bool:
+    """Check no output is spent twice within the block, as each transfer is checked against the
+    balance before the block."""
+    reference_hashes = set()
+
+    for transaction in block.transactions:
+        if transaction.sender == transacts.REWARD_SENDER:
+            continue
+
+        if transaction.reference_hash in reference_hashes:
+            return False
+
+        reference_hashes.add(transaction.reference_hash)
+
+    return True
+
+
+def check_transactions(
+    block: blocks.Block,
+    balance: Balance,
+    verifications: List[verification.Verification],
+    keys: List[verification.CacheKey],
+) -> bool:
+    """Run the checks of validate_transactions except for signatures, which are added to the
+    verifications."""
+    if not validate_references(block):
+        return False
+
+    for transaction in block.transactions:
+        if not check_transaction(balance, transaction, verifications, keys):
+            return False
+
+    return True
+
+
+def validate_transactions(
+    block: blocks.Block,
+    balance: Balance,
+    verifier: Optional[verification.Verifier] = None,
+) -> bool:
+    """Check signatures across the process pool of the verifier if provided, once all other
+    checks have passed."""
+    if not blocks.validate_merkle_root(block):
+        return False
+
+    if verifier is not None:
+        verifications: List[verification.Verification] = []
+        keys: List[verification.CacheKey] = []
+
+        if not check_transactions(block, balance, verifications, keys):
+            return False
+
+        if not verification.verify_signatures(verifications, verifier):
+            return False
+
+        if balance.cache is not None:
+            for key in keys:
+                verification.update_cache(balance.cache, key, True)
+
+        return True
+
+    if not validate_references(block):
+        return False
+
+    for transaction in block.transactions:
+        if not validate_transaction(balance, transaction):
+            return False
+
+    return True
+
+
 def validate_block(
     block: blocks.Block,
     previous_hash: transacts.Hash,
     previous_timestamp: int,
     balance: Balance,
+    verifier: Optional[verification.Verifier] = None,
 ) -> Tuple[bool, Optional[transacts.Hash], Optional[int]]:
     """ """
     is_valid_header, current_hash, current_timestamp = blocks.validate_header(
@@ -113,47 +585,185 @@ def validate_block(
     if not is_valid_header:
         return False, None, None
 
-    for transaction in block.transactions:
-        is_valid_transaction = validate_transaction(balance, transaction)
-
-        if not is_valid_transaction:
-            return False, None, None
+    if not validate_transactions(block, balance, verifier):
+        return False, None, None
 
     return True, current_hash, current_timestamp
 
 
 def validate_blockchain(
-    blockchain: blocks.Blockchain, balance: Balance
+    blockchain: blocks.Blockchain,
+    balance: Balance,
+    verifier: Optional[verification.Verifier] = None,
 ) -> Tuple[bool, Optional[Balance]]:
-    """Check that all headers in the blockchain satisfy proof-of-work and indeed form a chain."""
-    previous_hash = balance.latest_hash
-    block_index = blockchain.chain.index(previous_hash)
+    """Check that all headers in the blockchain satisfy proof-of-work and indeed form a chain,
+    before the transactions of any block are checked."""
+    block_index = blockchain.height(balance.latest_hash)
+
+    if block_index is None:
+        return False, None
+
+    if not blocks.validate_headers(blockchain, block_index):
+        return False, None
 
-    previous_block = blockchain.blocks[blockchain.chain[block_index - 1]]
-    previous_timestamp = previous_block.header.timestamp
+    if verifier is not None:
+        return validate_blockchain_batch(blockchain, balance, block_index, verifier)
 
     for block_hash in blockchain.chain[block_index + 1 :]:
         block = blockchain.blocks[block_hash]
+
+        if not validate_transactions(block, balance):
+            return False, None
+
+        balance = update_balance(balance, block)
+
+    return True, balance
+
+
+def validate_blockchain_batch(
+    blockchain: blocks.Blockchain,
+    balance: Balance,
+    block_index: int,
+    verifier: verification.Verifier,
+) -> Tuple[bool, Optional[Balance]]:
+    """Version of validate_blockchain with the balance checks run in order, while signatures
+    across a range of blocks are verified together on the process pool. Up to a number of
+    ranges are verified while the checks of later blocks go on."""
+    verifications: List[verification.Verification] = []
+    keys: List[verification.CacheKey] = []
+    pending: Deque[verification.Submission] = collections.deque()
+    cache = balance.cache
+
+    # Signatures still pending on an early return or an error are waited for, so they do not
+    # hold up the process pool for the next validation.
+    try:
+        for block_hash in blockchain.chain[block_index + 1 :]:
+            block = blockchain.blocks[block_hash]
+
+            if not blocks.validate_merkle_root(block):
+                return False, None
+
+            if not check_transactions(block, balance, verifications, keys):
+                return False, None
+
+            # Balance update can fail on a block the serial version would not reach, e.g. past
+            # an earlier invalid signature, so pending signatures are checked before raising.
+            try:
+                balance = update_balance(balance, block)
+
+            except ValueError:
+                pending.append(
+                    verification.submit_signatures(verifications, verifier, keys)
+                )
+
+                if not verification.wait_signatures(pending, cache=cache):
+                    return False, None
+
+                raise
+
+            if len(verifications) >= BATCH_SIZE:
+                pending.append(
+                    verification.submit_signatures(verifications, verifier, keys)
+                )
+                verifications = []
+                keys = []
+
+                if not verification.wait_signatures(pending, PIPELINE_DEPTH, cache):
+                    return False, None
+
+        pending.append(verification.submit_signatures(verifications, verifier, keys))
+
+        if not verification.wait_signatures(pending, cache=cache):
+            return False, None
+
+        return True, balance
+
+    finally:
+        verification.drain_signatures(pending)
+
+
+def extend_blockchain(
+    blockchain: blocks.Blockchain,
+    balance: Balance,
+    block: blocks.Block,
+    verifier: Optional[verification.Verifier] = None,
+) -> Tuple[bool, Optional[Balance]]:
+    """Validate single block on top of the blockchain, then append to the blockchain and update
+    the balance. The balance is expected to be at the tip of the blockchain."""
+    previous_hash = blockchain.chain[-1]
+    previous_timestamp = blockchain.blocks[previous_hash].header.timestamp
+
+    if balance.latest_hash != previous_hash:
+        return False, None
+
+    is_valid_block, block_hash, _ = validate_block(
+        block, previous_hash, previous_timestamp, balance, verifier
+    )
+
+    if not is_valid_block:
+        return False, None
+
+    # Chain is only extended once the balance is, so neither changes if the update fails.
+    assert block_hash is not None
+    balance = update_balance(balance, block)
+    blockchain.append(block_hash, block)
+
+    return True, balance
+
+
+def validate_blockchain_stream(
+    block_stream: Iterable[Tuple[transacts.Hash, blocks.Block]], balance: Balance
+) -> Tuple[bool, Optional[blocks.Blockchain], Optional[Balance]]:
+    """Streaming version of validate_blockchain, where each block after the latest hash of the
+    balance is validated as soon as it arrives, and the chain is built as it goes. Used by tests
+    only, as nodes receive chains as whole messages."""
+    blockchain = blocks.Blockchain(chain=[], blocks={})
+    previous_hash = balance.latest_hash
+    previous_timestamp: Optional[int] = None
+    linked_hash = bytes(transacts.HASH_SIZE)
+
+    for block_hash, block in block_stream:
+        # Blocks up to the latest hash of the balance are already accounted for, once shown to
+        # link back from it to a genesis block.
+        if previous_timestamp is None:
+            header = block.header
+
+            if header.hash() != block_hash or header.previous_hash != linked_hash:
+                return False, None, None
+
+            linked_hash = block_hash
+
+            if block_hash == balance.latest_hash:
+                previous_timestamp = block.header.timestamp
+
+            blockchain.append(block_hash, block)
+            continue
+
         is_valid_block, current_hash, current_timestamp = validate_block(
             block, previous_hash, previous_timestamp, balance
         )
 
         if not is_valid_block:
-            return False, None
+            return False, None, None
 
         assert current_hash is not None and current_timestamp is not None
         previous_hash = current_hash
         previous_timestamp = current_timestamp
 
         balance = update_balance(balance, block)
+        blockchain.append(block_hash, block)
 
-    return True, balance
+    if previous_timestamp is None:
+        return False, None, None
+
+    return True, blockchain, balance
 
 
 def replace_blockchain(
     potential_blockchain: blocks.Blockchain,
     current_blockchain: blocks.Blockchain,
     current_balance: Balance,
+    verifier: Optional[verification.Verifier] = None,
 ) -> Tuple[bool, Optional[Balance]]:
     """Compare blockchains and replace if potential blockchain is longer and valid."""
     current_chain = current_blockchain.chain
@@ -161,19 +771,54 @@ def replace_blockchain(
     if len(potential_blockchain.chain) <= len(current_chain):
         return False, None
 
-    for i, block_hash in enumerate(potential_blockchain.chain):
-        if i == len(current_chain) or block_hash != current_chain[i]:
-            break
+    i = blocks.find_fork_height(potential_blockchain.chain, current_chain)
+    latest_index = current_blockchain.height(current_balance.latest_hash)
+    assert latest_index is not None
 
-    latest_index = current_chain.index(current_balance.latest_hash)
+    # Headers after the fork are checked before the balance is rolled back, so a chain with an
+    # invalid header is rejected with the balance left untouched.
+    header_index = max(min(latest_index, i - 1), 0)
 
-    if latest_index <= i:
-        return validate_blockchain(potential_blockchain, current_balance)
+    if not blocks.validate_headers(potential_blockchain, header_index):
+        return False, None
 
-    genesis_chain = current_blockchain.chain[:1]
-    genesis_blockchain = blocks.Blockchain(
-        chain=genesis_chain, blocks=current_blockchain.blocks
+    # Balance can be carried forward if it is below the first diverging block, or otherwise
+    # rolled back to the fork, so only the new blocks are validated. Either way the new blocks
+    # must be within the undo depth, so the balance can be restored if one of them is invalid.
+    fork_index = min(latest_index, i - 1)
+    is_restorable = (
+        0 <= fork_index
+        and len(potential_blockchain.chain) - 1 - fork_index <= UNDO_DEPTH
     )
-    genesis_balance = init_balance(genesis_blockchain, current_balance.keychain)
 
-    return validate_blockchain(potential_blockchain, genesis_balance)
+    if not is_restorable or (
+        i <= latest_index
+        and not rollback_balance(
+            current_balance, current_blockchain, current_chain[fork_index]
+        )
+    ):
+        genesis_chain = current_blockchain.chain[:1]
+        genesis_blockchain = blocks.Blockchain(
+            chain=genesis_chain, blocks=current_blockchain.blocks
+        )
+        genesis_balance = init_balance(
+            genesis_blockchain, current_balance.keychain, current_balance.cache
+        )
+
+        return validate_blockchain(potential_blockchain, genesis_balance, verifier)
+
+    is_valid_blockchain, balance = validate_blockchain(
+        potential_blockchain, current_balance, verifier
+    )
+
+    if is_valid_blockchain:
+        return True, balance
+
+    # Restore balance to the latest hash of the current chain.
+    fork_hash = current_chain[fork_index]
+
+    if rollback_balance(current_balance, potential_blockchain, fork_hash):
+        for block_hash in current_chain[fork_index + 1 : latest_index + 1]:
+            update_balance(current_balance, current_blockchain.blocks[block_hash])
+
+    return False, None
@@ -0,0 +1,375 @@
+from typing import Callable, Dict, List, Tuple
+import collections
+import functools
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import balances
+import blocks
+import crypto
+import storage
+import transactions as transacts
+import verification
+
+
+def init_blockchain_bytes(block_counter: int, transaction_counter: int) -> bytes:
+    """Encode a chain of random blocks, without proof-of-work, for decoding benchmarks."""
+    blockchain = blocks.Blockchain(chain=[], blocks={})
+    previous_hash = (0).to_bytes(transacts.HASH_SIZE, byteorder="big")
+
+    for i in range(block_counter):
+        transactions = [
+            transacts.decode_transaction(os.urandom(transacts.TRANSACTION_SIZE))
+            for _ in range(transaction_counter)
+        ]
+        header = blocks.Header(
+            version=blocks.VERSION,
+            previous_hash=previous_hash,
+            merkle_root=os.urandom(transacts.HASH_SIZE),
+            timestamp=1634700000 + i,
+            nonce=i,
+        )
+        # Blocks are linked, as decoding stops at the first block that is not.
+        previous_hash = header.hash()
+
+        blockchain.chain.append(previous_hash)
+        blockchain.blocks[previous_hash] = blocks.Block(
+            header=header, transactions=transactions
+        )
+
+    return blockchain.encode()
+
+
+def measure(function: Callable, *args) -> Tuple[float, int, int]:
+    """Return duration in seconds, and number of allocations still held by the result of function
+    and peak allocated size."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args)
+    duration = time.perf_counter() - start
+
+    snapshot = tracemalloc.take_snapshot()
+    _, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    allocation_counter = sum(stat.count for stat in snapshot.statistics("filename"))
+
+    return duration, allocation_counter, peak_size
+
+
+def bench_proof_of_work(iterations: int = 200000):
+    """Compare hashes per second of the header proof-of-work loops."""
+    previous_hash = (0).to_bytes(32, byteorder="big")
+    merkle_root = (1).to_bytes(32, byteorder="big")
+    timestamp = int(time.time())
+
+    candidates = [
+        ("run_proof_of_work", blocks.run_proof_of_work),
+        ("run_fast_proof_of_work", blocks.run_fast_proof_of_work),
+    ]
+
+    if importlib.util.find_spec("numpy") is not None:
+        run_numpy_proof_of_work = functools.partial(
+            blocks.run_proof_of_work, backend="numpy"
+        )
+        candidates.append(("run_proof_of_work numpy", run_numpy_proof_of_work))
+
+    for name, run_proof_of_work in candidates:
+        nonce = 0
+        start = time.perf_counter()
+
+        # Continue past solutions so both loops hash the same nonce range.
+        while nonce < iterations:
+            _, nonce, _, _ = run_proof_of_work(
+                previous_hash, merkle_root, timestamp, nonce, iterations - nonce
+            )
+            nonce += 1
+
+        duration = time.perf_counter() - start
+        print(f"{name}: {iterations / duration:,.0f} hashes/s")
+
+
+def bench_decode_blockchain(block_counter: int = 2000, transaction_counter: int = 20):
+    """Compare time and allocations of the copying and view-based blockchain decoders."""
+    blockchain_bytes = init_blockchain_bytes(block_counter, transaction_counter)
+    print(f"blockchain: {len(blockchain_bytes):,} bytes")
+
+    def read_blockchain(decode_blockchain: Callable, blockchain_bytes: bytes):
+        """Decode blockchain and read every transaction sender, as validation would."""
+        blockchain = decode_blockchain(blockchain_bytes)
+
+        for block in blockchain.blocks.values():
+            for transaction in block.transactions:
+                transaction.sender
+
+        return blockchain
+
+    for name, decode_blockchain in [
+        ("decode_blockchain", blocks.decode_blockchain),
+        ("decode_blockchain_view", blocks.decode_blockchain_view),
+    ]:
+        runs: List[Tuple[str, Callable, tuple]] = [
+            ("decode", decode_blockchain, (blockchain_bytes,)),
+            ("decode+read", read_blockchain, (decode_blockchain, blockchain_bytes)),
+        ]
+
+        for label, function, args in runs:
+            duration, allocation_counter, peak_size = measure(function, *args)
+            print(
+                f"{name} {label}: {duration * 1000:.1f} ms, "
+                f"{allocation_counter:,} allocations held, {peak_size:,} bytes peak"
+            )
+
+
+def bench_encode_blockchain(block_counter: int = 2000, transaction_counter: int = 1):
+    """Compare encoding the whole chain against incremental encoding after each appended block,
+    as the node does after mining."""
+    blockchain = blocks.decode_blockchain(
+        init_blockchain_bytes(block_counter, transaction_counter)
+    )
+
+    start = time.perf_counter()
+
+    for i in range(1, block_counter + 1):
+        full_blockchain = blocks.Blockchain(
+            chain=blockchain.chain[:i], blocks=blockchain.blocks
+        )
+        full_blockchain.encode()
+
+    print(f"full encode: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    incremental_blockchain = blocks.Blockchain(chain=[], blocks={})
+    start = time.perf_counter()
+
+    for block_hash in blockchain.chain:
+        incremental_blockchain.append(block_hash, blockchain.blocks[block_hash])
+        incremental_blockchain.encode()
+
+    print(f"incremental encode: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def bench_block_memory(block_counter: int = 2000, transaction_counter: int = 1):
+    """Measure memory per decoded block, and time to decode a chain then hash every header as
+    decoding, balance and validation passes do."""
+    blockchain_bytes = init_blockchain_bytes(block_counter, transaction_counter)
+
+    tracemalloc.start()
+    blockchain = blocks.decode_blockchain(blockchain_bytes)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"memory: {size / block_counter:,.0f} bytes per block")
+
+    start = time.perf_counter()
+    blockchain = blocks.decode_blockchain(blockchain_bytes)
+
+    for _ in range(3):
+        for block_hash in blockchain.chain:
+            blockchain.blocks[block_hash].header.hash()
+
+    print(f"decode and hash: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def bench_store(block_counter: int = 10000, transaction_counter: int = 1):
+    """Compare restoring a chain from the block store against decoding it from bytes."""
+    blockchain_bytes = init_blockchain_bytes(block_counter, transaction_counter)
+    blockchain = blocks.decode_blockchain(blockchain_bytes)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = storage.open_store(path)
+        storage.save_blockchain(store, blockchain)
+        storage.close_store(store)
+
+        start = time.perf_counter()
+        store = storage.open_store(path)
+        storage.load_blockchain(store)
+        print(f"open store: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        storage.close_store(store)
+
+    start = time.perf_counter()
+    blocks.decode_blockchain(blockchain_bytes)
+    print(f"decode blockchain: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def bench_columns(block_counter: int = 2000, transaction_counter: int = 100):
+    """Compare finding transactions by sender across a chain with the object and columnar
+    decoders."""
+    if importlib.util.find_spec("numpy") is None:
+        print("numpy not installed")
+        return
+
+    import columns
+
+    blockchain_bytes = init_blockchain_bytes(block_counter, transaction_counter)
+    blockchain = blocks.decode_blockchain(blockchain_bytes)
+    sender = blockchain.blocks[blockchain.chain[-1]].transactions[0].sender
+
+    start = time.perf_counter()
+    blockchain = blocks.decode_blockchain(blockchain_bytes)
+    matches = [
+        transaction
+        for block in blockchain.blocks.values()
+        for transaction in block.transactions
+        if transaction.sender == sender
+    ]
+    duration = time.perf_counter() - start
+    print(f"decode_blockchain: {duration * 1000:.1f} ms, {len(matches)} match")
+
+    start = time.perf_counter()
+    transactions, _ = columns.decode_blockchain_transactions(blockchain_bytes)
+    mask = columns.select_transactions(transactions, sender=sender)
+    duration = time.perf_counter() - start
+    print(f"columns: {duration * 1000:.1f} ms, {mask.sum()} match")
+
+
+def bench_accounts(
+    output_counters: Tuple[int, ...] = (1000, 10000, 100000, 200000),
+    transaction_counter: int = 254,
+):
+    """Measure the balance checks and updates per transaction spending outputs of an address
+    with many unspent outputs, against the same operations on a list."""
+    wallet = crypto.init_wallet(0)
+    receiver = os.urandom(transacts.HASH_SIZE)
+
+    for output_counter in output_counters:
+        output_hashes = [os.urandom(transacts.HASH_SIZE) for _ in range(output_counter)]
+        spent_hashes = output_hashes[output_counter // 2 :][:transaction_counter]
+
+        transactions = [
+            transacts.Transaction(
+                reference_hash=reference_hash,
+                sender=wallet.address,
+                receiver=receiver,
+                signature=bytes(transacts.SIGNATURE_SIZE),
+            )
+            for reference_hash in spent_hashes
+        ]
+        header = blocks.Header(
+            version=blocks.VERSION,
+            previous_hash=bytes(transacts.HASH_SIZE),
+            merkle_root=bytes(transacts.HASH_SIZE),
+            timestamp=1634700000,
+            nonce=0,
+        )
+        block = blocks.Block(header=header, transactions=transactions)
+
+        balance = balances.Balance(
+            latest_hash=bytes(transacts.HASH_SIZE),
+            keychain={wallet.address: wallet.public_key},
+            accounts=collections.defaultdict(balances.Outputs),
+        )
+        balance.accounts[wallet.address] = balances.Outputs(output_hashes)
+
+        start = time.perf_counter()
+        verifications: List[verification.Verification] = []
+        keys: List[verification.CacheKey] = []
+
+        for transaction in transactions:
+            assert balances.check_transaction(balance, transaction, verifications, keys)
+
+        balances.update_balance(balance, block)
+        duration = time.perf_counter() - start
+
+        outputs = list(output_hashes)
+        start = time.perf_counter()
+
+        for transaction in transactions:
+            assert transaction.reference_hash in outputs
+            outputs.remove(transaction.reference_hash)
+            outputs.append(transaction.hash())
+
+        list_duration = time.perf_counter() - start
+
+        print(
+            f"{output_counter:,} outputs: "
+            f"{duration / transaction_counter * 1e6:.1f} us per transaction, "
+            f"list {list_duration / transaction_counter * 1e6:.1f} us"
+        )
+
+
+def bench_snapshot(block_counter: int = 4000, transaction_counter: int = 250):
+    """Compare restoring a balance with 1M unspent outputs from a snapshot against replaying the
+    chain, with the snapshot taken 10 blocks below the tip."""
+    receivers = [os.urandom(transacts.HASH_SIZE) for _ in range(1000)]
+    blockchain = blocks.Blockchain(chain=[], blocks={})
+    previous_hash = bytes(transacts.HASH_SIZE)
+
+    for i in range(block_counter):
+        # Random references make reward hashes distinct, as the outputs of transfers would be.
+        transactions = [
+            transacts.Transaction(
+                reference_hash=os.urandom(transacts.HASH_SIZE),
+                sender=transacts.REWARD_SENDER,
+                receiver=receivers[(i * transaction_counter + j) % len(receivers)],
+                signature=transacts.REWARD_SIGNATURE,
+            )
+            for j in range(transaction_counter)
+        ]
+        header = blocks.Header(
+            version=blocks.VERSION,
+            previous_hash=previous_hash,
+            merkle_root=bytes(transacts.HASH_SIZE),
+            timestamp=1634700000 + i,
+            nonce=0,
+        )
+        previous_hash = header.hash()
+        blockchain.append(
+            previous_hash, blocks.Block(header=header, transactions=transactions)
+        )
+
+    partial_blockchain = blocks.Blockchain(
+        chain=blockchain.chain[:-10], blocks=blockchain.blocks
+    )
+
+    start = time.perf_counter()
+    balance = balances.init_balance(partial_blockchain)
+    print(f"replay chain: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    with tempfile.TemporaryDirectory() as path:
+        store = storage.open_store(path)
+
+        start = time.perf_counter()
+        snapshot_bytes = balances.encode_balance(balance)
+        storage.save_snapshot(store, snapshot_bytes)
+        duration = time.perf_counter() - start
+
+        output_counter = sum(len(outputs) for outputs in balance.accounts.values())
+        print(
+            f"save snapshot: {duration * 1000:.1f} ms, {len(snapshot_bytes):,} bytes "
+            f"for {output_counter:,} outputs"
+        )
+
+        start = time.perf_counter()
+        restored_balance = balances.restore_balance(
+            blockchain, storage.load_snapshot(store)
+        )
+        print(f"restore snapshot: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        assert restored_balance.latest_hash == blockchain.chain[-1]
+        storage.close_store(store)
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "proof_of_work": bench_proof_of_work,
+    "decode_blockchain": bench_decode_blockchain,
+    "encode_blockchain": bench_encode_blockchain,
+    "block_memory": bench_block_memory,
+    "store": bench_store,
+    "columns": bench_columns,
+    "accounts": bench_accounts,
+    "snapshot": bench_snapshot,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+
+    for name in names:
+        print(f"BENCH {name}...")
+        BENCHMARKS[name]()
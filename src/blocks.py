@@ -1,6 +1,17 @@
-from typing import Dict, Generator, List, Optional, Tuple
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    List,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 import dataclasses
 import hashlib
+import struct
 
 import transactions as transacts
 
@@ -8,27 +19,61 @@ import transactions as transacts
 VERSION: int = 2
 
 HEADER_SIZE: int = 101  # i.e. 1 + 32 + 32 + 4 + 32
+NONCE_SIZE: int = 32
+PREFIX_SIZE: int = HEADER_SIZE - NONCE_SIZE
 
+BACKENDS: Tuple[str, ...] = ("hashlib", "numpy")
 
-@dataclasses.dataclass
-class Header:
+# Leading bytes of a valid block hash, i.e. the difficulty checked on validation.
+DIFFICULTY_PREFIX: bytes = b"\x00\x00"
+
+
+def hash_header(header_bytes: Union[bytes, memoryview]) -> transacts.Hash:
     """ """
+    return hashlib.sha256(hashlib.sha256(header_bytes).digest()).digest()
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Header:
+    """Immutable, with encoding and block hash computed once on first use."""
 
     version: int
     previous_hash: transacts.Hash
     merkle_root: transacts.Hash
     timestamp: int
     nonce: int
+    cached_encoding: Optional[bytes] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+    cached_hash: Optional[transacts.Hash] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
-    def encode(self):
+    def encode(self) -> bytes:
         """ """
-        return (
-            self.version.to_bytes(1, byteorder="big")
-            + self.previous_hash
-            + self.merkle_root
-            + self.timestamp.to_bytes(4, byteorder="big")
-            + self.nonce.to_bytes(32, byteorder="big")
-        )
+        encoding = self.cached_encoding
+
+        if encoding is None:
+            encoding = (
+                self.version.to_bytes(1, byteorder="big")
+                + self.previous_hash
+                + self.merkle_root
+                + self.timestamp.to_bytes(4, byteorder="big")
+                + self.nonce.to_bytes(32, byteorder="big")
+            )
+            object.__setattr__(self, "cached_encoding", encoding)
+
+        return encoding
+
+    def hash(self) -> transacts.Hash:
+        """ """
+        block_hash = self.cached_hash
+
+        if block_hash is None:
+            block_hash = hash_header(self.encode())
+            object.__setattr__(self, "cached_hash", block_hash)
+
+        return block_hash
 
 
 def decode_header(header_bytes: bytes) -> Header:
@@ -44,7 +89,7 @@ def decode_header(header_bytes: bytes) -> Header:
         header_bytes[1 + 2 * transacts.HASH_SIZE + 4 :], byteorder="big"
     )
 
-    return Header(
+    header = Header(
         version=version,
         previous_hash=previous_hash,
         merkle_root=merkle_root,
@@ -52,20 +97,90 @@ def decode_header(header_bytes: bytes) -> Header:
         nonce=nonce,
     )
 
+    # Hash decoded bytes directly, without keeping the encoding.
+    object.__setattr__(header, "cached_hash", hash_header(header_bytes))
 
-@dataclasses.dataclass
+    return header
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class HeaderView:
+    """Read-only view of an encoded header, with fields copied out only when accessed."""
+
+    buffer: memoryview
+    cached_hash: Optional[transacts.Hash] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def version(self) -> int:
+        """ """
+        return self.buffer[0]
+
+    @property
+    def previous_hash(self) -> transacts.Hash:
+        """ """
+        return bytes(self.buffer[1 : 1 + transacts.HASH_SIZE])
+
+    @property
+    def merkle_root(self) -> transacts.Hash:
+        """ """
+        return bytes(self.buffer[1 + transacts.HASH_SIZE : 1 + 2 * transacts.HASH_SIZE])
+
+    @property
+    def timestamp(self) -> int:
+        """ """
+        return int.from_bytes(
+            self.buffer[1 + 2 * transacts.HASH_SIZE : PREFIX_SIZE], byteorder="big"
+        )
+
+    @property
+    def nonce(self) -> int:
+        """ """
+        return int.from_bytes(self.buffer[PREFIX_SIZE:HEADER_SIZE], byteorder="big")
+
+    def encode(self) -> bytes:
+        """ """
+        return bytes(self.buffer)
+
+    def hash(self) -> transacts.Hash:
+        """ """
+        block_hash = self.cached_hash
+
+        if block_hash is None:
+            block_hash = hash_header(self.buffer)
+            object.__setattr__(self, "cached_hash", block_hash)
+
+        return block_hash
+
+
+AnyHeader = Union[Header, HeaderView]
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class Block:
-    """ """
+    """Immutable, with transactions stored as a tuple and encoding computed once on first use."""
 
-    header: Header
-    transactions: List[transacts.Transaction]
+    header: AnyHeader
+    transactions: Sequence[transacts.AnyTransaction]
+    cached_encoding: Optional[bytes] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
 
-    def encode(self):
+    def __post_init__(self):
+        object.__setattr__(self, "transactions", tuple(self.transactions))
+
+    def encode(self) -> bytes:
         """ """
-        header_bytes, transactions_bytes = self.header.encode(), b""
+        encoding = self.cached_encoding
 
-        for transaction in self.transactions:
-            transactions_bytes += transaction.encode()
+        if encoding is not None:
+            return encoding
+
+        header_bytes = self.header.encode()
+        transactions_bytes = b"".join(
+            transaction.encode() for transaction in self.transactions
+        )
 
         transaction_counter_bytes = len(self.transactions).to_bytes(1, byteorder="big")
 
@@ -76,12 +191,17 @@ class Block:
             + len(transactions_bytes)
         )
 
-        return (
-            block_size.to_bytes(2, byteorder="big")
-            + header_bytes
-            + transaction_counter_bytes
-            + transactions_bytes
+        encoding = b"".join(
+            [
+                block_size.to_bytes(2, byteorder="big"),
+                header_bytes,
+                transaction_counter_bytes,
+                transactions_bytes,
+            ]
         )
+        object.__setattr__(self, "cached_encoding", encoding)
+
+        return encoding
 
 
 def decode_block(block_bytes: bytes) -> Block:
@@ -100,24 +220,110 @@ def decode_block(block_bytes: bytes) -> Block:
     return Block(header=header, transactions=transactions)
 
 
+def decode_block_view(block_buffer: memoryview) -> Block:
+    """Decode block with header and transactions as views over the buffer, without copying."""
+    header = HeaderView(buffer=block_buffer[2 : 2 + HEADER_SIZE])
+    transaction_counter = block_buffer[2 + HEADER_SIZE]
+    transactions = transacts.decode_transactions_view(
+        transaction_counter, block_buffer[2 + HEADER_SIZE + 1 :]
+    )
+
+    return Block(header=header, transactions=transactions)
+
+
 @dataclasses.dataclass
 class Blockchain:
-    """ """
+    """Blocks are encoded once into an append-only buffer, so encoding the chain after appending
+    a block only encodes the new block."""
 
     chain: List[transacts.Hash]
-    blocks: Dict[transacts.Hash, Block]
+    blocks: MutableMapping[transacts.Hash, Block]
+    encoding: bytearray = dataclasses.field(
+        default_factory=bytearray, repr=False, compare=False
+    )
+    encoded_counter: int = dataclasses.field(default=0, repr=False, compare=False)
+    encoded_hash: Optional[transacts.Hash] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+    heights: Dict[transacts.Hash, int] = dataclasses.field(
+        default_factory=dict, repr=False, compare=False
+    )
+    indexed_counter: int = dataclasses.field(default=0, repr=False, compare=False)
+    indexed_hash: Optional[transacts.Hash] = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    def append(self, block_hash: transacts.Hash, block: Block):
+        """ """
+        self.chain.append(block_hash)
+        self.blocks[block_hash] = block
 
     def encode(self):
         """ """
-        blockchain_bytes = b""
+        # Start over if the chain was shortened or changed below the encoded blocks.
+        counter = self.encoded_counter
+
+        if counter > len(self.chain) or (
+            counter > 0 and self.chain[counter - 1] != self.encoded_hash
+        ):
+            self.encoding.clear()
+            counter = 0
+
+        for block_hash in self.chain[counter:]:
+            self.encoding += self.blocks[block_hash].encode()
+
+        self.encoded_counter = len(self.chain)
+        self.encoded_hash = self.chain[-1] if self.chain else None
+
+        return bytes(self.encoding)
+
+    def height(self, block_hash: transacts.Hash) -> Optional[int]:
+        """Return height of the block if on the chain. Hashes are indexed as blocks are appended,
+        so each lookup takes constant time rather than a scan of the chain."""
+        # Start over if the chain was shortened or changed below the indexed blocks.
+        counter = self.indexed_counter
+
+        if counter > len(self.chain) or (
+            counter > 0 and self.chain[counter - 1] != self.indexed_hash
+        ):
+            self.heights.clear()
+            counter = 0
+
+        for height in range(counter, len(self.chain)):
+            self.heights[self.chain[height]] = height
+
+        self.indexed_counter = len(self.chain)
+        self.indexed_hash = self.chain[-1] if self.chain else None
+
+        block_height = self.heights.get(block_hash)
+
+        if block_height is None or self.chain[block_height] != block_hash:
+            return None
+
+        return block_height
+
 
-        for block_hash in self.chain:
-            blockchain_bytes += self.blocks[block_hash].encode()
+def find_fork_height(
+    chain: Sequence[transacts.Hash], other_chain: Sequence[transacts.Hash]
+) -> int:
+    """Return height of the first block differing between the chains. Each block commits to its
+    parent, as checked when a chain is decoded, so chains share every block below the fork and
+    none above, and the fork is found by binary search."""
+    low = 0
+    high = min(len(chain), len(other_chain))
 
-        return blockchain_bytes
+    while low < high:
+        middle = (low + high) // 2
 
+        if chain[middle] == other_chain[middle]:
+            low = middle + 1
+        else:
+            high = middle
 
-def iterate_blockchain(blockchain_bytes: bytes) -> Generator:
+    return low
+
+
+def iterate_blockchain(blockchain_bytes: Union[bytes, memoryview]) -> Generator:
     """ """
     message_size = len(blockchain_bytes)
     byte_index = 0
@@ -140,26 +346,125 @@ def decode_blockchain(blockchain_bytes: bytes) -> Blockchain:
     """ """
     chain: List[transacts.Hash] = []
     blocks: Dict[transacts.Hash, Block] = {}
+    previous_hash = bytes(transacts.HASH_SIZE)
+    byte_index = 0
 
     for block_size, block_bytes in iterate_blockchain(blockchain_bytes):
         if block_size is None:
             break
 
         block = decode_block(block_bytes)
-        header = block.header
-        block_hash = hashlib.sha256(hashlib.sha256(header.encode()).digest()).digest()
+
+        # Chain ends at the first block not linked to the one before, so chains can be compared
+        # by the hash at a single height.
+        if block.header.previous_hash != previous_hash:
+            break
+
+        block_hash = block.header.hash()
+
+        chain.append(block_hash)
+        blocks[block_hash] = block
+        previous_hash = block_hash
+        byte_index += block_size
+
+    # Received bytes are already the encoding of the chain.
+    return Blockchain(
+        chain=chain,
+        blocks=blocks,
+        encoding=bytearray(blockchain_bytes[:byte_index]),
+        encoded_counter=len(chain),
+        encoded_hash=chain[-1] if chain else None,
+    )
+
+
+def read_exactly(stream: Any, size: int) -> Optional[bytes]:
+    """Read exactly size bytes from a binary file-like object or a connected socket, returning None
+    if the stream ends first."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    byte_index = 0
+
+    while byte_index < size:
+        if hasattr(stream, "recv_into"):
+            read_counter = stream.recv_into(view[byte_index:])
+        else:
+            read_counter = stream.readinto(view[byte_index:])
+
+        if not read_counter:
+            return None
+
+        byte_index += read_counter
+
+    return bytes(buffer)
+
+
+def stream_blockchain(
+    stream: Any,
+) -> Generator[Tuple[transacts.Hash, Block], None, None]:
+    """Decode length-prefixed blocks one at a time as they are read from the stream, so memory is
+    bounded by the size of one block."""
+    while True:
+        size_bytes = read_exactly(stream, 2)
+
+        if size_bytes is None:
+            return
+
+        block_size = int.from_bytes(size_bytes, byteorder="big")
+
+        # Stop at a size too small to hold a header and transaction counter.
+        if block_size < 2 + HEADER_SIZE + 1:
+            return
+
+        remaining_bytes = read_exactly(stream, block_size - 2)
+
+        if remaining_bytes is None:
+            return
+
+        block = decode_block(size_bytes + remaining_bytes)
+
+        yield block.header.hash(), block
+
+
+def decode_blockchain_view(blockchain_bytes: bytes) -> Blockchain:
+    """Decode blockchain with blocks as views over the message, so the message is not copied before
+    validation starts."""
+    chain: List[transacts.Hash] = []
+    blocks: Dict[transacts.Hash, Block] = {}
+    previous_hash = bytes(transacts.HASH_SIZE)
+    byte_index = 0
+
+    for block_size, block_buffer in iterate_blockchain(memoryview(blockchain_bytes)):
+        if block_size is None:
+            break
+
+        block = decode_block_view(block_buffer)
+
+        # Chain ends at the first block not linked to the one before, so chains can be compared
+        # by the hash at a single height.
+        if block.header.previous_hash != previous_hash:
+            break
+
+        block_hash = block.header.hash()
 
         chain.append(block_hash)
         blocks[block_hash] = block
+        previous_hash = block_hash
+        byte_index += block_size
 
-    return Blockchain(chain=chain, blocks=blocks)
+    # Received bytes are already the encoding of the chain.
+    return Blockchain(
+        chain=chain,
+        blocks=blocks,
+        encoding=bytearray(blockchain_bytes[:byte_index]),
+        encoded_counter=len(chain),
+        encoded_hash=chain[-1] if chain else None,
+    )
 
 
 def init_genesis_block(receiver: transacts.Hash) -> Block:
     """ """
     reward = transacts.init_reward(receiver)
-    transaction_hash = hashlib.sha256(reward.encode()).digest()
-    merkle_tree = transacts.init_merkle_tree([transaction_hash])
+    merkle_tree = transacts.init_merkle_tree([reward.hash()])
 
     assert merkle_tree is not None
     merkle_root = merkle_tree.tree_hash
@@ -173,8 +478,7 @@ def init_genesis_block(receiver: transacts.Hash) -> Block:
         nonce=48705,
     )
 
-    guess = hashlib.sha256(hashlib.sha256(header.encode()).digest())
-    assert guess.hexdigest()[:4] == "0000"
+    assert header.hash()[:2] == b"\x00\x00"
 
     return Block(header=header, transactions=[reward])
 
@@ -183,8 +487,7 @@ def init_blockchain(receiver: transacts.Hash) -> Blockchain:
     """ """
     genesis_block = init_genesis_block(receiver)
 
-    header = genesis_block.header
-    genesis_hash = hashlib.sha256(hashlib.sha256(header.encode()).digest()).digest()
+    genesis_hash = genesis_block.header.hash()
 
     return Blockchain(chain=[genesis_hash], blocks={genesis_hash: genesis_block})
 
@@ -195,9 +498,20 @@ def run_proof_of_work(
     timestamp: int,
     nonce: int = 0,
     iterations: Optional[int] = None,
+    backend: str = "hashlib",
 ) -> Tuple[bool, int, Optional[transacts.Hash], Optional[Header]]:
     """Find nonce that makes the first 4 bytes of twice-hashed header all zeroes. Maximum number of
-    iterations can be specified."""
+    iterations can be specified, as well as the batched NumPy backend."""
+    assert backend in BACKENDS
+
+    if backend == "numpy":
+        # Import on demand as NumPy is only required for the batched backend.
+        import hashing
+
+        return hashing.run_batch_proof_of_work(
+            previous_hash, merkle_root, timestamp, nonce, iterations
+        )
+
     iteration_counter = 0
 
     while True:
@@ -222,16 +536,97 @@ def run_proof_of_work(
     return True, nonce, guess.digest(), header
 
 
+def run_fast_proof_of_work(
+    previous_hash: transacts.Hash,
+    merkle_root: transacts.Hash,
+    timestamp: int,
+    nonce: int = 0,
+    iterations: Optional[int] = None,
+) -> Tuple[bool, int, Optional[transacts.Hash], Optional[Header]]:
+    """Same search as run_proof_of_work, but with the header prefix hashed once and only the nonce
+    bytes rewritten on each iteration."""
+    stop = None if iterations is None else nonce + iterations
+
+    # Nonce is written as the last 8 bytes of the buffer, larger values take the slow path.
+    if nonce >> 64 or (stop is not None and stop >> 64):
+        return run_proof_of_work(
+            previous_hash, merkle_root, timestamp, nonce, iterations
+        )
+
+    prefix = Header(
+        version=VERSION,
+        previous_hash=previous_hash,
+        merkle_root=merkle_root,
+        timestamp=timestamp,
+        nonce=0,
+    ).encode()[:PREFIX_SIZE]
+    prefix_hash = hashlib.sha256(prefix)
+
+    nonce_buffer = bytearray(NONCE_SIZE)
+    sha256 = hashlib.sha256
+    pack_into = struct.pack_into
+
+    while nonce != stop:
+        pack_into(">Q", nonce_buffer, NONCE_SIZE - 8, nonce)
+        guess = prefix_hash.copy()
+        guess.update(nonce_buffer)
+        digest = sha256(guess.digest()).digest()
+
+        if digest[0] == 0 and digest[1] == 0:
+            header = Header(
+                version=VERSION,
+                previous_hash=previous_hash,
+                merkle_root=merkle_root,
+                timestamp=timestamp,
+                nonce=nonce,
+            )
+            return True, nonce, digest, header
+
+        nonce += 1
+
+    return False, nonce, None, None
+
+
 def validate_header(
-    header: Header, previous_hash: transacts.Hash, previous_timestamp: int
+    header: AnyHeader, previous_hash: transacts.Hash, previous_timestamp: int
 ) -> Tuple[bool, Optional[transacts.Hash], Optional[int]]:
     """ """
     if header.previous_hash != previous_hash or header.timestamp < previous_timestamp:
         return False, None, None
 
-    guess = hashlib.sha256(hashlib.sha256(header.encode()).digest())
+    block_hash = header.hash()
 
-    if guess.hexdigest()[:4] != "0000":
+    if not block_hash.startswith(DIFFICULTY_PREFIX):
         return False, None, None
 
-    return True, guess.digest(), header.timestamp
+    return True, block_hash, header.timestamp
+
+
+def validate_merkle_root(block: Block) -> bool:
+    """Check transactions of the block match the merkle root committed to by its header."""
+    transaction_hashes = [transaction.hash() for transaction in block.transactions]
+    merkle_tree = transacts.init_merkle_tree(transaction_hashes)
+
+    return merkle_tree is not None and merkle_tree.tree_hash == block.header.merkle_root
+
+
+def validate_headers(blockchain: Blockchain, block_index: int) -> bool:
+    """Check headers after the block index satisfy proof-of-work and form a chain, so an invalid
+    header is rejected before any transaction is checked."""
+    previous_hash = blockchain.chain[block_index]
+    previous_timestamp = blockchain.blocks[previous_hash].header.timestamp
+
+    for block_hash in blockchain.chain[block_index + 1 :]:
+        header = blockchain.blocks[block_hash].header
+        is_valid_header, current_hash, current_timestamp = validate_header(
+            header, previous_hash, previous_timestamp
+        )
+
+        if not is_valid_header:
+            return False
+
+        assert current_hash is not None and current_timestamp is not None
+        previous_hash = current_hash
+        previous_timestamp = current_timestamp
+
+    return True
@@ -0,0 +1,237 @@
+from typing import Dict, List, Optional, TextIO, Tuple
+import dataclasses
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import crypto
+import hq
+
+
+CLUSTER_IP = "127.0.0.1"
+BASE_PORT = 7000
+
+TOPOLOGIES = ("mesh", "ring", "random")
+
+# Arrival time and height of each block by hash, for each node by port.
+Arrivals = Dict[int, Dict[str, Tuple[float, int]]]
+
+
+def init_ports(node_counter: int, base_port: int = BASE_PORT) -> List[int]:
+    """ """
+    return [base_port + i for i in range(node_counter)]
+
+
+def init_topology(
+    ports: List[int],
+    topology: str = "mesh",
+    peer_counter: int = 2,
+    seed: Optional[int] = None,
+) -> Dict[int, List[int]]:
+    """Return the ports each node broadcasts to, i.e. all other nodes for a full mesh, the
+    neighbours on either side for a ring, or a random sample of other nodes."""
+    assert topology in TOPOLOGIES
+    rng = random.Random(seed)
+    peers: Dict[int, List[int]] = {}
+
+    for i, port in enumerate(ports):
+        others = ports[:i] + ports[i + 1 :]
+
+        if topology == "mesh":
+            peers[port] = others
+
+        elif topology == "ring":
+            neighbours = [ports[i - 1], ports[(i + 1) % len(ports)]]
+            peers[port] = sorted(set(neighbours) - {port})
+
+        else:
+            peers[port] = sorted(rng.sample(others, min(peer_counter, len(others))))
+
+    return peers
+
+
+@dataclasses.dataclass
+class Cluster:
+    """ """
+
+    directory: str
+    ports: List[int]
+    peers: Dict[int, List[int]]
+    processes: List[subprocess.Popen]
+    logs: List[TextIO]
+
+
+def start_cluster(
+    directory: str,
+    peers: Dict[int, List[int]],
+    node_args: Optional[List[str]] = None,
+) -> Cluster:
+    """Generate a wallet for each node, then start each node as a process on loopback, with its
+    output and the arrival times of blocks kept in the directory."""
+    if node_args is None:
+        node_args = []
+
+    ports = sorted(peers)
+    wallet_dir = os.path.join(directory, "wallets")
+    arrivals_dir = os.path.join(directory, "arrivals")
+    log_dir = os.path.join(directory, "logs")
+
+    for path in [wallet_dir, arrivals_dir, log_dir]:
+        os.makedirs(path, exist_ok=True)
+
+    crypto.init_demo_wallets(persist_keys=True, ports=ports, directory=wallet_dir)
+
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    processes: List[subprocess.Popen] = []
+    logs: List[TextIO] = []
+
+    for port in ports:
+        env = dict(os.environ)
+        env.pop("NODE_DATA_DIR", None)
+        env.update(
+            NODE_IP=CLUSTER_IP,
+            NODE_PORTS=",".join(str(port) for port in ports),
+            NODE_PEERS=",".join(str(peer) for peer in peers[port]),
+            NODE_WALLET_DIR=wallet_dir,
+            NODE_ARRIVALS_DIR=arrivals_dir,
+            PYTHONUNBUFFERED="1",
+        )
+
+        log = open(os.path.join(log_dir, f"{port}.log"), "w")
+        process = subprocess.Popen(
+            [sys.executable, "node.py", str(port)] + node_args,
+            cwd=source_dir,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+
+        processes.append(process)
+        logs.append(log)
+
+    return Cluster(
+        directory=directory, ports=ports, peers=peers, processes=processes, logs=logs
+    )
+
+
+def stop_cluster(cluster: Cluster):
+    """ """
+    for process in cluster.processes:
+        process.terminate()
+
+    for process in cluster.processes:
+        process.wait()
+
+    for log in cluster.logs:
+        log.close()
+
+
+def load_arrivals(directory: str, ports: List[int]) -> Arrivals:
+    """Read the first arrival time of each block at each node."""
+    arrivals: Arrivals = {}
+
+    for port in ports:
+        node_arrivals: Dict[str, Tuple[float, int]] = {}
+        path = os.path.join(directory, "arrivals", f"{port}.csv")
+
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    timestamp, height, block_hash = line.strip().split(",")
+
+                    if block_hash not in node_arrivals:
+                        node_arrivals[block_hash] = (float(timestamp), int(height))
+
+        arrivals[port] = node_arrivals
+
+    return arrivals
+
+
+def compute_propagation(arrivals: Arrivals) -> Dict[str, List[float]]:
+    """Return for each block the delay until arrival at each node that received it, measured from
+    the first arrival, i.e. at the node which mined it."""
+    timestamps: Dict[str, List[float]] = {}
+
+    for node_arrivals in arrivals.values():
+        for block_hash, (timestamp, height) in node_arrivals.items():
+            # Genesis block is known to all nodes from the start.
+            if height == 0:
+                continue
+
+            timestamps.setdefault(block_hash, []).append(timestamp)
+
+    return {
+        block_hash: sorted(timestamp - min(values) for timestamp in values)
+        for block_hash, values in timestamps.items()
+    }
+
+
+def report_cluster(arrivals: Arrivals) -> str:
+    """Report the time for blocks to reach all nodes, the delay of each arrival, and the number
+    of heights with competing blocks."""
+    node_counter = len(arrivals)
+    propagation = compute_propagation(arrivals)
+
+    full_delays = [
+        delays[-1] for delays in propagation.values() if len(delays) == node_counter
+    ]
+    arrival_delays = [delay for delays in propagation.values() for delay in delays[1:]]
+
+    heights: Dict[int, set] = {}
+
+    for node_arrivals in arrivals.values():
+        for block_hash, (_, height) in node_arrivals.items():
+            heights.setdefault(height, set()).add(block_hash)
+
+    fork_counter = sum(1 for block_hashes in heights.values() if len(block_hashes) > 1)
+
+    return (
+        f"nodes={node_counter} blocks={len(propagation)} "
+        f"reached_all={len(full_delays)} forks={fork_counter}\n"
+        f"REPORT all_nodes {hq.report_latencies(full_delays)}\n"
+        f"REPORT each_node {hq.report_latencies(arrival_delays)}"
+    )
+
+
+def run_cluster(
+    node_counter: int,
+    topology: str = "mesh",
+    peer_counter: int = 2,
+    duration: float = 30,
+    node_args: Optional[List[str]] = None,
+    directory: Optional[str] = None,
+) -> Arrivals:
+    """ """
+    if directory is None:
+        directory = tempfile.mkdtemp(prefix="cluster-")
+
+    ports = init_ports(node_counter)
+    peers = init_topology(ports, topology, peer_counter)
+
+    print(f"START {node_counter} nodes in {topology} topology at {directory}...")
+    cluster = start_cluster(directory, peers, node_args)
+
+    try:
+        time.sleep(duration)
+
+    finally:
+        stop_cluster(cluster)
+
+    arrivals = load_arrivals(directory, ports)
+    print(f"REPORT {report_cluster(arrivals)}")
+
+    return arrivals
+
+
+if __name__ == "__main__":
+    # Specify the number of nodes, then optionally the topology, the number of peers for a random
+    # topology, the duration in seconds, and any arguments passed on to each node.
+    node_counter = int(sys.argv[1])
+    topology = sys.argv[2] if len(sys.argv) > 2 else "mesh"
+    peer_counter = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 30
+
+    run_cluster(node_counter, topology, peer_counter, duration, sys.argv[5:])
@@ -0,0 +1,74 @@
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+import blocks
+import transactions as transacts
+
+
+TRANSACTION_DTYPE = np.dtype(
+    [
+        ("reference_hash", f"V{transacts.HASH_SIZE}"),
+        ("sender", f"V{transacts.HASH_SIZE}"),
+        ("receiver", f"V{transacts.HASH_SIZE}"),
+        ("signature", f"V{transacts.SIGNATURE_SIZE}"),
+    ]
+)
+
+assert TRANSACTION_DTYPE.itemsize == transacts.TRANSACTION_SIZE
+
+
+def decode_transactions_array(
+    transaction_counter: int, transactions_bytes: Union[bytes, memoryview]
+) -> np.ndarray:
+    """Decode transactions of a block as a structured array over the bytes, without allocating
+    per transaction."""
+    return np.frombuffer(
+        transactions_bytes, dtype=TRANSACTION_DTYPE, count=transaction_counter
+    )
+
+
+def decode_blockchain_transactions(
+    blockchain_bytes: bytes,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode transactions of all blocks in the chain into one structured array, together with the
+    height of the block each transaction belongs to."""
+    sections = []
+    heights = []
+
+    for height, (block_size, block_bytes) in enumerate(
+        blocks.iterate_blockchain(memoryview(blockchain_bytes))
+    ):
+        if block_size is None:
+            break
+
+        transaction_counter = block_bytes[2 + blocks.HEADER_SIZE]
+        transactions_bytes = block_bytes[2 + blocks.HEADER_SIZE + 1 :]
+
+        sections.append(
+            decode_transactions_array(transaction_counter, transactions_bytes)
+        )
+        heights.append(np.full(transaction_counter, height, dtype=np.uint32))
+
+    if not sections:
+        return np.empty(0, dtype=TRANSACTION_DTYPE), np.empty(0, dtype=np.uint32)
+
+    # Copy the views over each block into one contiguous array in a single operation.
+    return np.concatenate(sections), np.concatenate(heights)
+
+
+def select_transactions(
+    transactions: np.ndarray,
+    sender: Optional[transacts.Hash] = None,
+    receiver: Optional[transacts.Hash] = None,
+) -> np.ndarray:
+    """Return boolean mask of transactions matching the sender and receiver, if specified."""
+    mask = np.ones(len(transactions), dtype=bool)
+
+    if sender is not None:
+        mask &= transactions["sender"] == np.void(sender)
+
+    if receiver is not None:
+        mask &= transactions["receiver"] == np.void(receiver)
+
+    return mask
@@ -1,4 +1,4 @@
-from typing import Dict, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 import dataclasses
 import hashlib
 
@@ -14,18 +14,38 @@ ENCODING = serialization.Encoding.PEM
 PUBLIC_FORMAT = serialization.PublicFormat.SubjectPublicKeyInfo
 PRIVATE_FORMAT = serialization.PrivateFormat.PKCS8
 
+DEMO_PORTS = [7000, 8000, 9000]
+VECTORS_DIR = "../vectors"
+
 
 def sign(private_key: ec.EllipticCurvePrivateKey, message: bytes) -> bytes:
     """ """
     return private_key.sign(message, SIGNATURE_ALGORITHM)
 
 
+def pad_signature(signature: bytes) -> bytes:
+    """DER-encoded signatures vary in length, so are padded to the fixed size in transactions."""
+    return signature.ljust(transacts.SIGNATURE_SIZE, b"\x00")
+
+
+def unpad_signature(signature: bytes) -> bytes:
+    """Strip padding using the length in the DER header."""
+    if len(signature) < 2:
+        return signature
+
+    return signature[: signature[1] + 2]
+
+
 def verify(
     signature: bytes, public_key: ec.EllipticCurvePublicKey, message: bytes
 ) -> bool:
-    """ """
+    """Reject padding other than zero bytes, which would change the transaction hash without
+    invalidating the signature."""
+    if len(signature) >= 2 and any(signature[signature[1] + 2 :]):
+        return False
+
     try:
-        public_key.verify(signature, message, SIGNATURE_ALGORITHM)
+        public_key.verify(unpad_signature(signature), message, SIGNATURE_ALGORITHM)
 
     except cryptography.exceptions.InvalidSignature:
         return False
@@ -33,11 +53,27 @@ def verify(
     return True
 
 
+def encode_public_key(public_key: ec.EllipticCurvePublicKey) -> bytes:
+    """Compressed point, e.g. to pass keys to other processes."""
+    return public_key.public_bytes(
+        encoding=serialization.Encoding.X962,
+        format=serialization.PublicFormat.CompressedPoint,
+    )
+
+
+def decode_public_key(public_key_bytes: bytes) -> ec.EllipticCurvePublicKey:
+    """ """
+    return ec.EllipticCurvePublicKey.from_encoded_point(
+        ec.SECP256K1(), public_key_bytes
+    )
+
+
 def save_keys(
     public_key: ec.EllipticCurvePublicKey,
     private_key: ec.EllipticCurvePrivateKey,
     name_prefix: str = "",
     require_password: bool = True,
+    directory: str = VECTORS_DIR,
 ):
     """ """
     password = None
@@ -56,15 +92,15 @@ def save_keys(
         encryption_algorithm=encryption_algorithm,
     )
 
-    with open(f"../vectors/{name_prefix}public.pem", "wb") as f:
+    with open(f"{directory}/{name_prefix}public.pem", "wb") as f:
         f.write(serialized_public)
 
-    with open(f"../vectors/{name_prefix}private.pem", "wb") as f:
+    with open(f"{directory}/{name_prefix}private.pem", "wb") as f:
         f.write(serialized_private)
 
 
 def load_keys(
-    name_prefix: str = "", require_password: bool = True
+    name_prefix: str = "", require_password: bool = True, directory: str = VECTORS_DIR
 ) -> Tuple[ec.EllipticCurvePublicKey, ec.EllipticCurvePrivateKey]:
     """ """
     password = None
@@ -72,10 +108,10 @@ def load_keys(
     if require_password:
         password = input("password: ").encode()
 
-    with open(f"../vectors/{name_prefix}public.pem", "rb") as f:
+    with open(f"{directory}/{name_prefix}public.pem", "rb") as f:
         serialized_public = f.read()
 
-    with open(f"../vectors/{name_prefix}private.pem", "rb") as f:
+    with open(f"{directory}/{name_prefix}private.pem", "rb") as f:
         serialized_private = f.read()
 
     public_key = serialization.load_pem_public_key(serialized_public)
@@ -124,31 +160,45 @@ def sign_transfer(
     wallet: Wallet, reference_hash: transacts.Hash, receiver: transacts.Hash
 ) -> bytes:
     """ """
-    return sign(wallet.private_key, reference_hash + receiver)
+    return pad_signature(sign(wallet.private_key, reference_hash + receiver))
 
 
-def init_demo_wallets(persist_keys: bool = False) -> Dict[int, Wallet]:
-    """ """
+def init_demo_wallets(
+    persist_keys: bool = False,
+    ports: Optional[List[int]] = None,
+    directory: str = VECTORS_DIR,
+) -> Dict[int, Wallet]:
+    """Use the demo ports unless ports are specified."""
+    if ports is None:
+        ports = DEMO_PORTS
+
     wallets: Dict[int, Wallet] = {}
 
-    for port in [7000, 8000, 9000]:
+    for port in ports:
         wallet = init_wallet(port=port)
         wallets[port] = wallet
 
         if persist_keys:
             name_prefix = str(port) + "-"
-            save_keys(wallet.public_key, wallet.private_key, name_prefix, False)
+            save_keys(
+                wallet.public_key, wallet.private_key, name_prefix, False, directory
+            )
 
     return wallets
 
 
-def load_demo_wallets() -> Dict[int, Wallet]:
-    """ """
+def load_demo_wallets(
+    ports: Optional[List[int]] = None, directory: str = VECTORS_DIR
+) -> Dict[int, Wallet]:
+    """Use the demo ports unless ports are specified."""
+    if ports is None:
+        ports = DEMO_PORTS
+
     wallets: Dict[int, Wallet] = {}
 
-    for port in [7000, 8000, 9000]:
+    for port in ports:
         name_prefix = str(port) + "-"
-        public_key, private_key = load_keys(name_prefix, False)
+        public_key, private_key = load_keys(name_prefix, False, directory)
 
         address = init_address(public_key)
         wallet = Wallet(
@@ -158,3 +208,9 @@ def load_demo_wallets() -> Dict[int, Wallet]:
         wallets[port] = wallet
 
     return wallets
+
+
+def load_genesis_wallet() -> Wallet:
+    """Genesis block is mined with the reward to the first demo wallet."""
+    port = DEMO_PORTS[0]
+    return load_demo_wallets([port])[port]
@@ -0,0 +1,153 @@
+from typing import Any, List, Optional, OrderedDict, Tuple
+import collections
+import dataclasses
+import os
+import struct
+import time
+
+
+# Maximum datagram size set at OS X maximum UDP package size.
+DATAGRAM_SIZE: int = 9216
+
+# Each fragment starts with the message id, the fragment index and the number of fragments.
+FRAGMENT_HEADER_FORMAT: str = ">QHH"
+FRAGMENT_HEADER_SIZE: int = struct.calcsize(FRAGMENT_HEADER_FORMAT)
+FRAGMENT_SIZE: int = DATAGRAM_SIZE - FRAGMENT_HEADER_SIZE
+
+MAX_FRAGMENT_COUNTER: int = (1 << 16) - 1
+
+BUFFER_SIZE: int = 1 << 24
+TIMEOUT: float = 5.0
+
+
+def split_message(message: bytes, fragment_size: int = FRAGMENT_SIZE) -> List[bytes]:
+    """Split message into datagrams sharing a random message id, with an empty message sent as a
+    single empty fragment."""
+    fragment_counter = max(1, -(-len(message) // fragment_size))
+    assert fragment_counter <= MAX_FRAGMENT_COUNTER
+
+    message_id = int.from_bytes(os.urandom(8), byteorder="big")
+    view = memoryview(message)
+
+    return [
+        struct.pack(FRAGMENT_HEADER_FORMAT, message_id, i, fragment_counter)
+        + view[i * fragment_size : (i + 1) * fragment_size]
+        for i in range(fragment_counter)
+    ]
+
+
+@dataclasses.dataclass
+class Partial:
+    """ """
+
+    fragments: List[Optional[bytes]]
+    fragment_counter: int
+    size: int
+    start: float
+
+
+@dataclasses.dataclass
+class Reassembler:
+    """Fragments received so far per sender and message id, oldest first. The buffer is bounded
+    in size, with the oldest partial messages dropped to make room or once timed out."""
+
+    partials: OrderedDict[Tuple[Any, int], Partial]
+    buffer_size: int
+    timeout: float
+    size: int
+
+
+def init_reassembler(
+    buffer_size: int = BUFFER_SIZE, timeout: float = TIMEOUT
+) -> Reassembler:
+    """ """
+    return Reassembler(
+        partials=collections.OrderedDict(),
+        buffer_size=buffer_size,
+        timeout=timeout,
+        size=0,
+    )
+
+
+def drop_partial(reassembler: Reassembler, key: Tuple[Any, int]):
+    """ """
+    partial = reassembler.partials.pop(key)
+    reassembler.size -= partial.size
+
+
+def evict_partials(reassembler: Reassembler, now: float, size: int = 0):
+    """Drop partial messages past the timeout, then the oldest until the size fits."""
+    partials = reassembler.partials
+
+    while partials:
+        key, partial = next(iter(partials.items()))
+
+        if (
+            now - partial.start < reassembler.timeout
+            and reassembler.size + size <= reassembler.buffer_size
+        ):
+            break
+
+        drop_partial(reassembler, key)
+
+
+def receive_fragment(
+    reassembler: Reassembler,
+    datagram: bytes,
+    address: Any,
+    now: Optional[float] = None,
+) -> Optional[bytes]:
+    """Buffer fragment and return the full message once all its fragments have arrived."""
+    if len(datagram) < FRAGMENT_HEADER_SIZE:
+        return None
+
+    if now is None:
+        now = time.monotonic()
+
+    message_id, index, fragment_counter = struct.unpack_from(
+        FRAGMENT_HEADER_FORMAT, datagram
+    )
+    fragment = datagram[FRAGMENT_HEADER_SIZE:]
+
+    if fragment_counter == 0 or index >= fragment_counter:
+        return None
+
+    if fragment_counter == 1:
+        return fragment
+
+    # Ignore messages which could never fit in the buffer.
+    if fragment_counter * FRAGMENT_SIZE > reassembler.buffer_size:
+        return None
+
+    evict_partials(reassembler, now, len(fragment))
+
+    key = (address, message_id)
+    partial = reassembler.partials.get(key)
+
+    if partial is None:
+        partial = Partial(
+            fragments=[None] * fragment_counter,
+            fragment_counter=0,
+            size=0,
+            start=now,
+        )
+        reassembler.partials[key] = partial
+
+    # Ignore duplicate fragments, or fragments disagreeing on the number of fragments.
+    if len(partial.fragments) != fragment_counter:
+        return None
+
+    if partial.fragments[index] is not None:
+        return None
+
+    partial.fragments[index] = fragment
+    partial.fragment_counter += 1
+    partial.size += len(fragment)
+    reassembler.size += len(fragment)
+
+    if partial.fragment_counter < fragment_counter:
+        return None
+
+    drop_partial(reassembler, key)
+
+    return b"".join(fragment for fragment in partial.fragments if fragment is not None)
@@ -0,0 +1,155 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import blocks
+import transactions as transacts
+
+
+BATCH_SIZE: int = 16384
+
+# SHA-256 round constants and initial hash values, see FIPS 180-4.
+ROUND_CONSTANTS: List[int] = [
+    0x428A2F98, 0x71374491, 0xB5C0FBCF, 0xE9B5DBA5, 0x3956C25B, 0x59F111F1, 0x923F82A4, 0xAB1C5ED5,
+    0xD807AA98, 0x12835B01, 0x243185BE, 0x550C7DC3, 0x72BE5D74, 0x80DEB1FE, 0x9BDC06A7, 0xC19BF174,
+    0xE49B69C1, 0xEFBE4786, 0x0FC19DC6, 0x240CA1CC, 0x2DE92C6F, 0x4A7484AA, 0x5CB0A9DC, 0x76F988DA,
+    0x983E5152, 0xA831C66D, 0xB00327C8, 0xBF597FC7, 0xC6E00BF3, 0xD5A79147, 0x06CA6351, 0x14292967,
+    0x27B70A85, 0x2E1B2138, 0x4D2C6DFC, 0x53380D13, 0x650A7354, 0x766A0ABB, 0x81C2C92E, 0x92722C85,
+    0xA2BFE8A1, 0xA81A664B, 0xC24B8B70, 0xC76C51A3, 0xD192E819, 0xD6990624, 0xF40E3585, 0x106AA070,
+    0x19A4C116, 0x1E376C08, 0x2748774C, 0x34B0BCB5, 0x391C0CB3, 0x4ED8AA4A, 0x5B9CCA4F, 0x682E6FF3,
+    0x748F82EE, 0x78A5636F, 0x84C87814, 0x8CC70208, 0x90BEFFFA, 0xA4506CEB, 0xBEF9A3F7, 0xC67178F2,
+]  # fmt: skip
+INITIAL_STATE: List[int] = [
+    0x6A09E667, 0xBB67AE85, 0x3C6EF372, 0xA54FF53A, 0x510E527F, 0x9B05688C, 0x1F83D9AB, 0x5BE0CD19,
+]  # fmt: skip
+
+BLOCK_SIZE: int = 64
+NONCE_OFFSET: int = blocks.HEADER_SIZE - 8 - BLOCK_SIZE  # i.e. in second block
+
+State = List[np.ndarray]
+
+
+def rotate_right(x: np.ndarray, n: int) -> np.ndarray:
+    """ """
+    return (x >> np.uint32(n)) | (x << np.uint32(32 - n))
+
+
+def compress(state: State, words: List[np.ndarray]) -> State:
+    """Apply the SHA-256 compression function to a batch, with each state and message word held as
+    a uint32 array across the batch."""
+    schedule = list(words)
+
+    for i in range(16, 64):
+        w_15, w_2 = schedule[i - 15], schedule[i - 2]
+        s0 = rotate_right(w_15, 7) ^ rotate_right(w_15, 18) ^ (w_15 >> np.uint32(3))
+        s1 = rotate_right(w_2, 17) ^ rotate_right(w_2, 19) ^ (w_2 >> np.uint32(10))
+        schedule.append(schedule[i - 16] + s0 + schedule[i - 7] + s1)
+
+    a, b, c, d, e, f, g, h = state
+
+    for i in range(64):
+        s1 = rotate_right(e, 6) ^ rotate_right(e, 11) ^ rotate_right(e, 25)
+        choice = (e & f) ^ (~e & g)
+        temp1 = h + s1 + choice + np.uint32(ROUND_CONSTANTS[i]) + schedule[i]
+        s0 = rotate_right(a, 2) ^ rotate_right(a, 13) ^ rotate_right(a, 22)
+        majority = (a & b) ^ (a & c) ^ (b & c)
+        temp2 = s0 + majority
+
+        h, g, f, e, d, c, b, a = g, f, e, d + temp1, c, b, a, temp1 + temp2
+
+    return [x + y for x, y in zip(state, [a, b, c, d, e, f, g, h])]
+
+
+def init_state(size: int) -> State:
+    """ """
+    return [np.full(size, value, dtype=np.uint32) for value in INITIAL_STATE]
+
+
+def encode_digest(state: State, index: int) -> bytes:
+    """ """
+    return b"".join(int(word[index]).to_bytes(4, byteorder="big") for word in state)
+
+
+def hash_headers(midstate: State, tail: bytes, nonces: np.ndarray) -> State:
+    """Compute double SHA-256 of headers sharing the first 64 bytes, where the midstate is the
+    state after the first 64 bytes and the tail is the remainder of the header."""
+    size = len(nonces)
+
+    # Pad the second block of the header, i.e. append 1 bit then the message length in bits.
+    padding = b"\x80" + bytes(BLOCK_SIZE - len(tail) - 9)
+    length = (blocks.HEADER_SIZE * 8).to_bytes(8, byteorder="big")
+    template = np.frombuffer(tail + padding + length, dtype=np.uint8)
+
+    block = np.tile(template, (size, 1))
+    block[:, NONCE_OFFSET : NONCE_OFFSET + 8] = (
+        nonces.astype(">u8").view(np.uint8).reshape(size, 8)
+    )
+
+    words = block.view(">u4").astype(np.uint32)
+    state = compress(
+        [np.broadcast_to(word, size) for word in midstate],
+        [words[:, i] for i in range(16)],
+    )
+
+    # Second hash over the 32-byte digest fits in a single padded block.
+    padding_words = [0x80000000, 0, 0, 0, 0, 0, 0, 256]
+    digest_words = state + [
+        np.full(size, word, dtype=np.uint32) for word in padding_words
+    ]
+
+    return compress(init_state(size), digest_words)
+
+
+def run_batch_proof_of_work(
+    previous_hash: transacts.Hash,
+    merkle_root: transacts.Hash,
+    timestamp: int,
+    nonce: int = 0,
+    iterations: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Tuple[bool, int, Optional[transacts.Hash], Optional[blocks.Header]]:
+    """Same search as run_proof_of_work, with double SHA-256 computed for a batch of nonces at a
+    time using NumPy array arithmetic."""
+    stop = None if iterations is None else nonce + iterations
+
+    # Nonce is written as the last 8 bytes of the header, larger values take the slow path.
+    if nonce >> 64 or (stop is not None and stop >> 64):
+        return blocks.run_proof_of_work(
+            previous_hash, merkle_root, timestamp, nonce, iterations
+        )
+
+    header_bytes = blocks.Header(
+        version=blocks.VERSION,
+        previous_hash=previous_hash,
+        merkle_root=merkle_root,
+        timestamp=timestamp,
+        nonce=0,
+    ).encode()
+
+    first_words = np.frombuffer(header_bytes[:BLOCK_SIZE], dtype=">u4")
+    first_words = first_words.astype(np.uint32)
+    midstate = compress(init_state(1), [first_words[i : i + 1] for i in range(16)])
+    tail = header_bytes[BLOCK_SIZE:]
+
+    while nonce != stop:
+        size = batch_size if stop is None else min(batch_size, stop - nonce)
+        nonces = np.arange(nonce, nonce + size, dtype=np.uint64)
+        state = hash_headers(midstate, tail, nonces)
+
+        # Proof-of-work requires the first 2 bytes of the digest, i.e. top of first word, be zero.
+        indices = np.flatnonzero((state[0] >> np.uint32(16)) == 0)
+
+        if len(indices) > 0:
+            index = int(indices[0])
+            header = blocks.Header(
+                version=blocks.VERSION,
+                previous_hash=previous_hash,
+                merkle_root=merkle_root,
+                timestamp=timestamp,
+                nonce=nonce + index,
+            )
+            return True, nonce + index, encode_digest(state, index), header
+
+        nonce += size
+
+    return False, nonce, None, None
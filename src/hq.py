@@ -1,10 +1,20 @@
+from typing import Dict, List, Optional, Tuple
 import os
 import dataclasses
 import socket
+import sys
+import time
 
 import dotenv
 
+import balances
+import blocks
+import crypto
+import fragments
+import messages
 import node
+import syncing
+import transactions as transacts
 
 
 dotenv.load_dotenv()
@@ -14,6 +24,11 @@ HQ_PORT = 6000
 
 NODE_IP = os.getenv("NODE_IP")
 
+# Interval between checks on which blocks each node has accepted, and how long to keep checking
+# after the last block is sent.
+PROBE_INTERVAL = 0.005
+LOAD_TIMEOUT = 10.0
+
 
 @dataclasses.dataclass
 class HQ:
@@ -21,6 +36,9 @@ class HQ:
 
     port: int
     sock: socket.socket
+    reassembler: fragments.Reassembler = dataclasses.field(
+        default_factory=fragments.init_reassembler
+    )
 
 
 def init_hq(port: int) -> HQ:
@@ -44,9 +62,319 @@ def run(hq: HQ):
 
         assert NODE_IP is not None
         for node_port in node.NODE_PORTS:
-            hq.sock.sendto(message, (NODE_IP, node_port))
+            send(hq, message, (NODE_IP, node_port))
+
+
+def send(hq: HQ, message: bytes, address: node.Address):
+    """ """
+    for datagram in fragments.split_message(message):
+        hq.sock.sendto(datagram, address)
+
+
+def receive(hq: HQ, timeout: float) -> Optional[Tuple[bytes, node.Address]]:
+    """Wait for a complete message up to the timeout."""
+    deadline = time.monotonic() + timeout
+
+    while True:
+        hq.sock.settimeout(max(deadline - time.monotonic(), 1e-6))
+
+        try:
+            datagram, address = hq.sock.recvfrom(fragments.DATAGRAM_SIZE)
+        except socket.timeout:
+            return None
+
+        message = fragments.receive_fragment(hq.reassembler, datagram, address)
+
+        if message is not None:
+            return message, address
+
+
+def request_blockchain(
+    hq: HQ, address: node.Address, timeout: float = 5.0
+) -> Optional[blocks.Blockchain]:
+    """ """
+    send(hq, messages.encode_message(messages.MESSAGE_GET_BLOCKCHAIN), address)
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        received = receive(hq, deadline - time.monotonic())
+
+        if received is None:
+            break
+
+        message_type, payload = messages.decode_message(received[0])
+
+        if message_type == messages.MESSAGE_BLOCKCHAIN:
+            return blocks.decode_blockchain(payload)
+
+    return None
+
+
+def init_transfers(
+    balance: balances.Balance,
+    wallets: Dict[int, crypto.Wallet],
+    transfer_counter: int,
+) -> List[transacts.Transaction]:
+    """Sign transfers of unspent outputs between the wallets, each to the next wallet. Spent
+    outputs are left in the balance, to be removed once the block is applied."""
+    ports = sorted(wallets)
+    transfers: List[transacts.Transaction] = []
+
+    for i, port in enumerate(ports):
+        sender = wallets[port]
+        receiver = wallets[ports[(i + 1) % len(ports)]]
+
+        for reference_hash in balance.accounts.get(sender.address, []):
+            if len(transfers) == transfer_counter:
+                return transfers
+
+            signature = crypto.sign_transfer(sender, reference_hash, receiver.address)
+            transfer = transacts.Transaction(
+                reference_hash=reference_hash,
+                sender=sender.address,
+                receiver=receiver.address,
+                signature=signature,
+            )
+            transfers.append(transfer)
+
+    return transfers
+
+
+def premine_blocks(
+    blockchain: blocks.Blockchain,
+    balance: balances.Balance,
+    wallets: Dict[int, crypto.Wallet],
+    block_counter: int,
+    transfer_counter: int,
+) -> List[Tuple[transacts.Hash, blocks.Block]]:
+    """Mine blocks on top of the blockchain ahead of the load test, each with a reward and up to
+    the given number of signed transfers. The balance is updated to the last block."""
+    receiver = wallets[min(wallets)].address
+    previous_hash = blockchain.chain[-1]
+    timestamp = blockchain.blocks[previous_hash].header.timestamp
+    premined_blocks = []
+
+    # Transaction counter is encoded in 1 byte.
+    transfer_counter = min(transfer_counter, 254)
+
+    for _ in range(block_counter):
+        reward = transacts.init_reward(receiver)
+        transfers = init_transfers(balance, wallets, transfer_counter)
+        transaction_list = [reward] + transfers
+
+        merkle_tree = transacts.init_merkle_tree(
+            [transaction.hash() for transaction in transaction_list]
+        )
+        assert merkle_tree is not None
+
+        timestamp = max(timestamp, int(time.time()))
+        is_found, _, block_hash, header = blocks.run_fast_proof_of_work(
+            previous_hash, merkle_tree.tree_hash, timestamp
+        )
+
+        assert is_found and block_hash is not None and header is not None
+        block = blocks.Block(header=header, transactions=transaction_list)
+
+        balance = balances.update_balance(balance, block)
+        premined_blocks.append((block_hash, block))
+        previous_hash = block_hash
+
+    return premined_blocks
+
+
+def reply_message(blockchain: blocks.Blockchain, message: bytes) -> Optional[bytes]:
+    """Serve requests from nodes syncing with the blocks sent so far."""
+    message_type, payload = messages.decode_message(message)
+
+    if message_type == messages.MESSAGE_GET_BLOCKCHAIN:
+        blockchain_bytes = blockchain.encode()
+        return messages.encode_message(messages.MESSAGE_BLOCKCHAIN, blockchain_bytes)
+
+    if message_type == messages.MESSAGE_GET_HEADERS:
+        locator = messages.decode_hashes(payload)
+        return syncing.select_headers(blockchain, locator)
+
+    if message_type == messages.MESSAGE_GET_BLOCKS:
+        block_hashes = messages.decode_hashes(payload)
+        return syncing.select_blocks(blockchain, block_hashes)
+
+    return None
+
+
+def compute_percentile(values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    rank = max(0, -(-len(values) * percentile // 100) - 1)
+    return values[min(int(rank), len(values) - 1)]
+
+
+def report_latencies(latencies: List[float]) -> str:
+    """ """
+    if not latencies:
+        return "latency=n/a"
+
+    values = sorted(latencies)
+    percentiles = " ".join(
+        f"p{percentile}={compute_percentile(values, percentile) * 1000:.1f}ms"
+        for percentile in [50, 90, 99]
+    )
+
+    return f"{percentiles} max={values[-1] * 1000:.1f}ms"
+
+
+def run_load(
+    hq: HQ,
+    rate: float,
+    block_counter: int,
+    transfer_counter: int = 0,
+    mode: str = "block",
+    timeout: float = LOAD_TIMEOUT,
+) -> Dict[int, Dict[transacts.Hash, float]]:
+    """Send pre-mined blocks to the nodes at the given rate per second, either as new blocks or as
+    the full chain so far, and record the time until each block is on the chain of each node.
+    Nodes are probed with a locator of the blocks not yet accepted, the reply to which starts
+    from the latest of these on the chain of the node."""
+    assert NODE_IP is not None
+    addresses = {port: (NODE_IP, port) for port in node.NODE_PORTS}
+
+    wallets = crypto.load_demo_wallets(node.NODE_PORTS, node.NODE_WALLET_DIR)
+    genesis_wallet = crypto.load_genesis_wallet()
+
+    keychain = {wallet.address: wallet.public_key for _, wallet in wallets.items()}
+    keychain[genesis_wallet.address] = genesis_wallet.public_key
+
+    blockchain = request_blockchain(hq, addresses[node.NODE_PORTS[0]])
+
+    if blockchain is None:
+        blockchain = blocks.init_blockchain(genesis_wallet.address)
+
+    balance = balances.init_balance(blockchain, keychain)
+
+    print(f"MINE {block_counter} blocks on top of block {len(blockchain.chain) - 1}...")
+    premined_blocks = premine_blocks(
+        blockchain, balance, wallets, block_counter, transfer_counter
+    )
+
+    heights = {block_hash: i for i, (block_hash, _) in enumerate(premined_blocks)}
+    sent_times: List[float] = []
+    latencies: Dict[int, Dict[transacts.Hash, float]] = {port: {} for port in addresses}
+
+    start = time.monotonic()
+    next_probe = start
+    deadline = start + timeout
+
+    while True:
+        now = time.monotonic()
+        sent_counter = len(sent_times)
+        is_accepted = all(len(latencies[port]) == sent_counter for port in addresses)
+
+        if sent_counter == block_counter and (is_accepted or now > deadline):
+            break
+
+        # Send next block on schedule.
+        next_send = deadline
+
+        if sent_counter < block_counter:
+            next_send = start + sent_counter / rate
+
+        if now >= next_send:
+            block_hash, block = premined_blocks[sent_counter]
+            blockchain.append(block_hash, block)
+
+            if mode == "chain":
+                blockchain_bytes = blockchain.encode()
+                message = messages.encode_message(
+                    messages.MESSAGE_BLOCKCHAIN, blockchain_bytes
+                )
+            else:
+                message = messages.encode_block_message(block)
+
+            sent_times.append(time.monotonic())
+
+            for address in addresses.values():
+                send(hq, message, address)
+
+            deadline = sent_times[-1] + timeout
+            continue
+
+        if now >= next_probe:
+            for port, address in addresses.items():
+                pending = [
+                    premined_blocks[i][0]
+                    for i in range(len(latencies[port]), len(sent_times))
+                ]
+
+                if pending:
+                    locator = pending[::-1] + syncing.init_locator(blockchain)
+                    message = messages.encode_hashes(
+                        messages.MESSAGE_GET_HEADERS, locator
+                    )
+                    send(hq, message, address)
+
+            next_probe = now + PROBE_INTERVAL
+
+        received = receive(hq, max(min(next_probe, next_send) - now, 1e-4))
+
+        if received is None:
+            continue
+
+        message, address = received
+        reply = reply_message(blockchain, message)
+
+        if reply is not None:
+            send(hq, reply, address)
+            continue
+
+        message_type, payload = messages.decode_message(message)
+
+        if message_type != messages.MESSAGE_HEADERS or address[1] not in latencies:
+            continue
+
+        # All blocks up to the latest accepted are on the chain of the node.
+        fork_hash, _ = messages.decode_headers_message(payload)
+        accepted_time = time.monotonic()
+        node_latencies = latencies[address[1]]
+
+        if fork_hash not in heights:
+            continue
+
+        for i in range(len(node_latencies), heights[fork_hash] + 1):
+            node_latencies[premined_blocks[i][0]] = accepted_time - sent_times[i]
+
+    duration = time.monotonic() - start
+
+    transfers = [len(block.transactions) - 1 for _, block in premined_blocks]
+
+    for port, node_latencies in latencies.items():
+        block_throughput = len(node_latencies) / duration
+        transfer_throughput = sum(transfers[: len(node_latencies)]) / duration
+        print(
+            f"REPORT node={port} accepted={len(node_latencies)}/{block_counter} "
+            f"blocks={block_throughput:.1f}/s transfers={transfer_throughput:.1f}/s "
+            f"{report_latencies(list(node_latencies.values()))}"
+        )
+
+    all_latencies: List[float] = []
+
+    for node_latencies in latencies.values():
+        all_latencies += node_latencies.values()
+
+    print(f"REPORT all {report_latencies(all_latencies)}")
+
+    return latencies
 
 
 if __name__ == "__main__":
     hq = init_hq(port=HQ_PORT)
-    run(hq)
+
+    # Optionally run load test, with the rate of blocks per second, the number of blocks, the
+    # number of transfers per block and whether to send new blocks or the full chain.
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        rate = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+        block_counter = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+        transfer_counter = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+        mode = sys.argv[5] if len(sys.argv) > 5 else "block"
+
+        run_load(hq, rate, block_counter, transfer_counter, mode)
+
+    else:
+        run(hq)
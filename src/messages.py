@@ -0,0 +1,191 @@
+from typing import Any, List, Optional, OrderedDict, Tuple
+import hashlib
+
+import blocks
+import fragments
+import transactions as transacts
+
+
+# Each message starts with a 1-byte message type, followed by the payload.
+MESSAGE_BLOCKCHAIN: int = 0  # i.e. full encoded blockchain
+MESSAGE_BLOCK: int = 1  # i.e. parent hash then encoded block
+MESSAGE_GET_BLOCKCHAIN: int = 2  # i.e. empty, reply with full blockchain
+MESSAGE_GET_HEADERS: int = 3  # i.e. locator hashes, reply with headers after fork point
+MESSAGE_HEADERS: int = 4  # i.e. fork point hash then headers
+MESSAGE_GET_BLOCKS: int = 5  # i.e. block hashes, reply with blocks
+MESSAGE_BLOCKS: int = 6  # i.e. encoded blocks
+
+MESSAGE_TYPES: Tuple[int, ...] = (
+    MESSAGE_BLOCKCHAIN,
+    MESSAGE_BLOCK,
+    MESSAGE_GET_BLOCKCHAIN,
+    MESSAGE_GET_HEADERS,
+    MESSAGE_HEADERS,
+    MESSAGE_GET_BLOCKS,
+    MESSAGE_BLOCKS,
+)
+
+# Announcements are broadcast by peers unprompted, so the same one may arrive more than once.
+ANNOUNCEMENT_TYPES: Tuple[int, ...] = (MESSAGE_BLOCKCHAIN, MESSAGE_BLOCK)
+
+# Number of announcement digests remembered across bursts of messages.
+SEEN_SIZE: int = 4096
+
+# Replies built in batches, i.e. headers and blocks, are kept within a single fragment.
+MAX_MESSAGE_SIZE: int = fragments.FRAGMENT_SIZE
+
+
+def encode_message(message_type: int, payload: bytes = b"") -> bytes:
+    """ """
+    return message_type.to_bytes(1, byteorder="big") + payload
+
+
+def decode_message(message: bytes) -> Tuple[Optional[int], bytes]:
+    """ """
+    if len(message) == 0 or message[0] not in MESSAGE_TYPES:
+        return None, b""
+
+    return message[0], message[1:]
+
+
+def encode_block_message(block: blocks.Block) -> bytes:
+    """ """
+    return encode_message(MESSAGE_BLOCK, block.header.previous_hash + block.encode())
+
+
+def decode_block_message(
+    payload: bytes,
+) -> Tuple[Optional[transacts.Hash], Optional[blocks.Block]]:
+    """ """
+    if len(payload) < transacts.HASH_SIZE + 2 + blocks.HEADER_SIZE + 1:
+        return None, None
+
+    parent_hash = payload[: transacts.HASH_SIZE]
+    block = blocks.decode_block(payload[transacts.HASH_SIZE :])
+
+    if block.header.previous_hash != parent_hash:
+        return None, None
+
+    return parent_hash, block
+
+
+def encode_hashes(message_type: int, hashes: List[transacts.Hash]) -> bytes:
+    """ """
+    return encode_message(message_type, b"".join(hashes))
+
+
+def decode_hashes(payload: bytes) -> List[transacts.Hash]:
+    """ """
+    return [
+        payload[i : i + transacts.HASH_SIZE]
+        for i in range(0, len(payload) - transacts.HASH_SIZE + 1, transacts.HASH_SIZE)
+    ]
+
+
+def encode_headers_message(
+    fork_hash: transacts.Hash, headers: List[blocks.AnyHeader]
+) -> bytes:
+    """ """
+    headers_bytes = b"".join(header.encode() for header in headers)
+    return encode_message(MESSAGE_HEADERS, fork_hash + headers_bytes)
+
+
+def decode_headers_message(
+    payload: bytes,
+) -> Tuple[Optional[transacts.Hash], List[blocks.Header]]:
+    """ """
+    if len(payload) < transacts.HASH_SIZE:
+        return None, []
+
+    fork_hash = payload[: transacts.HASH_SIZE]
+    headers_bytes = payload[transacts.HASH_SIZE :]
+
+    headers = [
+        blocks.decode_header(headers_bytes[i : i + blocks.HEADER_SIZE])
+        for i in range(
+            0, len(headers_bytes) - blocks.HEADER_SIZE + 1, blocks.HEADER_SIZE
+        )
+    ]
+
+    return fork_hash, headers
+
+
+def encode_blocks_message(blocks_list: List[blocks.Block]) -> bytes:
+    """ """
+    return encode_message(
+        MESSAGE_BLOCKS, b"".join(block.encode() for block in blocks_list)
+    )
+
+
+def decode_blocks_message(payload: bytes) -> List[blocks.Block]:
+    """ """
+    blocks_list = []
+
+    for block_size, block_bytes in blocks.iterate_blockchain(payload):
+        # Stop on truncated or malformed block sizes, which would not advance the iteration.
+        if block_size is None or block_size < 2 + blocks.HEADER_SIZE + 1:
+            break
+
+        if len(block_bytes) < block_size:
+            break
+
+        blocks_list.append(blocks.decode_block(block_bytes))
+
+    return blocks_list
+
+
+def drop_duplicates(
+    received: List[Tuple[bytes, Any]],
+    seen: OrderedDict[bytes, None],
+) -> List[Tuple[bytes, Any]]:
+    """Drop byte-identical messages within a burst, and announcements already handled in earlier
+    bursts. Requests are dropped only if repeated by the same sender."""
+    unique = []
+    keys = set()
+
+    for message, address in received:
+        digest = hashlib.sha256(message).digest()
+        is_announcement = len(message) > 0 and message[0] in ANNOUNCEMENT_TYPES
+        key = (digest, None if is_announcement else address)
+
+        if key in keys:
+            continue
+
+        keys.add(key)
+
+        if is_announcement and digest in seen:
+            seen.move_to_end(digest)
+            continue
+
+        unique.append((message, address))
+
+    return unique
+
+
+def record_seen(
+    seen: OrderedDict[bytes, None], message: bytes, seen_size: int = SEEN_SIZE
+):
+    """Remember announcement once handled successfully, so one rejected, e.g. for arriving before
+    its parent, is handled again when received in a later burst."""
+    if len(message) == 0 or message[0] not in ANNOUNCEMENT_TYPES:
+        return
+
+    digest = hashlib.sha256(message).digest()
+    seen[digest] = None
+    seen.move_to_end(digest)
+
+    if len(seen) > seen_size:
+        seen.popitem(last=False)
+
+
+def count_blocks(blockchain_bytes: bytes) -> int:
+    """Count blocks from the block sizes only, without decoding."""
+    block_counter = 0
+
+    for block_size, block_bytes in blocks.iterate_blockchain(blockchain_bytes):
+        if block_size is None or block_size == 0 or len(block_bytes) < block_size:
+            break
+
+        block_counter += 1
+
+    return block_counter
@@ -0,0 +1,348 @@
+from typing import Any, Deque, Optional, Tuple
+import collections
+import dataclasses
+import multiprocessing
+import multiprocessing.pool
+
+import blocks
+import transactions as transacts
+
+
+CHUNK_SIZE: int = 10000
+SLICE_SIZE: int = 1000
+
+ProofOfWork = Tuple[bool, int, Optional[transacts.Hash], Optional[blocks.Header]]
+
+# Shared state set in each worker by the pool initializer. The generation is bumped to cancel a
+# search, and the found index records the lowest chunk index solved in the current generation.
+_generation: Any = None
+_found_index: Any = None
+
+NOT_FOUND: int = (1 << 63) - 1
+
+
+def init_worker(generation: Any, found_index: Any):
+    """ """
+    global _generation, _found_index
+
+    _generation = generation
+    _found_index = found_index
+
+
+def search_chunk(
+    generation: int,
+    chunk_index: int,
+    previous_hash: transacts.Hash,
+    merkle_root: transacts.Hash,
+    timestamp: int,
+    nonce: int,
+    iterations: int,
+) -> Tuple[int, ProofOfWork]:
+    """Run proof-of-work over a range of nonces, checking between slices whether the search has
+    been cancelled or solved in an earlier chunk."""
+    stop = nonce + iterations
+
+    while nonce < stop:
+        if _generation.value != generation or _found_index.value < chunk_index:
+            return chunk_index, (False, nonce, None, None)
+
+        slice_size = min(SLICE_SIZE, stop - nonce)
+        result = blocks.run_fast_proof_of_work(
+            previous_hash, merkle_root, timestamp, nonce, slice_size
+        )
+
+        if result[0]:
+            with _generation.get_lock():
+                if _generation.value == generation and chunk_index < _found_index.value:
+                    _found_index.value = chunk_index
+
+            return chunk_index, result
+
+        nonce = result[1]
+
+    return chunk_index, (False, nonce, None, None)
+
+
+@dataclasses.dataclass
+class Miner:
+    """ """
+
+    pool: multiprocessing.pool.Pool
+    processes: int
+    generation: Any
+    found_index: Any
+
+
+def init_miner(processes: Optional[int] = None) -> Miner:
+    """ """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    generation = multiprocessing.Value("q", 0)
+    found_index = multiprocessing.Value("q", NOT_FOUND)
+    pool = multiprocessing.Pool(
+        processes, initializer=init_worker, initargs=(generation, found_index)
+    )
+
+    return Miner(
+        pool=pool, processes=processes, generation=generation, found_index=found_index
+    )
+
+
+def close_miner(miner: Miner):
+    """ """
+    with miner.generation.get_lock():
+        miner.generation.value += 1
+
+    miner.pool.terminate()
+    miner.pool.join()
+
+
+@dataclasses.dataclass
+class Search:
+    """ """
+
+    miner: Miner
+    generation: int
+    previous_hash: transacts.Hash
+    merkle_root: transacts.Hash
+    timestamp: int
+    nonce: int
+    stop: Optional[int]
+    chunk_size: int
+    chunk_counter: int
+    pending: Deque[multiprocessing.pool.AsyncResult]
+    result: Optional[ProofOfWork]
+
+
+def submit_chunk(search: Search) -> bool:
+    """ """
+    chunk_nonce = search.nonce + search.chunk_counter * search.chunk_size
+
+    if search.stop is not None and chunk_nonce >= search.stop:
+        return False
+
+    chunk_size = search.chunk_size
+
+    if search.stop is not None:
+        chunk_size = min(chunk_size, search.stop - chunk_nonce)
+
+    async_result = search.miner.pool.apply_async(
+        search_chunk,
+        (
+            search.generation,
+            search.chunk_counter,
+            search.previous_hash,
+            search.merkle_root,
+            search.timestamp,
+            chunk_nonce,
+            chunk_size,
+        ),
+    )
+
+    search.pending.append(async_result)
+    search.chunk_counter += 1
+
+    return True
+
+
+def start_search(
+    miner: Miner,
+    previous_hash: transacts.Hash,
+    merkle_root: transacts.Hash,
+    timestamp: int,
+    nonce: int = 0,
+    iterations: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> Search:
+    """Split the nonce space into chunks and keep twice as many chunks in flight as there are
+    processes. Any search previously started on the miner is cancelled."""
+    with miner.generation.get_lock():
+        miner.generation.value += 1
+        generation = miner.generation.value
+        miner.found_index.value = NOT_FOUND
+
+    search = Search(
+        miner=miner,
+        generation=generation,
+        previous_hash=previous_hash,
+        merkle_root=merkle_root,
+        timestamp=timestamp,
+        nonce=nonce,
+        stop=None if iterations is None else nonce + iterations,
+        chunk_size=chunk_size,
+        chunk_counter=0,
+        pending=collections.deque(),
+        result=None,
+    )
+
+    for _ in range(2 * miner.processes):
+        if not submit_chunk(search):
+            break
+
+    return search
+
+
+def poll_search(search: Search, timeout: Optional[float] = 0) -> Optional[ProofOfWork]:
+    """Collect chunk results in nonce order, so the solution returned is the lowest nonce and
+    matches run_proof_of_work. Returns None if still running after the timeout."""
+    if search.result is not None:
+        return search.result
+
+    while search.pending:
+        async_result = search.pending[0]
+        async_result.wait(timeout)
+
+        if not async_result.ready():
+            return None
+
+        search.pending.popleft()
+        _, result = async_result.get()
+        is_found, nonce, _, _ = result
+
+        if is_found or search.miner.generation.value != search.generation:
+            cancel_search(search)
+            search.result = result
+            return result
+
+        if search.stop is not None and nonce == search.stop:
+            search.result = result
+            return result
+
+        submit_chunk(search)
+
+    return search.result
+
+
+def cancel_search(search: Search):
+    """ """
+    miner = search.miner
+
+    with miner.generation.get_lock():
+        if miner.generation.value == search.generation:
+            miner.generation.value += 1
+
+    if search.result is None:
+        searched_counter = search.chunk_counter - len(search.pending)
+        nonce = search.nonce + searched_counter * search.chunk_size
+        search.result = False, nonce, None, None
+
+    search.pending.clear()
+
+
+def run_parallel_proof_of_work(
+    previous_hash: transacts.Hash,
+    merkle_root: transacts.Hash,
+    timestamp: int,
+    nonce: int = 0,
+    iterations: Optional[int] = None,
+    miner: Optional[Miner] = None,
+) -> ProofOfWork:
+    """Parallel version of run_proof_of_work across a process pool, returning the same result."""
+    is_temporary = miner is None
+
+    if miner is None:
+        miner = init_miner()
+
+    try:
+        search = start_search(
+            miner, previous_hash, merkle_root, timestamp, nonce, iterations
+        )
+        result = poll_search(search, None)
+
+    finally:
+        if is_temporary:
+            close_miner(miner)
+
+    assert result is not None
+    return result
+
+
+@dataclasses.dataclass
+class Scheduler:
+    """ """
+
+    target_latency: float
+    listen_timeout: float
+    min_slice_size: int
+    max_slice_size: int
+    hash_rate: Optional[float]
+    activity: float
+    slice_counter: int
+    slice_total: int
+    mining_time: float
+    listening_time: float
+
+
+def init_scheduler(
+    target_latency: float = 0.05,
+    listen_timeout: float = 0.01,
+    min_slice_size: int = 100,
+    max_slice_size: int = 1000000,
+) -> Scheduler:
+    """ """
+    return Scheduler(
+        target_latency=target_latency,
+        listen_timeout=listen_timeout,
+        min_slice_size=min_slice_size,
+        max_slice_size=max_slice_size,
+        hash_rate=None,
+        activity=0,
+        slice_counter=0,
+        slice_total=0,
+        mining_time=0,
+        listening_time=0,
+    )
+
+
+def next_slice_size(scheduler: Scheduler) -> int:
+    """Size the mining slice so it completes within the target reaction latency at the recent hash
+    rate, with the latency budget shrinking while messages are arriving."""
+    if scheduler.hash_rate is None:
+        return scheduler.min_slice_size
+
+    latency = scheduler.target_latency / (1 + scheduler.activity)
+    slice_size = int(scheduler.hash_rate * latency)
+
+    return max(scheduler.min_slice_size, min(scheduler.max_slice_size, slice_size))
+
+
+def record_mining(scheduler: Scheduler, iterations: int, duration: float):
+    """ """
+    scheduler.slice_counter += 1
+    scheduler.slice_total += iterations
+    scheduler.mining_time += duration
+
+    if duration <= 0:
+        return
+
+    # Exponentially weighted so the hash rate follows recent slices.
+    hash_rate = iterations / duration
+
+    if scheduler.hash_rate is None:
+        scheduler.hash_rate = hash_rate
+    else:
+        scheduler.hash_rate = 0.8 * scheduler.hash_rate + 0.2 * hash_rate
+
+
+def record_listening(scheduler: Scheduler, duration: float, is_message: bool):
+    """ """
+    scheduler.listening_time += duration
+    scheduler.activity = 0.8 * scheduler.activity + (0.2 if is_message else 0)
+
+
+def report_scheduler(scheduler: Scheduler) -> str:
+    """ """
+    total_time = scheduler.mining_time + scheduler.listening_time
+    mining_share = scheduler.mining_time / total_time if total_time > 0 else 0
+    average_slice_size = scheduler.slice_total / max(scheduler.slice_counter, 1)
+
+    return (
+        f"slices={scheduler.slice_counter} "
+        f"average_slice_size={average_slice_size:.0f} "
+        f"next_slice_size={next_slice_size(scheduler)} "
+        f"hash_rate={scheduler.hash_rate or 0:.0f}/s "
+        f"mining={scheduler.mining_time:.2f}s "
+        f"listening={scheduler.listening_time:.2f}s "
+        f"mining_share={mining_share:.0%}"
+    )
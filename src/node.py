@@ -1,8 +1,11 @@
+from typing import List, Optional, OrderedDict, TextIO, Tuple
+import asyncio
+import collections
 import dataclasses
-import hashlib
 import os
 import socket
 import sys
+import threading
 import time
 
 import dotenv
@@ -10,13 +13,45 @@ import dotenv
 import balances
 import blocks
 import crypto
+import fragments
+import messages
+import mining
+import storage
+import syncing
 import transactions as transacts
+import verification
 
 
 dotenv.load_dotenv()
 
 NODE_IP = os.getenv("NODE_IP")
-NODE_PORTS = [7000, 8000, 9000]
+NODE_PORTS = [
+    int(port) for port in os.getenv("NODE_PORTS", "7000,8000,9000").split(",")
+]
+
+# Ports of the nodes to broadcast to, with all other nodes used if not set.
+NODE_PEERS = os.getenv("NODE_PEERS")
+
+# Directory of the wallet keys of all nodes, named by port.
+NODE_WALLET_DIR = os.getenv("NODE_WALLET_DIR", crypto.VECTORS_DIR)
+
+# Directory for the block arrival times of each node, not recorded if not set.
+NODE_ARRIVALS_DIR = os.getenv("NODE_ARRIVALS_DIR")
+
+# Number of processes verifying signatures of received chains, with verification on the current
+# process if not set.
+NODE_VERIFIER_PROCESSES = os.getenv("NODE_VERIFIER_PROCESSES")
+
+# Maximum number of datagrams read from the socket at once.
+DRAIN_SIZE = 1024
+
+Address = Tuple[str, int]
+
+# Directory for the block store of each node, with blocks kept in memory only if not set.
+NODE_DATA_DIR = os.getenv("NODE_DATA_DIR")
+
+# Number of blocks between snapshots of the balance in the block store.
+SNAPSHOT_INTERVAL = 1000
 
 
 def bind_socket(ip_address: str, port: int) -> socket.socket:
@@ -32,71 +67,512 @@ class Node:
 
     address: transacts.Hash
     port: int
-    sock: socket.socket
+    sock: Optional[socket.socket]
     blockchain: blocks.Blockchain
     balance: balances.Balance
+    store: Optional[storage.Store] = None
+    sync: Optional[syncing.Sync] = None
+    reassembler: fragments.Reassembler = dataclasses.field(
+        default_factory=fragments.init_reassembler
+    )
+    seen: OrderedDict[bytes, None] = dataclasses.field(
+        default_factory=collections.OrderedDict
+    )
+    peers: Optional[List[int]] = None
+    arrivals: Optional[TextIO] = None
+    verifier: Optional[verification.Verifier] = None
+    snapshot_height: int = 0
 
 
 def init_node(port: int) -> Node:
-    """ """
+    """Restore blockchain from the block store if the data directory is set, and the balance from
+    its snapshot with only the blocks after the snapshot replayed."""
     assert NODE_IP is not None
     sock = bind_socket(NODE_IP, port)
 
-    wallets = crypto.load_demo_wallets()
+    wallets = crypto.load_demo_wallets(NODE_PORTS, NODE_WALLET_DIR)
     address = wallets[port].address
+
+    genesis_wallet = crypto.load_genesis_wallet()
     keychain = {wallet.address: wallet.public_key for _, wallet in wallets.items()}
+    keychain[genesis_wallet.address] = genesis_wallet.public_key
 
-    blockchain = blocks.init_blockchain(wallets[7000].address)
-    balance = balances.init_balance(blockchain, keychain)
+    store = None
+    blockchain = None
+    snapshot_bytes = None
 
-    return Node(
-        address=address, port=port, sock=sock, blockchain=blockchain, balance=balance
+    if NODE_DATA_DIR is not None:
+        store = storage.open_store(os.path.join(NODE_DATA_DIR, str(port)))
+        blockchain = storage.load_blockchain(store)
+        snapshot_bytes = storage.load_snapshot(store)
+
+    if blockchain is None:
+        blockchain = blocks.init_blockchain(genesis_wallet.address)
+
+    balance = balances.restore_balance(
+        blockchain, snapshot_bytes, keychain, verification.init_cache()
     )
 
+    # Balance restored from a snapshot is not saved again until the interval has passed.
+    snapshot_height = 0
 
-def broadcast(node: Node, message: bytes):
-    """ """
-    for node_port in NODE_PORTS:
-        if node_port == node.port:
-            continue
+    if snapshot_bytes is not None:
+        snapshot_height = blockchain.height(balance.latest_hash) or 0
 
-        node.sock.sendto(message, (NODE_IP, node_port))
+    peers = None
+    arrivals = None
+    verifier = None
 
+    if NODE_PEERS is not None:
+        peers = [int(peer) for peer in NODE_PEERS.split(",") if peer]
 
-def run(node: Node):
-    """ """
+    if NODE_ARRIVALS_DIR is not None:
+        arrivals = open(os.path.join(NODE_ARRIVALS_DIR, f"{port}.csv"), "a")
+
+    if NODE_VERIFIER_PROCESSES is not None:
+        verifier = verification.init_verifier(int(NODE_VERIFIER_PROCESSES))
+
+    node = Node(
+        address=address,
+        port=port,
+        sock=sock,
+        blockchain=blockchain,
+        balance=balance,
+        store=store,
+        peers=peers,
+        arrivals=arrivals,
+        verifier=verifier,
+        snapshot_height=snapshot_height,
+    )
+    save_blockchain(node)
+
+    return node
+
+
+def save_blockchain(node: Node):
+    """Save the balance too every number of blocks, once it is up to date with the chain."""
+    if node.store is None:
+        return
+
+    storage.save_blockchain(node.store, node.blockchain)
+    height = len(node.blockchain.chain) - 1
+
+    if (
+        height >= node.snapshot_height + SNAPSHOT_INTERVAL
+        and node.balance.latest_hash == node.blockchain.chain[-1]
+    ):
+        storage.save_snapshot(node.store, balances.encode_balance(node.balance))
+        node.snapshot_height = height
+
+
+def record_arrivals(node: Node, start: int):
+    """Record arrival time of the blocks on the chain from the start height, if enabled."""
+    if node.arrivals is None:
+        return
+
+    chain = node.blockchain.chain
+    timestamp = time.time()
+
+    for height in range(start, len(chain)):
+        node.arrivals.write(f"{timestamp:.6f},{height},{bytes.hex(chain[height])}\n")
+
+    node.arrivals.flush()
+
+
+def report_cache(node: Node):
+    """Report hit rate of the verification cache, which saves work when chains are replaced."""
+    if node.balance.cache is not None:
+        print(f"REPORT cache {verification.report_cache(node.balance.cache)}")
+
+
+def send_datagrams(
+    node: Node,
+    datagrams: List[bytes],
+    address: Tuple[str, int],
+    transport: Optional[asyncio.DatagramTransport] = None,
+):
+    """Send datagrams via the transport if the socket is owned by an event loop."""
+    assert node.sock is not None
+
+    for datagram in datagrams:
+        if transport is not None:
+            transport.sendto(datagram, address)
+        else:
+            node.sock.sendto(datagram, address)
+
+
+def send(
+    node: Node,
+    message: bytes,
+    address: Tuple[str, int],
+    transport: Optional[asyncio.DatagramTransport] = None,
+):
+    """Send message split into fragments, so messages of any size fit in datagrams."""
+    send_datagrams(node, fragments.split_message(message), address, transport)
+
+
+def init_peer_addresses(node: Node) -> List[Address]:
+    """Return addresses of the peers of the node, or all other nodes if not set."""
+    assert NODE_IP is not None
+    peers = node.peers if node.peers is not None else NODE_PORTS
+
+    return [(NODE_IP, port) for port in peers if port != node.port]
+
+
+def broadcast(
+    node: Node,
+    message: bytes,
+    transport: Optional[asyncio.DatagramTransport] = None,
+):
+    """Send message to the peers of the node."""
+    datagrams = fragments.split_message(message)
+
+    for address in init_peer_addresses(node):
+        send_datagrams(node, datagrams, address, transport)
+
+
+def copy_blockchain(node: Node, blockchain_bytes: bytes) -> bool:
+    """Decode blockchain and replace blockchain and balance if valid and longer than existing."""
+    blockchain = blocks.decode_blockchain(blockchain_bytes)
+
+    is_valid_blockchain, balance = balances.replace_blockchain(
+        blockchain, node.blockchain, node.balance, node.verifier
+    )
+
+    if not is_valid_blockchain:
+        print("IGNORE blockchain...")
+        return False
+
+    start = blocks.find_fork_height(node.blockchain.chain, blockchain.chain)
+    node.blockchain = blockchain
+    block_hash = blockchain.chain[-1]
+
+    print(f"COPY block {len(blockchain.chain) - 1}: {bytes.hex(block_hash)}!")
+
+    assert balance is not None
+    node.balance = balance
+
+    save_blockchain(node)
+    record_arrivals(node, start)
+    report_cache(node)
+
+    return True
+
+
+def copy_block(node: Node, payload: bytes) -> Tuple[bool, Optional[bytes]]:
+    """Append new block if its parent is the tip of the blockchain and the block is valid. If the
+    parent is unknown, blocks are missing here so reply with a request for headers."""
+    parent_hash, block = messages.decode_block_message(payload)
+
+    if parent_hash is None or block is None:
+        print("IGNORE block...")
+        return False, None
+
+    # Block may already be known, e.g. relayed by several peers.
+    if block.header.hash() in node.blockchain.blocks:
+        return False, None
+
+    if parent_hash not in node.blockchain.blocks:
+        print("REQUEST headers...")
+        locator = syncing.init_locator(node.blockchain)
+        return False, messages.encode_hashes(messages.MESSAGE_GET_HEADERS, locator)
+
+    is_valid_block, balance = balances.extend_blockchain(
+        node.blockchain, node.balance, block, node.verifier
+    )
+
+    if not is_valid_block:
+        print("IGNORE block...")
+        return False, None
+
+    block_hash = node.blockchain.chain[-1]
+    print(f"COPY block {len(node.blockchain.chain) - 1}: {bytes.hex(block_hash)}!")
+
+    assert balance is not None
+    node.balance = balance
+
+    save_blockchain(node)
+    record_arrivals(node, len(node.blockchain.chain) - 1)
+
+    return True, None
+
+
+def copy_headers(node: Node, payload: bytes) -> Optional[bytes]:
+    """Check headers for proof-of-work and linkage, then reply with a request for more headers if
+    the message was full, or for missing blocks if they lead to a longer chain."""
+    fork_hash, headers = messages.decode_headers_message(payload)
+
+    if fork_hash is None:
+        print("IGNORE headers...")
+        return None
+
+    # Continue the current sync if the headers follow on from the latest header received.
+    if node.sync is None or syncing.tip_hash(node.sync) != fork_hash:
+        node.sync = syncing.init_sync(node.blockchain, fork_hash)
+
+    if node.sync is None or not syncing.extend_sync(node.sync, headers):
+        print("IGNORE headers...")
+        node.sync = None
+        return None
+
+    if len(headers) == syncing.MAX_HEADERS:
+        print("REQUEST headers...")
+        locator = syncing.init_sync_locator(node.blockchain, node.sync)
+        return messages.encode_hashes(messages.MESSAGE_GET_HEADERS, locator)
+
+    if not syncing.is_longer(node.blockchain, node.sync):
+        print("IGNORE headers...")
+        node.sync = None
+        return None
+
+    print(f"REQUEST {len(node.sync.hashes)} blocks...")
+    missing_hashes = syncing.find_missing_hashes(node.sync)
+    return messages.encode_hashes(messages.MESSAGE_GET_BLOCKS, missing_hashes)
+
+
+def copy_blocks(node: Node, payload: bytes) -> Tuple[bool, Optional[bytes]]:
+    """Collect blocks requested during sync, and replace the blockchain once all have arrived."""
+    if node.sync is None:
+        print("IGNORE blocks...")
+        return False, None
+
+    syncing.add_blocks(node.sync, messages.decode_blocks_message(payload))
+    missing_hashes = syncing.find_missing_hashes(node.sync)
+
+    if missing_hashes:
+        reply = messages.encode_hashes(messages.MESSAGE_GET_BLOCKS, missing_hashes)
+        return False, reply
+
+    blockchain = syncing.build_blockchain(node.blockchain, node.sync)
+    node.sync = None
+
+    if blockchain is None:
+        print("IGNORE blocks...")
+        return False, None
+
+    is_valid_blockchain, balance = balances.replace_blockchain(
+        blockchain, node.blockchain, node.balance, node.verifier
+    )
+
+    if not is_valid_blockchain:
+        print("IGNORE blocks...")
+        return False, None
+
+    start = blocks.find_fork_height(node.blockchain.chain, blockchain.chain)
+    node.blockchain = blockchain
+    block_hash = blockchain.chain[-1]
+
+    print(f"COPY block {len(blockchain.chain) - 1}: {bytes.hex(block_hash)}!")
+
+    assert balance is not None
+    node.balance = balance
+
+    save_blockchain(node)
+    record_arrivals(node, start)
+    report_cache(node)
+
+    return True, None
+
+
+def receive_message(node: Node, message: bytes) -> Tuple[bool, Optional[bytes]]:
+    """Handle message by type. Returns whether the tip of the blockchain changed, and the reply to
+    send back to the sender if any."""
+    message_type, payload = messages.decode_message(message)
+
+    if message_type == messages.MESSAGE_BLOCKCHAIN:
+        return copy_blockchain(node, payload), None
+
+    if message_type == messages.MESSAGE_BLOCK:
+        return copy_block(node, payload)
+
+    if message_type == messages.MESSAGE_GET_BLOCKCHAIN:
+        blockchain_bytes = node.blockchain.encode()
+        reply = messages.encode_message(messages.MESSAGE_BLOCKCHAIN, blockchain_bytes)
+        return False, reply
+
+    if message_type == messages.MESSAGE_GET_HEADERS:
+        locator = messages.decode_hashes(payload)
+        return False, syncing.select_headers(node.blockchain, locator)
+
+    if message_type == messages.MESSAGE_HEADERS:
+        return False, copy_headers(node, payload)
+
+    if message_type == messages.MESSAGE_GET_BLOCKS:
+        block_hashes = messages.decode_hashes(payload)
+        return False, syncing.select_blocks(node.blockchain, block_hashes)
+
+    if message_type == messages.MESSAGE_BLOCKS:
+        return copy_blocks(node, payload)
+
+    print("IGNORE message...")
+    return False, None
+
+
+def receive_messages(
+    node: Node,
+    received: List[Tuple[bytes, Address]],
+    peer_addresses: List[Address],
+) -> Tuple[bool, List[Tuple[bytes, Address]]]:
+    """Handle a burst of complete messages, with duplicates dropped. Of the chains received, only
+    the longest is validated, then shorter ones only if invalid. Returns whether the tip of the
+    blockchain changed, and the messages to send, with any new tip relayed to peers."""
+    received = messages.drop_duplicates(received, node.seen)
+
+    blockchains = []
+    others = []
+
+    for message, address in received:
+        message_type, payload = messages.decode_message(message)
+
+        if message_type == messages.MESSAGE_BLOCKCHAIN:
+            blockchains.append((payload, message))
+        else:
+            others.append((message, address))
+
+    blockchains.sort(key=lambda item: messages.count_blocks(item[0]), reverse=True)
+
+    is_new_tip = False
+    replies = []
+
+    for blockchain_bytes, message in blockchains:
+        if messages.count_blocks(blockchain_bytes) <= len(node.blockchain.chain):
+            break
+
+        if copy_blockchain(node, blockchain_bytes):
+            messages.record_seen(node.seen, message)
+            is_new_tip = True
+            break
+
+    for message, address in others:
+        is_new_block, reply = receive_message(node, message)
+        is_new_tip = is_new_tip or is_new_block
+
+        # Announcements are only remembered once accepted, so a rejected one can be retried.
+        if is_new_block:
+            messages.record_seen(node.seen, message)
+
+        if reply is not None:
+            replies.append((reply, address))
+
+    # Relay the new tip, so blocks reach nodes not directly connected to the miner.
+    if is_new_tip:
+        senders = {address for _, address in received}
+        block = node.blockchain.blocks[node.blockchain.chain[-1]]
+        relay = messages.encode_block_message(block)
+
+        for address in peer_addresses:
+            if address not in senders:
+                replies.append((relay, address))
+
+    return is_new_tip, replies
+
+
+def receive_datagrams(
+    node: Node, datagrams: List[Tuple[bytes, Address]]
+) -> Tuple[bool, List[Tuple[bytes, Address]]]:
+    """Reassemble a burst of datagrams and handle the complete messages."""
+    received = []
+
+    for datagram, address in datagrams:
+        message = fragments.receive_fragment(node.reassembler, datagram, address)
+
+        if message is not None:
+            received.append((message, address))
+
+    return receive_messages(node, received, init_peer_addresses(node))
+
+
+def drain_datagrams(node: Node) -> List[Tuple[bytes, Address]]:
+    """Read the datagrams already waiting on the socket, without blocking."""
+    assert node.sock is not None
+    datagrams: List[Tuple[bytes, Address]] = []
+    timeout = node.sock.gettimeout()
+    node.sock.setblocking(False)
+
+    try:
+        while len(datagrams) < DRAIN_SIZE:
+            datagrams.append(node.sock.recvfrom(fragments.DATAGRAM_SIZE))
+
+    except BlockingIOError:
+        pass
+
+    finally:
+        node.sock.settimeout(timeout)
+
+    return datagrams
+
+
+def add_block(
+    node: Node,
+    header: blocks.Header,
+    block_hash: transacts.Hash,
+    reward: transacts.Transaction,
+) -> blocks.Block:
+    """Append newly mined block to blockchain and update balance."""
+    block = blocks.Block(header=header, transactions=[reward])
+
+    node.blockchain.append(block_hash, block)
+
+    print(f"CREATE block {len(node.blockchain.chain) - 1}: {bytes.hex(block_hash)}!")
+
+    node.balance = balances.update_balance(node.balance, block)
+
+    save_blockchain(node)
+    record_arrivals(node, len(node.blockchain.chain) - 1)
+
+    return block
+
+
+def run(
+    node: Node,
+    miner: Optional[mining.Miner] = None,
+    scheduler: Optional[mining.Scheduler] = None,
+    is_mining: bool = True,
+):
+    """Mine on a single core, or across the process pool of the miner if provided. On a single
+    core, slices are sized by the scheduler to meet its reaction latency target. Without mining,
+    the node only validates and serves blocks, e.g. as the target of a load test."""
+    assert node.sock is not None
     previous_hash = node.blockchain.chain[0]
     timestamp = int(time.time())
     nonce = 0
+    search: Optional[mining.Search] = None
+
+    if scheduler is None:
+        scheduler = mining.init_scheduler()
 
     while True:
         try:
-            # Listen for incoming messages, with maximum size set at OS X maximum UDP package size
-            # of 9216 bytes.
-            node.sock.settimeout(0.1)
-            message, _ = node.sock.recvfrom(9216)
+            # Listen for incoming message fragments.
+            node.sock.settimeout(scheduler.listen_timeout)
+            start = time.perf_counter()
 
-            # Decode message and check blockchain is valid.
-            blockchain = blocks.decode_blockchain(message)
+            try:
+                datagram, address = node.sock.recvfrom(fragments.DATAGRAM_SIZE)
 
-            is_valid_blockchain, balance = balances.replace_blockchain(
-                blockchain, node.blockchain, node.balance
-            )
+            except socket.timeout:
+                mining.record_listening(scheduler, time.perf_counter() - start, False)
+                raise
 
-            if not is_valid_blockchain:
-                print("IGNORE blockchain...")
-                continue
+            mining.record_listening(scheduler, time.perf_counter() - start, True)
+
+            # Handle all messages waiting at once, so a burst of announcements is coalesced.
+            datagrams = [(datagram, address)] + drain_datagrams(node)
+            is_new_tip, replies = receive_datagrams(node, datagrams)
+
+            for reply, address in replies:
+                send(node, reply, address)
 
-            # Replace if valid and longer than existing.
-            node.blockchain = blockchain
-            blockchain_counter = len(blockchain.chain)
-            block_hash = blockchain.chain[-1]
+            if not is_new_tip or not is_mining:
+                continue
 
-            print(f"COPY block {blockchain_counter - 1}: {bytes.hex(block_hash)}!")
+            # Stop mining on top of the previous chain.
+            if search is not None:
+                mining.cancel_search(search)
+                search = None
 
-            # Replace balance
-            assert balance is not None
-            node.balance = balance
+            blockchain_counter = len(node.blockchain.chain)
+            block_hash = node.blockchain.chain[-1]
 
             # Force sleep to randomize timestamp.
             sleep_time = (node.port + blockchain_counter) % 3 + 1
@@ -104,45 +580,65 @@ def run(node: Node):
             time.sleep(sleep_time)
 
         except socket.timeout:
+            if not is_mining:
+                continue
+
             reward = transacts.Transaction(
                 reference_hash=transacts.REWARD_HASH,
                 sender=transacts.REWARD_SENDER,
                 receiver=node.address,
                 signature=transacts.REWARD_SIGNATURE,
             )
-            merkle_root = hashlib.sha256(reward.encode()).digest()
-
-            # Run proof-of-work.
-            print(f"TRY up to {nonce}...")
-            is_new_block, _, current_hash, header = blocks.run_proof_of_work(
-                previous_hash, merkle_root, timestamp, nonce, 1000
-            )
-
-            # Switch to listening mode if not solved after 1000 nonce values.
+            merkle_root = reward.hash()
+
+            # Run proof-of-work, either in the background across the process pool or on the
+            # current process.
+            if miner is not None:
+                if search is None:
+                    print(f"TRY with {miner.processes} processes...")
+                    search = mining.start_search(
+                        miner, previous_hash, merkle_root, timestamp
+                    )
+
+                result = mining.poll_search(search)
+
+                # Switch to listening mode if not yet solved.
+                if result is None:
+                    continue
+
+                search = None
+                is_new_block, last_nonce, current_hash, header = result
+
+            else:
+                slice_size = mining.next_slice_size(scheduler)
+
+                # Report once per block rather than on every slice.
+                if nonce == 0:
+                    print(f"TRY in slices of {slice_size} nonces...")
+
+                start = time.perf_counter()
+                is_new_block, last_nonce, current_hash, header = (
+                    blocks.run_fast_proof_of_work(
+                        previous_hash, merkle_root, timestamp, nonce, slice_size
+                    )
+                )
+                iterations = last_nonce - nonce + int(is_new_block)
+                mining.record_mining(scheduler, iterations, time.perf_counter() - start)
+
+            # Switch to listening mode if not solved within the slice.
             if not is_new_block:
-                nonce += 1000
+                nonce = last_nonce
                 continue
 
-            assert current_hash is not None
+            assert current_hash is not None and header is not None
             block_hash = current_hash
 
-            # Create block reward if solved.
-            assert header is not None
+            # Broadcast new block to network.
+            block = add_block(node, header, block_hash, reward)
+            broadcast(node, messages.encode_block_message(block))
 
-            block = blocks.Block(header=header, transactions=[reward])
-
-            # Append new block to blockchain.
-            node.blockchain.chain.append(block_hash)
-            node.blockchain.blocks[block_hash] = block
-
-            # Broadcast full blockchain to network.
-            broadcast(node, node.blockchain.encode())
-            print(
-                f"CREATE block {len(node.blockchain.chain) - 1}: {bytes.hex(block_hash)}!"
-            )
-
-            # Update balance
-            node.balance = balances.update_balance(node.balance, block)
+            if miner is None:
+                print(f"REPORT {mining.report_scheduler(scheduler)}")
 
         # Reset values for next block header.
         previous_hash = block_hash
@@ -150,9 +646,143 @@ def run(node: Node):
         nonce = 0
 
 
+class NodeProtocol(asyncio.DatagramProtocol):
+    """Pass incoming messages to a queue to be processed by the event loop."""
+
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    def datagram_received(self, data: bytes, addr):
+        self.queue.put_nowait((data, addr))
+
+
+def mine_block(
+    previous_hash: transacts.Hash,
+    merkle_root: transacts.Hash,
+    timestamp: int,
+    cancel_event: threading.Event,
+) -> mining.ProofOfWork:
+    """Run proof-of-work 1000 nonce values at a time until solved or cancelled."""
+    nonce = 0
+
+    while not cancel_event.is_set():
+        result = blocks.run_fast_proof_of_work(
+            previous_hash, merkle_root, timestamp, nonce, 1000
+        )
+
+        if result[0]:
+            return result
+
+        nonce = result[1]
+
+    return False, nonce, None, None
+
+
+async def mine(
+    node: Node, cancel_event: threading.Event, delay: float = 0
+) -> Optional[blocks.Block]:
+    """Run proof-of-work on top of the current chain in the default executor, so the event loop
+    keeps receiving messages while mining."""
+    # Delay randomizes timestamp, and does not block the event loop.
+    if delay > 0:
+        print(f"SLEEP for {delay} seconds...")
+        await asyncio.sleep(delay)
+
+    previous_hash = node.blockchain.chain[-1]
+    timestamp = int(time.time())
+
+    reward = transacts.init_reward(node.address)
+    merkle_root = reward.hash()
+
+    print(f"TRY on top of block {len(node.blockchain.chain) - 1}...")
+    loop = asyncio.get_running_loop()
+    is_new_block, _, block_hash, header = await loop.run_in_executor(
+        None, mine_block, previous_hash, merkle_root, timestamp, cancel_event
+    )
+
+    # Discard solution if chain was replaced while the executor was finishing the last slice.
+    if not is_new_block or cancel_event.is_set():
+        return None
+
+    assert block_hash is not None and header is not None
+    return add_block(node, header, block_hash, reward)
+
+
+async def run_async(node: Node):
+    """Receive chains and mine concurrently on an event loop, with mining restarted on top of
+    each accepted chain."""
+    assert node.sock is not None
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: NodeProtocol(queue), sock=node.sock
+    )
+
+    cancel_event = threading.Event()
+    mining_task = asyncio.ensure_future(mine(node, cancel_event))
+    receiving_task = asyncio.ensure_future(queue.get())
+
+    try:
+        while True:
+            done, _ = await asyncio.wait(
+                {mining_task, receiving_task}, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            if mining_task in done:
+                block = mining_task.result()
+
+                if block is not None:
+                    broadcast(node, messages.encode_block_message(block), transport)
+
+                mining_task = asyncio.ensure_future(mine(node, cancel_event))
+
+            if receiving_task in done:
+                datagrams = [receiving_task.result()]
+
+                while not queue.empty() and len(datagrams) < DRAIN_SIZE:
+                    datagrams.append(queue.get_nowait())
+
+                receiving_task = asyncio.ensure_future(queue.get())
+
+                is_new_tip, replies = receive_datagrams(node, datagrams)
+
+                for reply, address in replies:
+                    send(node, reply, address, transport)
+
+                if not is_new_tip:
+                    continue
+
+                # Cancel stale mining work and restart on top of the new chain.
+                cancel_event.set()
+                mining_task.cancel()
+
+                cancel_event = threading.Event()
+                delay = (node.port + len(node.blockchain.chain)) % 3 + 1
+                mining_task = asyncio.ensure_future(mine(node, cancel_event, delay))
+
+    finally:
+        cancel_event.set()
+        transport.close()
+
+
 if __name__ == "__main__":
     port = int(sys.argv[1])
     assert port in NODE_PORTS
 
     node = init_node(port)
-    run(node)
+
+    # Optionally specify number of mining processes as the second argument, the event loop, or
+    # listening without mining.
+    if len(sys.argv) > 2 and sys.argv[2] == "async":
+        asyncio.run(run_async(node))
+
+    elif len(sys.argv) > 2 and sys.argv[2] == "listen":
+        run(node, is_mining=False)
+
+    elif len(sys.argv) > 2:
+        miner = mining.init_miner(int(sys.argv[2]))
+        run(node, miner)
+
+    else:
+        run(node)
@@ -0,0 +1,341 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import collections
+import contextlib
+import dataclasses
+import heapq
+import os
+import random
+import sys
+import time
+
+import balances
+import blocks
+import cluster
+import crypto
+import fragments
+import hq
+import messages
+import node
+import transactions as transacts
+
+
+# Label of the virtual network in node addresses, so peers are told apart by port only.
+SIMULATOR_IP = "simulator"
+
+# Time of the next event at a node, and the sender and message if delivering a message rather than
+# mining a block.
+Delivery = Tuple[int, bytes]
+Event = Tuple[float, int, int, Optional[Delivery]]
+
+
+@dataclasses.dataclass
+class Network:
+    """Latency and jitter in seconds, loss as the probability of each fragment being dropped, and
+    bandwidth of the uplink of each node in bytes per second."""
+
+    latency: float = 0.05
+    jitter: float = 0.01
+    loss: float = 0.0
+    bandwidth: float = 1e6
+
+
+@dataclasses.dataclass
+class Simulator:
+    """ """
+
+    network: Network
+    nodes: Dict[int, node.Node]
+    peers: Dict[int, List[int]]
+    block_interval: float
+    is_mocked: bool
+    rng: random.Random
+    time: float = 0.0
+    timestamp: int = 0
+    events: List[Event] = dataclasses.field(default_factory=list)
+    event_counter: int = 0
+    uplinks: Dict[int, float] = dataclasses.field(default_factory=dict)
+    mined: Dict[transacts.Hash, Tuple[int, float]] = dataclasses.field(
+        default_factory=dict
+    )
+    arrivals: Dict[int, Dict[transacts.Hash, float]] = dataclasses.field(
+        default_factory=dict
+    )
+    cpu_times: Dict[int, float] = dataclasses.field(default_factory=dict)
+    message_counter: int = 0
+    drop_counter: int = 0
+
+
+def init_simulator(
+    node_counter: int,
+    topology: str = "mesh",
+    peer_counter: int = 2,
+    block_interval: float = 10.0,
+    network: Optional[Network] = None,
+    is_mocked: bool = True,
+    seed: Optional[int] = None,
+) -> Simulator:
+    """Create the nodes on a virtual network, each on its own copy of the genesis block, with the
+    hash power split evenly and the peers set by the topology."""
+    ports = cluster.init_ports(node_counter)
+    peers = cluster.init_topology(ports, topology, peer_counter, seed)
+
+    genesis_wallet = crypto.load_genesis_wallet()
+    keychain = {genesis_wallet.address: genesis_wallet.public_key}
+    nodes = {}
+
+    for port in ports:
+        blockchain = blocks.init_blockchain(genesis_wallet.address)
+        nodes[port] = node.Node(
+            address=crypto.init_wallet(port).address,
+            port=port,
+            sock=None,
+            blockchain=blockchain,
+            balance=balances.init_balance(blockchain, keychain),
+            peers=peers[port],
+        )
+
+    genesis_hash = nodes[ports[0]].blockchain.chain[0]
+    genesis_block = nodes[ports[0]].blockchain.blocks[genesis_hash]
+
+    simulator = Simulator(
+        network=network if network is not None else Network(),
+        nodes=nodes,
+        peers=peers,
+        block_interval=block_interval,
+        is_mocked=is_mocked,
+        rng=random.Random(seed),
+        timestamp=genesis_block.header.timestamp,
+        uplinks={port: 0.0 for port in ports},
+        arrivals={port: {} for port in ports},
+        cpu_times={port: 0.0 for port in ports},
+    )
+
+    for port in ports:
+        schedule_mining(simulator, port)
+
+    return simulator
+
+
+@contextlib.contextmanager
+def mock_proof_of_work() -> Iterator[None]:
+    """Accept any block hash on validation, so blocks are mined without searching for a nonce."""
+    difficulty_prefix = blocks.DIFFICULTY_PREFIX
+    blocks.DIFFICULTY_PREFIX = b""
+
+    try:
+        yield
+
+    finally:
+        blocks.DIFFICULTY_PREFIX = difficulty_prefix
+
+
+def schedule(
+    simulator: Simulator, delay: float, port: int, delivery: Optional[Delivery] = None
+):
+    """ """
+    event = (simulator.time + delay, simulator.event_counter, port, delivery)
+    heapq.heappush(simulator.events, event)
+    simulator.event_counter += 1
+
+
+def schedule_mining(simulator: Simulator, port: int):
+    """Schedule the next block found by the node. Block times are exponential, so the search
+    does not restart when the tip changes, and the node mines on its tip at the time."""
+    rate = 1 / (simulator.block_interval * len(simulator.nodes))
+    schedule(simulator, simulator.rng.expovariate(rate), port)
+
+
+def send(simulator: Simulator, sender: int, message: bytes, address: node.Address):
+    """Queue message on the uplink of the sender, then deliver it after the latency unless any of
+    its fragments is lost."""
+    network = simulator.network
+    fragment_counter = max(1, -(-len(message) // fragments.FRAGMENT_SIZE))
+    size = len(message) + fragment_counter * fragments.FRAGMENT_HEADER_SIZE
+
+    start = max(simulator.time, simulator.uplinks[sender])
+    simulator.uplinks[sender] = start + size / network.bandwidth
+    simulator.message_counter += 1
+
+    if simulator.rng.random() >= (1 - network.loss) ** fragment_counter:
+        simulator.drop_counter += 1
+        return
+
+    latency = network.latency + simulator.rng.uniform(0, network.jitter)
+    delay = simulator.uplinks[sender] + latency - simulator.time
+    schedule(simulator, delay, address[1], (sender, message))
+
+
+def record_arrivals(simulator: Simulator, port: int):
+    """Record arrival time of the blocks on the chain of the node not seen on it before."""
+    blockchain = simulator.nodes[port].blockchain
+    node_arrivals = simulator.arrivals[port]
+    height = len(blockchain.chain) - 1
+
+    while height > 0 and blockchain.chain[height] not in node_arrivals:
+        node_arrivals[blockchain.chain[height]] = simulator.time
+        height -= 1
+
+
+def mine_block(simulator: Simulator, port: int):
+    """Add block on top of the tip of the node, with proof-of-work run unless mocked."""
+    local_node = simulator.nodes[port]
+    previous_hash = local_node.blockchain.chain[-1]
+    timestamp = simulator.timestamp + int(simulator.time)
+
+    reward = transacts.init_reward(local_node.address)
+    merkle_root = reward.hash()
+
+    if simulator.is_mocked:
+        header = blocks.Header(
+            version=blocks.VERSION,
+            previous_hash=previous_hash,
+            merkle_root=merkle_root,
+            timestamp=timestamp,
+            nonce=simulator.rng.getrandbits(32),
+        )
+        block_hash = header.hash()
+
+    else:
+        is_found, _, current_hash, current_header = blocks.run_fast_proof_of_work(
+            previous_hash, merkle_root, timestamp
+        )
+
+        assert is_found and current_hash is not None and current_header is not None
+        block_hash, header = current_hash, current_header
+
+    block = node.add_block(local_node, header, block_hash, reward)
+    simulator.mined[block_hash] = (port, simulator.time)
+    record_arrivals(simulator, port)
+
+    message = messages.encode_block_message(block)
+
+    for peer in simulator.peers[port]:
+        send(simulator, port, message, (SIMULATOR_IP, peer))
+
+
+def deliver_message(simulator: Simulator, port: int, delivery: Delivery):
+    """Handle message with the logic of a real node, and account for the CPU time spent."""
+    local_node = simulator.nodes[port]
+    sender, message = delivery
+    peer_addresses = [(SIMULATOR_IP, peer) for peer in simulator.peers[port]]
+
+    start = time.process_time()
+    is_new_tip, replies = node.receive_messages(
+        local_node, [(message, (SIMULATOR_IP, sender))], peer_addresses
+    )
+    simulator.cpu_times[port] += time.process_time() - start
+
+    if is_new_tip:
+        record_arrivals(simulator, port)
+
+    for reply, address in replies:
+        send(simulator, port, reply, address)
+
+
+def run_simulator(simulator: Simulator, duration: float):
+    """Process events in order of virtual time up to the duration, with the output of the nodes
+    discarded. Blocks are only mined within the duration, and messages are then allowed to
+    settle."""
+    end = simulator.time + duration
+
+    with contextlib.ExitStack() as stack:
+        devnull = stack.enter_context(open(os.devnull, "w"))
+        stack.enter_context(contextlib.redirect_stdout(devnull))
+
+        if simulator.is_mocked:
+            stack.enter_context(mock_proof_of_work())
+
+        while simulator.events:
+            event_time, _, port, delivery = heapq.heappop(simulator.events)
+
+            if delivery is None and event_time > end:
+                continue
+
+            simulator.time = event_time
+
+            if delivery is None:
+                mine_block(simulator, port)
+                schedule_mining(simulator, port)
+            else:
+                deliver_message(simulator, port, delivery)
+
+    simulator.time = max(simulator.time, end)
+
+
+def find_best_chain(simulator: Simulator) -> List[transacts.Hash]:
+    """Return the longest chain across the nodes, held by the most nodes if tied."""
+    chains = [local_node.blockchain.chain for local_node in simulator.nodes.values()]
+    tips = collections.Counter(chain[-1] for chain in chains)
+
+    return max(chains, key=lambda chain: (len(chain), tips[chain[-1]]))
+
+
+def report_simulator(simulator: Simulator) -> str:
+    """Report the share of mined blocks not on the best chain, the delay of blocks reaching each
+    node and all nodes, and the CPU time spent by each node on handling messages."""
+    node_counter = len(simulator.nodes)
+    best_chain = set(find_best_chain(simulator))
+    orphan_counter = len(set(simulator.mined) - best_chain)
+    orphan_rate = orphan_counter / max(1, len(simulator.mined))
+
+    arrival_delays: List[float] = []
+    full_delays: List[float] = []
+
+    for block_hash, (miner, mined_time) in simulator.mined.items():
+        delays = [
+            node_arrivals[block_hash] - mined_time
+            for port, node_arrivals in simulator.arrivals.items()
+            if port != miner and block_hash in node_arrivals
+        ]
+        arrival_delays += delays
+
+        if len(delays) == node_counter - 1:
+            full_delays.append(max(delays, default=0.0))
+
+    cpu_times = list(simulator.cpu_times.values())
+    lines = [
+        f"nodes={node_counter} time={simulator.time:.1f}s mined={len(simulator.mined)} "
+        f"orphans={orphan_counter} orphan_rate={orphan_rate:.1%} "
+        f"messages={simulator.message_counter} dropped={simulator.drop_counter}",
+        f"REPORT each_node {hq.report_latencies(arrival_delays)}",
+        f"REPORT all_nodes {hq.report_latencies(full_delays)}",
+        f"REPORT cpu mean={sum(cpu_times) / node_counter * 1000:.1f}ms "
+        f"max={max(cpu_times) * 1000:.1f}ms",
+    ]
+
+    for port, local_node in simulator.nodes.items():
+        lines.append(
+            f"REPORT node={port} height={len(local_node.blockchain.chain) - 1} "
+            f"cpu={simulator.cpu_times[port] * 1000:.1f}ms"
+        )
+
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    # Specify the number of nodes, then optionally the topology, the number of peers for a random
+    # topology, the simulated duration and block interval in seconds, the latency in seconds, the
+    # loss rate of fragments and the bandwidth in bytes per second, and "pow" to run real
+    # proof-of-work.
+    node_counter = int(sys.argv[1])
+    topology = sys.argv[2] if len(sys.argv) > 2 else "mesh"
+    peer_counter = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 600
+    block_interval = float(sys.argv[5]) if len(sys.argv) > 5 else 10
+    network = Network(
+        latency=float(sys.argv[6]) if len(sys.argv) > 6 else Network.latency,
+        loss=float(sys.argv[7]) if len(sys.argv) > 7 else Network.loss,
+        bandwidth=float(sys.argv[8]) if len(sys.argv) > 8 else Network.bandwidth,
+    )
+    is_mocked = not (len(sys.argv) > 9 and sys.argv[9] == "pow")
+
+    simulator = init_simulator(
+        node_counter, topology, peer_counter, block_interval, network, is_mocked
+    )
+
+    start = time.perf_counter()
+    run_simulator(simulator, duration)
+    wall_time = time.perf_counter() - start
+
+    print(f"SIMULATE {simulator.time:.1f}s in {wall_time:.1f}s of wall time...")
+    print(f"REPORT {report_simulator(simulator)}")
@@ -0,0 +1,291 @@
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    OrderedDict,
+)
+import collections
+import dataclasses
+import mmap
+import os
+import struct
+
+import blocks
+import transactions as transacts
+
+
+SEGMENT_FILENAME: str = "blocks.dat"
+INDEX_FILENAME: str = "index.dat"
+SNAPSHOT_FILENAME: str = "snapshot.dat"
+
+# Each index record is the block hash, offset of the block in the segment file and height.
+INDEX_FORMAT: str = ">32sQI"
+INDEX_RECORD_SIZE: int = struct.calcsize(INDEX_FORMAT)  # i.e. 32 + 8 + 4
+
+# Number of decoded blocks of a stored chain kept in memory.
+BLOCK_CACHE_SIZE: int = 1024
+
+
+@dataclasses.dataclass
+class Store:
+    """Append-only block store, with raw encoded blocks in a segment file and a fixed-width index
+    from block hash to offset and height. Blocks are read via a memory map."""
+
+    path: str
+    segment_file: BinaryIO
+    index_file: BinaryIO
+    segment_size: int
+    segment_map: Optional[mmap.mmap]
+    offsets: Dict[transacts.Hash, int]
+    chain: List[transacts.Hash]
+
+
+def map_file(f: BinaryIO, size: int) -> Optional[mmap.mmap]:
+    """ """
+    if size == 0:
+        return None
+
+    return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+
+def open_store(path: str) -> Store:
+    """Open or create the store, rebuilding the chain from the index without decoding or hashing
+    any block."""
+    os.makedirs(path, exist_ok=True)
+
+    segment_file = open(os.path.join(path, SEGMENT_FILENAME), "a+b")
+    index_file = open(os.path.join(path, INDEX_FILENAME), "a+b")
+
+    segment_size = os.fstat(segment_file.fileno()).st_size
+    index_size = os.fstat(index_file.fileno()).st_size
+
+    # Ignore a partially written record at the end of the index.
+    index_size -= index_size % INDEX_RECORD_SIZE
+    index_file.truncate(index_size)
+
+    offsets: Dict[transacts.Hash, int] = {}
+    chain: List[transacts.Hash] = []
+    segment_end = 0
+
+    index_map = map_file(index_file, index_size)
+    segment_map = map_file(segment_file, segment_size)
+
+    if index_map is not None:
+        assert segment_map is not None
+
+        for block_hash, offset, height in struct.iter_unpack(INDEX_FORMAT, index_map):
+            size_bytes = segment_map[offset : offset + 2]
+            block_size = int.from_bytes(size_bytes, byteorder="big")
+            segment_end = max(segment_end, offset + block_size)
+
+            # Later records at the same height replace the chain from that height onwards.
+            offsets[block_hash] = offset
+            del chain[height:]
+            chain.append(block_hash)
+
+        index_map.close()
+
+    # Drop blocks written without an index record, as the record is written after the block.
+    if segment_end < segment_size:
+        if segment_map is not None:
+            segment_map.close()
+
+        segment_file.truncate(segment_end)
+        segment_size = segment_end
+        segment_map = map_file(segment_file, segment_size)
+
+    return Store(
+        path=path,
+        segment_file=segment_file,
+        index_file=index_file,
+        segment_size=segment_size,
+        segment_map=segment_map,
+        offsets=offsets,
+        chain=chain,
+    )
+
+
+def close_store(store: Store):
+    """ """
+    if store.segment_map is not None:
+        store.segment_map.close()
+
+    store.segment_file.close()
+    store.index_file.close()
+
+
+def read_block_bytes(store: Store, block_hash: transacts.Hash) -> bytes:
+    """Read encoded block from the memory map of the segment."""
+    offset = store.offsets[block_hash]
+
+    # Remap if the segment has grown since the last read.
+    if store.segment_map is None or len(store.segment_map) < store.segment_size:
+        if store.segment_map is not None:
+            store.segment_map.close()
+
+        store.segment_map = map_file(store.segment_file, store.segment_size)
+
+    assert store.segment_map is not None
+    block_size = int.from_bytes(store.segment_map[offset : offset + 2], byteorder="big")
+
+    return store.segment_map[offset : offset + block_size]
+
+
+def read_block(store: Store, block_hash: transacts.Hash) -> blocks.Block:
+    """ """
+    return blocks.decode_block(read_block_bytes(store, block_hash))
+
+
+def write_block(
+    store: Store, block_hash: transacts.Hash, block: blocks.Block, height: int
+):
+    """Append block to the segment if not already stored, then record it in the index."""
+    offset = store.offsets.get(block_hash)
+
+    if offset is None:
+        offset = store.segment_size
+        block_bytes = block.encode()
+
+        store.segment_file.write(block_bytes)
+        store.segment_file.flush()
+
+        store.segment_size += len(block_bytes)
+        store.offsets[block_hash] = offset
+
+    store.index_file.write(struct.pack(INDEX_FORMAT, block_hash, offset, height))
+    store.index_file.flush()
+
+    del store.chain[height:]
+    store.chain.append(block_hash)
+
+
+def save_blockchain(store: Store, blockchain: blocks.Blockchain) -> int:
+    """Write blocks of the blockchain from where it diverges from the stored chain, so appending a
+    block or switching to a fork only writes the new blocks. Returns blocks written."""
+    height = min(len(store.chain), len(blockchain.chain))
+
+    while height > 0 and store.chain[height - 1] != blockchain.chain[height - 1]:
+        height -= 1
+
+    if height == len(blockchain.chain) == len(store.chain):
+        return 0
+
+    # Rewrite the tip of a shorter chain, as a record replaces the chain from its height onwards.
+    if height == len(blockchain.chain):
+        height -= 1
+
+    for i in range(height, len(blockchain.chain)):
+        block_hash = blockchain.chain[i]
+        write_block(store, block_hash, blockchain.blocks[block_hash], i)
+
+    if isinstance(blockchain.blocks, StoredBlocks):
+        blockchain.blocks.release()
+
+    return len(blockchain.chain) - height
+
+
+class StoredBlocks(MutableMapping[transacts.Hash, blocks.Block]):
+    """Blocks of a stored chain, decoded from the memory-mapped segment on access, with only the
+    latest decoded kept. Blocks not yet stored are kept in memory until saved."""
+
+    def __init__(self, store: Store, cache_size: int = BLOCK_CACHE_SIZE):
+        self.store = store
+        self.cache_size = cache_size
+        self.cache: OrderedDict[transacts.Hash, blocks.Block] = (
+            collections.OrderedDict()
+        )
+        self.pending: Dict[transacts.Hash, blocks.Block] = {}
+
+    def __getitem__(self, block_hash: transacts.Hash) -> blocks.Block:
+        if block_hash in self.pending:
+            return self.pending[block_hash]
+
+        if block_hash in self.cache:
+            self.cache.move_to_end(block_hash)
+            return self.cache[block_hash]
+
+        if block_hash not in self.store.offsets:
+            raise KeyError(block_hash)
+
+        block = read_block(self.store, block_hash)
+        self.cache[block_hash] = block
+
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+        return block
+
+    def __setitem__(self, block_hash: transacts.Hash, block: blocks.Block):
+        if block_hash not in self.store.offsets:
+            self.pending[block_hash] = block
+
+    def __delitem__(self, block_hash: transacts.Hash):
+        """Only blocks not yet stored can be deleted, as the store is append-only."""
+        del self.pending[block_hash]
+
+    def __contains__(self, block_hash: object) -> bool:
+        return block_hash in self.pending or block_hash in self.store.offsets
+
+    def __iter__(self) -> Iterator[transacts.Hash]:
+        yield from self.store.offsets
+
+        for block_hash in list(self.pending):
+            if block_hash not in self.store.offsets:
+                yield block_hash
+
+    def __len__(self) -> int:
+        pending_counter = sum(
+            1 for block_hash in self.pending if block_hash not in self.store.offsets
+        )
+
+        return len(self.store.offsets) + pending_counter
+
+    def __copy__(self) -> "StoredBlocks":
+        """Copy shares the store and decoded blocks, but not the blocks yet to be stored."""
+        stored_blocks = StoredBlocks(self.store, self.cache_size)
+        stored_blocks.cache = self.cache
+        stored_blocks.pending = dict(self.pending)
+
+        return stored_blocks
+
+    def release(self):
+        """Drop blocks from memory once written to the store."""
+        for block_hash in list(self.pending):
+            if block_hash in self.store.offsets:
+                del self.pending[block_hash]
+
+
+def load_blockchain(store: Store) -> Optional[blocks.Blockchain]:
+    """Restore the stored chain, with blocks decoded only when accessed."""
+    if len(store.chain) == 0:
+        return None
+
+    return blocks.Blockchain(chain=list(store.chain), blocks=StoredBlocks(store))
+
+
+def save_snapshot(store: Store, snapshot_bytes: bytes):
+    """Write snapshot to a temporary file, then rename it over the previous snapshot, so a crash
+    leaves either the previous or the new snapshot in place."""
+    path = os.path.join(store.path, SNAPSHOT_FILENAME)
+    temporary_path = f"{path}.tmp"
+
+    with open(temporary_path, "wb") as f:
+        f.write(snapshot_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def load_snapshot(store: Store) -> Optional[bytes]:
+    """ """
+    path = os.path.join(store.path, SNAPSHOT_FILENAME)
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as f:
+        return f.read()
@@ -0,0 +1,229 @@
+from typing import Dict, List, Optional
+import copy
+import dataclasses
+
+import blocks
+import messages
+import transactions as transacts
+
+
+# Number of headers that fit in a single message after the fork point hash.
+MAX_HEADERS: int = (
+    messages.MAX_MESSAGE_SIZE - 1 - transacts.HASH_SIZE
+) // blocks.HEADER_SIZE
+
+# Number of block bodies requested at a time.
+MAX_BLOCKS: int = 16
+
+
+def init_locator(blockchain: blocks.Blockchain) -> List[transacts.Hash]:
+    """Sample hashes from the tip backwards, one by one for the latest 10 blocks then doubling the
+    step, always ending with the genesis block."""
+    chain = blockchain.chain
+    locator = []
+    index = len(chain) - 1
+    step = 1
+
+    while index > 0:
+        locator.append(chain[index])
+
+        if len(locator) >= 10:
+            step *= 2
+
+        index -= step
+
+    locator.append(chain[0])
+
+    return locator
+
+
+def find_fork_index(
+    blockchain: blocks.Blockchain, locator: List[transacts.Hash]
+) -> Optional[int]:
+    """Return index in the chain of the first locator hash on the chain."""
+    for block_hash in locator:
+        # Blocks may be known without being on the chain, e.g. after a reorganisation.
+        height = blockchain.height(block_hash)
+
+        if height is not None:
+            return height
+
+    return None
+
+
+def select_headers(
+    blockchain: blocks.Blockchain,
+    locator: List[transacts.Hash],
+    max_headers: int = MAX_HEADERS,
+) -> Optional[bytes]:
+    """Reply to a locator with the headers following the fork point, if any."""
+    fork_index = find_fork_index(blockchain, locator)
+
+    if fork_index is None:
+        return None
+
+    chain = blockchain.chain
+    headers = [
+        blockchain.blocks[block_hash].header
+        for block_hash in chain[fork_index + 1 : fork_index + 1 + max_headers]
+    ]
+
+    return messages.encode_headers_message(chain[fork_index], headers)
+
+
+def select_blocks(
+    blockchain: blocks.Blockchain,
+    block_hashes: List[transacts.Hash],
+    max_size: int = messages.MAX_MESSAGE_SIZE,
+) -> Optional[bytes]:
+    """Reply to a request with the known blocks, in order and up to the message size, though with
+    at least one block."""
+    blocks_list: List[blocks.Block] = []
+    message_size = 1
+
+    for block_hash in block_hashes:
+        if block_hash not in blockchain.blocks:
+            continue
+
+        block = blockchain.blocks[block_hash]
+        block_size = len(block.encode())
+
+        if blocks_list and message_size + block_size > max_size:
+            break
+
+        blocks_list.append(block)
+        message_size += block_size
+
+    if not blocks_list:
+        return None
+
+    return messages.encode_blocks_message(blocks_list)
+
+
+@dataclasses.dataclass
+class Sync:
+    """Headers received after the fork point, checked for proof-of-work and linkage before any
+    block body is requested, together with the bodies received so far."""
+
+    fork_hash: transacts.Hash
+    fork_index: int
+    hashes: List[transacts.Hash]
+    headers: Dict[transacts.Hash, blocks.Header]
+    timestamp: int
+    bodies: Dict[transacts.Hash, blocks.Block]
+
+
+def init_sync(
+    blockchain: blocks.Blockchain, fork_hash: transacts.Hash
+) -> Optional[Sync]:
+    """ """
+    fork_index = find_fork_index(blockchain, [fork_hash])
+
+    if fork_index is None:
+        return None
+
+    return Sync(
+        fork_hash=fork_hash,
+        fork_index=fork_index,
+        hashes=[],
+        headers={},
+        timestamp=blockchain.blocks[fork_hash].header.timestamp,
+        bodies={},
+    )
+
+
+def tip_hash(sync: Sync) -> transacts.Hash:
+    """ """
+    return sync.hashes[-1] if sync.hashes else sync.fork_hash
+
+
+def extend_sync(sync: Sync, headers: List[blocks.Header]) -> bool:
+    """Validate headers on top of the latest header, without the block bodies."""
+    previous_hash = tip_hash(sync)
+    previous_timestamp = sync.timestamp
+
+    for header in headers:
+        is_valid_header, block_hash, timestamp = blocks.validate_header(
+            header, previous_hash, previous_timestamp
+        )
+
+        if not is_valid_header:
+            return False
+
+        assert block_hash is not None and timestamp is not None
+        sync.hashes.append(block_hash)
+        sync.headers[block_hash] = header
+
+        previous_hash = block_hash
+        previous_timestamp = timestamp
+
+    sync.timestamp = previous_timestamp
+
+    return True
+
+
+def init_sync_locator(
+    blockchain: blocks.Blockchain, sync: Sync
+) -> List[transacts.Hash]:
+    """Request headers following the latest header already received."""
+    return [tip_hash(sync)] + init_locator(blockchain)
+
+
+def is_longer(blockchain: blocks.Blockchain, sync: Sync) -> bool:
+    """ """
+    return sync.fork_index + 1 + len(sync.hashes) > len(blockchain.chain)
+
+
+def find_missing_hashes(
+    sync: Sync, max_blocks: int = MAX_BLOCKS
+) -> List[transacts.Hash]:
+    """ """
+    missing_hashes = [
+        block_hash for block_hash in sync.hashes if block_hash not in sync.bodies
+    ]
+
+    return missing_hashes[:max_blocks]
+
+
+def add_blocks(sync: Sync, blocks_list: List[blocks.Block]) -> int:
+    """Keep block bodies matching a requested header, with transactions matching its merkle root.
+    Returns the number of blocks added."""
+    block_counter = 0
+
+    for block in blocks_list:
+        block_hash = block.header.hash()
+
+        if block_hash not in sync.headers or block_hash in sync.bodies:
+            continue
+
+        if not blocks.validate_merkle_root(block):
+            continue
+
+        sync.bodies[block_hash] = block
+        block_counter += 1
+
+    return block_counter
+
+
+def build_blockchain(
+    blockchain: blocks.Blockchain, sync: Sync
+) -> Optional[blocks.Blockchain]:
+    """Combine the chain up to the fork point with the received blocks, once all have arrived and
+    the fork point is still on the chain."""
+    if len(sync.bodies) < len(sync.hashes):
+        return None
+
+    chain = blockchain.chain
+
+    if sync.fork_index >= len(chain) or chain[sync.fork_index] != sync.fork_hash:
+        return None
+
+    # Shallow copy keeps lazily loaded blocks of a stored chain loadable.
+    potential_blockchain = blocks.Blockchain(
+        chain=chain[: sync.fork_index + 1], blocks=copy.copy(blockchain.blocks)
+    )
+
+    for block_hash in sync.hashes:
+        potential_blockchain.append(block_hash, sync.bodies[block_hash])
+
+    return potential_blockchain
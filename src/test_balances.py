@@ -1,12 +1,16 @@
 from typing import Dict
+import dataclasses
 import hashlib
+import io
 
 import pytest
 
 import balances
 import blocks
 import crypto
+import hq
 import transactions as transacts
+import verification
 
 
 @pytest.fixture
@@ -139,6 +143,34 @@ def test_init_balance(
     )
 
 
+def test_outputs():
+    """ """
+    a, b, c = [bytes([i]) * 32 for i in range(3)]
+    outputs = balances.Outputs([a, b, a, c])
+
+    assert len(outputs) == 4 and b in outputs and outputs[0] == a
+    assert list(outputs) == [a, b, a, c]
+
+    # First of the outputs with the same hash is removed, as with a list.
+    assert outputs.remove(a) == 0
+    assert outputs.remove(b) == 1
+    assert list(outputs) == [a, c] and b not in outputs
+
+    with pytest.raises(ValueError):
+        outputs.remove(b)
+
+    # Outputs are restored at their position, at either end or in the middle.
+    outputs.restore(a, 0)
+    outputs.restore(b, 1)
+    assert list(outputs) == [a, b, a, c]
+    assert outputs == balances.Outputs([a, b, a, c])
+
+    assert outputs.remove(a, 2) == 2
+    assert outputs.append(a) == 4
+    assert outputs.pop(0) == a and outputs.pop() == a
+    assert list(outputs) == [b, c]
+
+
 def test_init_transfer(wallets, keychain, blockchain_with_2_blocks):
     """ """
     balance = balances.init_balance(blockchain_with_2_blocks, keychain)
@@ -230,3 +262,406 @@ def test_replace_blockchain(
         blockchain_with_1_block, blockchain_with_1_block, balance
     )
     assert not is_valid_replace
+
+
+def test_validate_blockchain_stream(
+    keychain, blockchain_with_1_block, blockchain_with_2_blocks
+):
+    """ """
+    balance = balances.init_balance(blockchain_with_1_block, keychain)
+    stream = io.BytesIO(blockchain_with_2_blocks.encode())
+
+    is_valid_blockchain, blockchain, balance = balances.validate_blockchain_stream(
+        blocks.stream_blockchain(stream), balance
+    )
+    assert is_valid_blockchain
+    assert blockchain.chain == blockchain_with_2_blocks.chain
+    assert balance.latest_hash == blockchain_with_2_blocks.chain[-1]
+
+    # Stream without the latest hash of the balance cannot be validated.
+    stream = io.BytesIO(blockchain_with_2_blocks.encode()[2:])
+
+    is_valid_blockchain, _, _ = balances.validate_blockchain_stream(
+        blocks.stream_blockchain(stream), balance
+    )
+    assert not is_valid_blockchain
+
+    # Include check on a block not linked to the latest hash of the balance ahead of it.
+    genesis_hash = blockchain_with_1_block.chain[0]
+    genesis_block = blockchain_with_1_block.blocks[genesis_hash]
+    header = dataclasses.replace(genesis_block.header, timestamp=0)
+    block_stream = [
+        (header.hash(), blocks.Block(header, genesis_block.transactions)),
+        (genesis_hash, genesis_block),
+    ]
+    balance = balances.init_balance(blockchain_with_1_block, keychain)
+
+    is_valid_blockchain, _, _ = balances.validate_blockchain_stream(
+        block_stream, balance
+    )
+    assert not is_valid_blockchain
+
+
+def test_extend_blockchain(keychain, blockchain_with_1_block, blockchain_with_2_blocks):
+    """ """
+    balance = balances.init_balance(blockchain_with_1_block, keychain)
+    block = blockchain_with_2_blocks.blocks[blockchain_with_2_blocks.chain[1]]
+
+    is_valid_block, balance = balances.extend_blockchain(
+        blockchain_with_1_block, balance, block
+    )
+    assert is_valid_block
+    assert blockchain_with_1_block.chain == blockchain_with_2_blocks.chain
+    assert balance.latest_hash == blockchain_with_2_blocks.chain[1]
+
+    # Block no longer extends the tip.
+    is_valid_block, _ = balances.extend_blockchain(
+        blockchain_with_1_block, balance, block
+    )
+    assert not is_valid_block
+
+
+def test_extend_blockchain_double_spend(wallets, keychain, blockchain_with_1_block):
+    """ """
+    balance = balances.init_balance(blockchain_with_1_block, keychain)
+    genesis_hash = blockchain_with_1_block.chain[0]
+    reference_hash = balance.accounts[wallets[7000].address][0]
+
+    # Both transfers spend the genesis reward, each valid against the balance alone.
+    transactions = [transacts.init_reward(wallets[7000].address)]
+
+    for port in [8000, 9000]:
+        receiver = wallets[port].address
+        signature = crypto.sign_transfer(wallets[7000], reference_hash, receiver)
+        transactions.append(
+            transacts.Transaction(
+                reference_hash=reference_hash,
+                sender=wallets[7000].address,
+                receiver=receiver,
+                signature=signature,
+            )
+        )
+
+    merkle_tree = transacts.init_merkle_tree([t.hash() for t in transactions])
+    assert merkle_tree is not None
+
+    _, _, _, header = blocks.run_fast_proof_of_work(
+        genesis_hash, merkle_tree.tree_hash, 1634701200
+    )
+    assert header is not None
+    block = blocks.Block(header=header, transactions=transactions)
+
+    is_valid_block, _ = balances.extend_blockchain(
+        blockchain_with_1_block, balance, block
+    )
+    assert not is_valid_block
+    assert blockchain_with_1_block.chain == [genesis_hash]
+    assert balance.latest_hash == genesis_hash
+    assert list(balance.accounts[wallets[7000].address]) == [reference_hash]
+
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    blockchain.append(header.hash(), block)
+    genesis_blockchain = blocks.init_blockchain(wallets[7000].address)
+    verifier = verification.init_verifier(processes=2)
+
+    try:
+        for block_verifier in [None, verifier]:
+            is_valid_blockchain, _ = balances.validate_blockchain(
+                blockchain,
+                balances.init_balance(genesis_blockchain, keychain),
+                block_verifier,
+            )
+            assert not is_valid_blockchain
+    finally:
+        verification.close_verifier(verifier)
+
+
+def test_replace_blockchain_rollback(monkeypatch, wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+
+    for block_hash, block in hq.premine_blocks(blockchain, balance, wallets, 5, 3):
+        blockchain.append(block_hash, block)
+
+    # Competing chain forks below the tip, with fewer transfers per block.
+    fork_blockchain = blocks.Blockchain(
+        chain=blockchain.chain[:4], blocks=dict(blockchain.blocks)
+    )
+    fork_balance = balances.init_balance(fork_blockchain, keychain)
+    fork_blocks = hq.premine_blocks(fork_blockchain, fork_balance, wallets, 3, 2)
+
+    for block_hash, block in fork_blocks:
+        fork_blockchain.append(block_hash, block)
+
+    verify_counter = 0
+    verify = crypto.verify
+
+    def count_verify(*args):
+        nonlocal verify_counter
+        verify_counter += 1
+        return verify(*args)
+
+    monkeypatch.setattr(crypto, "verify", count_verify)
+
+    def filter_accounts(accounts: balances.Accounts):
+        return {address: outputs for address, outputs in accounts.items() if outputs}
+
+    # Invalid signature in the last block of the fork leaves the balance as it was.
+    invalid_block = fork_blocks[-1][1]
+    transfer = dataclasses.replace(invalid_block.transactions[1], signature=bytes(72))
+    invalid_blockchain = blocks.Blockchain(
+        chain=fork_blockchain.chain,
+        blocks={
+            **fork_blockchain.blocks,
+            fork_blocks[-1][0]: blocks.Block(
+                header=invalid_block.header,
+                transactions=[invalid_block.transactions[0], transfer],
+            ),
+        },
+    )
+
+    is_valid_replace, _ = balances.replace_blockchain(
+        invalid_blockchain, blockchain, balance
+    )
+    assert not is_valid_replace
+    assert balance.latest_hash == blockchain.chain[-1]
+    assert filter_accounts(balance.accounts) == filter_accounts(
+        balances.init_balance(blockchain).accounts
+    )
+
+    # Only the signatures of the blocks after the fork are verified.
+    verify_counter = 0
+    is_valid_replace, new_balance = balances.replace_blockchain(
+        fork_blockchain, blockchain, balance
+    )
+
+    assert is_valid_replace and new_balance is not None
+    transfer_counter = sum(len(block.transactions) - 1 for _, block in fork_blocks)
+    assert verify_counter == transfer_counter
+    assert filter_accounts(new_balance.accounts) == filter_accounts(
+        balances.init_balance(fork_blockchain).accounts
+    )
+
+
+def test_replace_blockchain_undo_depth(monkeypatch, wallets, keychain):
+    """ """
+    monkeypatch.setattr(balances, "UNDO_DEPTH", 2)
+
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+
+    for block_hash, block in hq.premine_blocks(blockchain, balance, wallets, 1, 0):
+        blockchain.append(block_hash, block)
+
+    # Extension of the tip by more blocks than can be undone, with the last one invalid.
+    extended_blockchain = blocks.Blockchain(
+        chain=list(blockchain.chain), blocks=dict(blockchain.blocks)
+    )
+    extended_balance = balances.init_balance(extended_blockchain, keychain)
+    extended_blocks = hq.premine_blocks(
+        extended_blockchain, extended_balance, wallets, 6, 0
+    )
+
+    for block_hash, block in extended_blocks:
+        extended_blockchain.append(block_hash, block)
+
+    invalid_hash, invalid_block = extended_blocks[-1]
+    reward = invalid_block.transactions[0]
+    extended_blockchain.blocks[invalid_hash] = blocks.Block(
+        header=invalid_block.header, transactions=[reward, reward]
+    )
+
+    is_valid_replace, _ = balances.replace_blockchain(
+        extended_blockchain, blockchain, balance
+    )
+    assert not is_valid_replace
+    assert balance.latest_hash == blockchain.chain[-1]
+    assert len(balance.accounts[wallets[7000].address]) == 2
+
+
+def test_restore_balance(wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+
+    for block_hash, block in hq.premine_blocks(blockchain, balance, wallets, 5, 3):
+        blockchain.append(block_hash, block)
+
+    def filter_accounts(accounts: balances.Accounts):
+        return {address: outputs for address, outputs in accounts.items() if outputs}
+
+    # Snapshot taken partway replays only the blocks after it.
+    partial_blockchain = blocks.Blockchain(
+        chain=blockchain.chain[:3], blocks=blockchain.blocks
+    )
+    snapshot_bytes = balances.encode_balance(balances.init_balance(partial_blockchain))
+
+    decoded_balance = balances.decode_balance(snapshot_bytes, keychain)
+    assert decoded_balance is not None
+    assert decoded_balance.latest_hash == blockchain.chain[2]
+
+    update_counter = 0
+    update_balance = balances.update_balance
+
+    def count_update_balance(*args):
+        nonlocal update_counter
+        update_counter += 1
+        return update_balance(*args)
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(balances, "update_balance", count_update_balance)
+        restored_balance = balances.restore_balance(
+            blockchain, snapshot_bytes, keychain
+        )
+
+    assert update_counter == len(blockchain.chain) - 3
+    assert restored_balance.latest_hash == blockchain.chain[-1]
+    assert filter_accounts(restored_balance.accounts) == filter_accounts(
+        balance.accounts
+    )
+
+    # Corrupted or truncated snapshot is rejected.
+    corrupted_bytes = bytearray(snapshot_bytes)
+    corrupted_bytes[40] ^= 1
+    assert balances.decode_balance(bytes(corrupted_bytes)) is None
+    assert balances.decode_balance(snapshot_bytes[:-1]) is None
+    assert balances.decode_balance(b"") is None
+
+    # Snapshot off the chain falls back to replay from genesis.
+    fork_blockchain = blocks.Blockchain(
+        chain=blockchain.chain[:2], blocks=dict(blockchain.blocks)
+    )
+    fork_balance = balances.init_balance(fork_blockchain, keychain)
+
+    for block_hash, block in hq.premine_blocks(
+        fork_blockchain, fork_balance, wallets, 2, 1
+    ):
+        fork_blockchain.append(block_hash, block)
+
+    fork_bytes = balances.encode_balance(fork_balance)
+    restored_balance = balances.restore_balance(blockchain, fork_bytes, keychain)
+
+    assert restored_balance.latest_hash == blockchain.chain[-1]
+    assert filter_accounts(restored_balance.accounts) == filter_accounts(
+        balance.accounts
+    )
+
+
+def test_validate_blockchain_headers_first(monkeypatch, wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+    premined_blocks = hq.premine_blocks(blockchain, balance, wallets, 5, 3)
+
+    # Last block made invalid by a timestamp before that of its parent.
+    invalid_hash, invalid_block = premined_blocks[-1]
+    header = dataclasses.replace(invalid_block.header, timestamp=0)
+    invalid_blockchain = blocks.init_blockchain(wallets[7000].address)
+
+    for block_hash, block in premined_blocks[:-1]:
+        invalid_blockchain.append(block_hash, block)
+
+    invalid_blockchain.append(
+        invalid_hash,
+        blocks.Block(header=header, transactions=invalid_block.transactions),
+    )
+
+    verify_counter = 0
+    verify = crypto.verify
+
+    def count_verify(*args):
+        nonlocal verify_counter
+        verify_counter += 1
+        return verify(*args)
+
+    monkeypatch.setattr(crypto, "verify", count_verify)
+
+    # Invalid header is found before any signature is verified.
+    genesis_blockchain = blocks.Blockchain(
+        chain=invalid_blockchain.chain[:1], blocks=invalid_blockchain.blocks
+    )
+    genesis_balance = balances.init_balance(genesis_blockchain, keychain)
+    is_valid, _ = balances.validate_blockchain(invalid_blockchain, genesis_balance)
+
+    assert not is_valid
+    assert verify_counter == 0
+    assert genesis_balance.latest_hash == invalid_blockchain.chain[0]
+
+    # Balance is not rolled back for a longer chain with an invalid header.
+    current_blockchain = blocks.Blockchain(
+        chain=invalid_blockchain.chain[:3], blocks=invalid_blockchain.blocks
+    )
+    current_balance = balances.init_balance(current_blockchain, keychain)
+    undos = dict(current_balance.undos)
+    is_valid_replace, _ = balances.replace_blockchain(
+        invalid_blockchain, current_blockchain, current_balance
+    )
+
+    assert not is_valid_replace
+    assert verify_counter == 0
+    assert current_balance.latest_hash == current_blockchain.chain[-1]
+    assert current_balance.undos == undos
+
+
+def test_validate_merkle_root(wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+    premined_blocks = hq.premine_blocks(blockchain, balance, wallets, 2, 2)
+
+    # Last block with a transfer dropped no longer matches the merkle root of its header.
+    block_hash, block = premined_blocks[-1]
+    invalid_block = blocks.Block(
+        header=block.header, transactions=list(block.transactions[:-1])
+    )
+
+    invalid_blockchain = blocks.init_blockchain(wallets[7000].address)
+    invalid_blockchain.append(*premined_blocks[0])
+    balance = balances.init_balance(invalid_blockchain, keychain)
+
+    is_valid_block, _ = balances.extend_blockchain(
+        invalid_blockchain, balance, invalid_block
+    )
+    assert not is_valid_block
+
+    invalid_blockchain.append(block_hash, invalid_block)
+    genesis_blockchain = blocks.Blockchain(
+        chain=invalid_blockchain.chain[:1], blocks=invalid_blockchain.blocks
+    )
+    genesis_balance = balances.init_balance(genesis_blockchain, keychain)
+    is_valid, _ = balances.validate_blockchain(invalid_blockchain, genesis_balance)
+    assert not is_valid
+
+
+def test_replace_blockchain_unlinked(wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+
+    for block_hash, block in hq.premine_blocks(blockchain, balance, wallets, 5, 1):
+        blockchain.append(block_hash, block)
+
+    # Longer chain repeating a block at a height the search for the fork skips.
+    longer_blockchain = blocks.Blockchain(
+        chain=list(blockchain.chain), blocks=dict(blockchain.blocks)
+    )
+    longer_balance = balances.init_balance(longer_blockchain, keychain)
+
+    for block_hash, block in hq.premine_blocks(
+        longer_blockchain, longer_balance, wallets, 1, 1
+    ):
+        longer_blockchain.append(block_hash, block)
+
+    chain = longer_blockchain.chain
+    unlinked_blockchain = blocks.decode_blockchain(
+        blocks.Blockchain(
+            chain=chain[:2] + chain[1:2] + chain[3:], blocks=longer_blockchain.blocks
+        ).encode()
+    )
+
+    is_valid_replace, _ = balances.replace_blockchain(
+        unlinked_blockchain, blockchain, balance
+    )
+    assert not is_valid_replace
+    assert balance.latest_hash == blockchain.chain[-1]
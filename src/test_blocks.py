@@ -1,5 +1,8 @@
 from typing import Dict
+import dataclasses
 import hashlib
+import io
+import socket
 
 import pytest
 
@@ -155,3 +158,182 @@ def test_decode_blockchain(blockchain_with_1_block, blockchain_with_2_blocks):
 
     blockchain_bytes = blockchain_with_2_blocks.encode()
     assert blocks.decode_blockchain(blockchain_bytes).encode() == blockchain_bytes
+
+    # Decoding stops at the first block not linked to the one before.
+    genesis_hash = blockchain_with_2_blocks.chain[0]
+    unlinked_blockchain = blocks.Blockchain(
+        chain=[genesis_hash, genesis_hash], blocks=blockchain_with_2_blocks.blocks
+    )
+
+    for decode_blockchain in [blocks.decode_blockchain, blocks.decode_blockchain_view]:
+        blockchain = decode_blockchain(unlinked_blockchain.encode())
+        assert blockchain.chain == [genesis_hash]
+        assert blockchain.encode() == blockchain_with_1_block.encode()
+
+
+def test_fast_proof_of_work(
+    merkle_root_with_1_transaction, merkle_root_with_2_transactions
+):
+    """ """
+    previous_hash = (0).to_bytes(32, byteorder="big")
+    timestamp = 1634700000
+
+    for nonce, iterations in [(0, 1000), (48000, 1000), (48705, 1), (0, None)]:
+        assert blocks.run_fast_proof_of_work(
+            previous_hash, merkle_root_with_1_transaction, timestamp, nonce, iterations
+        ) == blocks.run_proof_of_work(
+            previous_hash, merkle_root_with_1_transaction, timestamp, nonce, iterations
+        )
+
+    # Include check on nonce values beyond 8 bytes.
+    nonce = 1 << 64
+    assert blocks.run_fast_proof_of_work(
+        previous_hash, merkle_root_with_2_transactions, timestamp, nonce, 100
+    ) == blocks.run_proof_of_work(
+        previous_hash, merkle_root_with_2_transactions, timestamp, nonce, 100
+    )
+
+
+def test_batch_proof_of_work(
+    merkle_root_with_1_transaction, merkle_root_with_2_transactions
+):
+    """ """
+    pytest.importorskip("numpy")
+
+    previous_hash = (0).to_bytes(32, byteorder="big")
+    timestamp = 1634700000
+
+    for merkle_root in [
+        merkle_root_with_1_transaction,
+        merkle_root_with_2_transactions,
+    ]:
+        for nonce, iterations in [(0, 1000), (48000, 1000), (48705, 1), (0, None)]:
+            assert blocks.run_proof_of_work(
+                previous_hash, merkle_root, timestamp, nonce, iterations, "numpy"
+            ) == blocks.run_proof_of_work(
+                previous_hash, merkle_root, timestamp, nonce, iterations
+            )
+
+
+def test_decode_blockchain_view(blockchain_with_2_blocks):
+    """ """
+    blockchain_bytes = blockchain_with_2_blocks.encode()
+    blockchain = blocks.decode_blockchain_view(blockchain_bytes)
+
+    assert blockchain.chain == blockchain_with_2_blocks.chain
+    assert blockchain.encode() == blockchain_bytes
+
+    for block_hash in blockchain.chain:
+        block = blockchain.blocks[block_hash]
+        expected_block = blockchain_with_2_blocks.blocks[block_hash]
+
+        assert isinstance(block.header, blocks.HeaderView)
+        for field in ["version", "previous_hash", "merkle_root", "timestamp", "nonce"]:
+            assert getattr(block.header, field) == getattr(expected_block.header, field)
+
+        for transaction, expected_transaction in zip(
+            block.transactions, expected_block.transactions
+        ):
+            assert isinstance(transaction, transacts.TransactionView)
+            assert transaction.sender == expected_transaction.sender
+            assert transaction.receiver == expected_transaction.receiver
+            assert transaction.encode() == expected_transaction.encode()
+
+
+def test_encode_blockchain(reward, blockchain_with_2_blocks):
+    """ """
+    blockchain = blocks.Blockchain(chain=[], blocks={})
+    assert blockchain.encode() == b""
+
+    for block_hash in blockchain_with_2_blocks.chain:
+        blockchain.append(block_hash, blockchain_with_2_blocks.blocks[block_hash])
+
+        expected_bytes = b"".join(
+            blockchain.blocks[block_hash].encode() for block_hash in blockchain.chain
+        )
+        assert blockchain.encode() == expected_bytes
+        assert blockchain.encoded_counter == len(blockchain.chain)
+
+    # Include check that encoding starts over when chain is shortened or replaced.
+    blockchain.chain.pop()
+    assert blockchain.encode() == blockchain.blocks[blockchain.chain[0]].encode()
+
+    blockchain.chain[0] = blockchain_with_2_blocks.chain[1]
+    assert blockchain.encode() == blockchain.blocks[blockchain.chain[0]].encode()
+
+
+def test_block_hash(blockchain_with_2_blocks):
+    """ """
+    for block_hash in blockchain_with_2_blocks.chain:
+        block = blockchain_with_2_blocks.blocks[block_hash]
+        header_bytes = block.header.encode()
+
+        assert block.header.hash() == block_hash
+        assert block.header.hash() == blocks.hash_header(header_bytes)
+        assert block.header.encode() is header_bytes
+        assert block.encode() is block.encode()
+
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            block.header.nonce = 0
+
+        assert isinstance(block.transactions, tuple)
+        assert not hasattr(block.header, "__dict__")
+
+
+def test_stream_blockchain(blockchain_with_2_blocks):
+    """ """
+    blockchain_bytes = blockchain_with_2_blocks.encode()
+
+    for stream in [io.BytesIO(blockchain_bytes), io.BytesIO(blockchain_bytes[:-1])]:
+        blockchain = blocks.Blockchain(chain=[], blocks={})
+
+        for block_hash, block in blocks.stream_blockchain(stream):
+            blockchain.append(block_hash, block)
+
+        assert blockchain_bytes.startswith(blockchain.encode())
+
+    # Include check on reading from a socket, with blocks split across sends.
+    sender, receiver = socket.socketpair()
+    sender.sendall(blockchain_bytes[:50])
+
+    block_stream = blocks.stream_blockchain(receiver)
+    sender.sendall(blockchain_bytes[50:])
+    sender.close()
+
+    assert [block_hash for block_hash, _ in block_stream] == (
+        blockchain_with_2_blocks.chain
+    )
+    receiver.close()
+
+
+def test_blockchain_height(blockchain_with_2_blocks):
+    """ """
+    chain = blockchain_with_2_blocks.chain
+    blockchain = blocks.Blockchain(
+        chain=chain[:1], blocks=blockchain_with_2_blocks.blocks
+    )
+
+    assert blockchain.height(chain[0]) == 0
+    assert blockchain.height(chain[1]) is None
+
+    blockchain.append(chain[1], blockchain_with_2_blocks.blocks[chain[1]])
+    assert blockchain.height(chain[1]) == 1
+
+    # Include check on index rebuilt after the chain is shortened or changed.
+    blockchain.chain = chain[:1]
+    assert blockchain.height(chain[1]) is None
+
+    blockchain.chain = [chain[1], chain[0]]
+    assert blockchain.height(chain[0]) == 1
+
+
+def test_find_fork_height():
+    """ """
+    chain = [bytes([i]) * 32 for i in range(10)]
+    other_chain = chain[:6] + [bytes([i]) * 32 for i in range(100, 110)]
+
+    assert blocks.find_fork_height(chain, other_chain) == 6
+    assert blocks.find_fork_height(chain, chain[:4]) == 4
+    assert blocks.find_fork_height(chain, chain) == 10
+    assert blocks.find_fork_height(chain, other_chain[6:]) == 0
+
@@ -0,0 +1,39 @@
+import cluster
+
+
+def test_init_topology():
+    """ """
+    ports = cluster.init_ports(5)
+    assert ports == [7000, 7001, 7002, 7003, 7004]
+
+    peers = cluster.init_topology(ports, "mesh")
+    assert all(len(peers[port]) == 4 and port not in peers[port] for port in ports)
+
+    peers = cluster.init_topology(ports, "ring")
+    assert peers[7000] == [7001, 7004]
+    assert peers[7002] == [7001, 7003]
+
+    peers = cluster.init_topology(ports, "random", 3, seed=0)
+    assert all(len(peers[port]) == 3 and port not in peers[port] for port in ports)
+    assert peers == cluster.init_topology(ports, "random", 3, seed=0)
+
+    # Include check on a ring of 2 nodes.
+    assert cluster.init_topology(ports[:2], "ring") == {7000: [7001], 7001: [7000]}
+
+
+def test_report_cluster():
+    """ """
+    arrivals: cluster.Arrivals = {
+        7000: {"00": (0.0, 0), "a1": (10.0, 1), "b2": (10.5, 2)},
+        7001: {"00": (0.0, 0), "a1": (10.1, 1), "b2": (10.6, 2)},
+        7002: {"00": (0.0, 0), "a1": (10.3, 1), "c2": (10.4, 2)},
+    }
+
+    propagation = cluster.compute_propagation(arrivals)
+    assert sorted(propagation) == ["a1", "b2", "c2"]
+    assert [round(delay, 6) for delay in propagation["a1"]] == [0, 0.1, 0.3]
+    assert [round(delay, 6) for delay in propagation["b2"]] == [0, 0.1]
+
+    report = cluster.report_cluster(arrivals)
+    assert report.startswith("nodes=3 blocks=3 reached_all=1 forks=1")
+    assert "all_nodes p50=300.0ms" in report
@@ -0,0 +1,79 @@
+from typing import Dict
+import hashlib
+
+import pytest
+
+import blocks
+import crypto
+import transactions as transacts
+
+np = pytest.importorskip("numpy")
+columns = pytest.importorskip("columns")
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def blockchain_with_2_blocks(wallets) -> blocks.Blockchain:
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+
+    reward = transacts.init_reward(wallets[8000].address)
+    transfer = transacts.Transaction(
+        reference_hash=hashlib.sha256(b"reference").digest(),
+        sender=wallets[7000].address,
+        receiver=wallets[9000].address,
+        signature=bytes(range(transacts.SIGNATURE_SIZE)),
+    )
+
+    header = blocks.Header(
+        version=blocks.VERSION,
+        previous_hash=blockchain.chain[0],
+        merkle_root=(0).to_bytes(32, byteorder="big"),
+        timestamp=1634700600,
+        nonce=0,
+    )
+    blockchain.append(
+        header.hash(), blocks.Block(header=header, transactions=[reward, transfer])
+    )
+
+    return blockchain
+
+
+def test_decode_blockchain_transactions(wallets, blockchain_with_2_blocks):
+    """ """
+    transactions, heights = columns.decode_blockchain_transactions(
+        blockchain_with_2_blocks.encode()
+    )
+    expected_transactions = [
+        transaction
+        for block_hash in blockchain_with_2_blocks.chain
+        for transaction in blockchain_with_2_blocks.blocks[block_hash].transactions
+    ]
+
+    assert len(transactions) == 3
+    assert list(heights) == [0, 1, 1]
+
+    for record, transaction in zip(transactions, expected_transactions):
+        assert record.tobytes() == transaction.encode()
+        assert record["sender"].tobytes() == transaction.sender
+
+    mask = columns.select_transactions(transactions, sender=wallets[7000].address)
+    assert list(heights[mask]) == [1]
+
+    mask = columns.select_transactions(
+        transactions, sender=transacts.REWARD_SENDER, receiver=wallets[8000].address
+    )
+    assert list(heights[mask]) == [1]
+
+    block = blockchain_with_2_blocks.blocks[blockchain_with_2_blocks.chain[1]]
+    transactions_bytes = b"".join(
+        transaction.encode() for transaction in block.transactions
+    )
+
+    transactions = columns.decode_transactions_array(2, transactions_bytes)
+    assert transactions[1]["signature"].tobytes() == block.transactions[1].signature
@@ -0,0 +1,65 @@
+import os
+
+import fragments
+
+
+def test_split_message():
+    """ """
+    message = os.urandom(3 * fragments.FRAGMENT_SIZE + 1)
+    datagrams = fragments.split_message(message)
+
+    assert len(datagrams) == 4
+    assert all(len(datagram) <= fragments.DATAGRAM_SIZE for datagram in datagrams)
+
+    # Include check on fragments arriving out of order and duplicated.
+    reassembler = fragments.init_reassembler()
+    address = ("127.0.0.1", 7000)
+
+    for datagram in [datagrams[3], datagrams[1], datagrams[1], datagrams[0]]:
+        assert fragments.receive_fragment(reassembler, datagram, address) is None
+
+    assert fragments.receive_fragment(reassembler, datagrams[2], address) == message
+    assert len(reassembler.partials) == 0 and reassembler.size == 0
+
+    # Include check on single fragment and empty messages.
+    for message in [b"\x02", b""]:
+        datagrams = fragments.split_message(message)
+        assert len(datagrams) == 1
+        assert fragments.receive_fragment(reassembler, datagrams[0], address) == message
+
+    assert fragments.receive_fragment(reassembler, b"\x00", address) is None
+
+
+def test_reassembler_bounds():
+    """ """
+    address = ("127.0.0.1", 7000)
+    message = bytes(2 * fragments.FRAGMENT_SIZE)
+
+    # Include check on partial messages dropped after the timeout.
+    reassembler = fragments.init_reassembler(timeout=1)
+    datagrams = fragments.split_message(message)
+
+    assert fragments.receive_fragment(reassembler, datagrams[0], address, 0) is None
+    assert fragments.receive_fragment(reassembler, datagrams[1], address, 2) is None
+    assert len(reassembler.partials) == 1
+
+    # Include check on oldest partial messages dropped to keep within the buffer size.
+    reassembler = fragments.init_reassembler(buffer_size=2 * fragments.FRAGMENT_SIZE)
+    first_datagrams = fragments.split_message(message)
+    second_datagrams = fragments.split_message(message)
+
+    fragments.receive_fragment(reassembler, first_datagrams[0], address, 0)
+    fragments.receive_fragment(reassembler, second_datagrams[0], address, 0)
+    fragments.receive_fragment(reassembler, second_datagrams[1], address, 0)
+
+    assert len(reassembler.partials) == 0
+    assert reassembler.size == 0
+
+    fragments.receive_fragment(reassembler, first_datagrams[0], address, 0)
+    fragments.receive_fragment(reassembler, second_datagrams[0], address, 0)
+    assert reassembler.size <= reassembler.buffer_size
+
+    # Include check on messages too large for the buffer.
+    datagrams = fragments.split_message(bytes(3 * fragments.FRAGMENT_SIZE))
+    assert fragments.receive_fragment(reassembler, datagrams[0], address, 0) is None
+    assert reassembler.size <= reassembler.buffer_size
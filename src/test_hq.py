@@ -0,0 +1,54 @@
+from typing import Dict
+
+import pytest
+
+import balances
+import blocks
+import crypto
+import hq
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def keychain(wallets) -> balances.Keychain:
+    """ """
+    return {wallet.address: wallet.public_key for _, wallet in wallets.items()}
+
+
+def test_premine_blocks(wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+    premined_blocks = hq.premine_blocks(blockchain, balance, wallets, 4, 3)
+
+    # Transfers are limited by the unspent outputs, i.e. one per block so far.
+    transfer_counters = [len(block.transactions) - 1 for _, block in premined_blocks]
+    assert transfer_counters == [1, 2, 3, 3]
+
+    # Include check on blocks decoded from bytes, with signatures padded to a fixed size.
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+
+    for _, block in premined_blocks:
+        is_valid_block, post_block_balance = balances.extend_blockchain(
+            blockchain, balance, blocks.decode_block(block.encode())
+        )
+
+        assert is_valid_block and post_block_balance is not None
+        balance = post_block_balance
+
+
+def test_report_latencies():
+    """ """
+    latencies = [i / 1000 for i in range(1, 101)]
+    assert hq.compute_percentile(latencies, 50) == 0.05
+    assert hq.compute_percentile(latencies, 99) == 0.099
+    assert hq.compute_percentile([0.1], 99) == 0.1
+
+    assert hq.report_latencies(latencies).startswith("p50=50.0ms p90=90.0ms p99=99.0ms")
+    assert hq.report_latencies([]) == "latency=n/a"
@@ -0,0 +1,79 @@
+from typing import Dict
+import collections
+import hashlib
+
+import pytest
+
+import blocks
+import crypto
+import messages
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def blockchain_with_1_block(wallets) -> blocks.Blockchain:
+    """ """
+    return blocks.init_blockchain(wallets[7000].address)
+
+
+def test_block_message(blockchain_with_1_block):
+    """ """
+    block = blockchain_with_1_block.blocks[blockchain_with_1_block.chain[0]]
+    message = messages.encode_block_message(block)
+
+    message_type, payload = messages.decode_message(message)
+    assert message_type == messages.MESSAGE_BLOCK
+
+    parent_hash, decoded_block = messages.decode_block_message(payload)
+    assert parent_hash == block.header.previous_hash
+    assert decoded_block.encode() == block.encode()
+
+    # Include check on parent hash not matching the header.
+    parent_hash, decoded_block = messages.decode_block_message(
+        bytes(32 * [1]) + block.encode()
+    )
+    assert parent_hash is None and decoded_block is None
+
+    assert messages.decode_message(b"") == (None, b"")
+    assert messages.decode_message(b"\xff") == (None, b"")
+
+
+def test_drop_duplicates(blockchain_with_1_block):
+    """ """
+    block = blockchain_with_1_block.blocks[blockchain_with_1_block.chain[0]]
+    announcement = messages.encode_block_message(block)
+    request = messages.encode_message(messages.MESSAGE_GET_BLOCKCHAIN)
+
+    received = [
+        (announcement, ("127.0.0.1", 7000)),
+        (announcement, ("127.0.0.1", 8000)),
+        (request, ("127.0.0.1", 7000)),
+        (request, ("127.0.0.1", 7000)),
+        (request, ("127.0.0.1", 8000)),
+    ]
+    seen = collections.OrderedDict()
+
+    unique = messages.drop_duplicates(received, seen)
+    assert unique == [received[0], received[2], received[4]]
+
+    # Announcement not yet handled successfully is kept in a later burst.
+    unique = messages.drop_duplicates(received, seen)
+    assert unique == [received[0], received[2], received[4]]
+
+    # Include check on announcements handled in an earlier burst, and requests never recorded.
+    messages.record_seen(seen, announcement)
+    messages.record_seen(seen, request)
+    assert list(seen) == [hashlib.sha256(announcement).digest()]
+
+    unique = messages.drop_duplicates(received, seen)
+    assert unique == [received[2], received[4]]
+
+    blockchain_bytes = blockchain_with_1_block.encode()
+    assert messages.count_blocks(blockchain_bytes) == 1
+    assert messages.count_blocks(2 * blockchain_bytes) == 2
+    assert messages.count_blocks(b"") == 0
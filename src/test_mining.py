@@ -0,0 +1,86 @@
+from typing import Dict
+import hashlib
+
+import pytest
+
+import blocks
+import crypto
+import mining
+import transactions as transacts
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def merkle_root_with_1_transaction(wallets) -> transacts.Hash:
+    """ """
+    reward = transacts.init_reward(wallets[7000].address)
+    merkle_tree = transacts.init_merkle_tree([hashlib.sha256(reward.encode()).digest()])
+
+    assert merkle_tree is not None
+    return merkle_tree.tree_hash
+
+
+@pytest.fixture
+def miner():
+    """ """
+    miner = mining.init_miner(2)
+    yield miner
+    mining.close_miner(miner)
+
+
+def test_run_parallel_proof_of_work(miner, merkle_root_with_1_transaction):
+    """ """
+    previous_hash = (0).to_bytes(32, byteorder="big")
+    timestamp = 1634700000
+
+    for nonce, iterations in [(0, 1000), (40000, 10000), (0, None)]:
+        assert mining.run_parallel_proof_of_work(
+            previous_hash,
+            merkle_root_with_1_transaction,
+            timestamp,
+            nonce,
+            iterations,
+            miner,
+        ) == blocks.run_proof_of_work(
+            previous_hash, merkle_root_with_1_transaction, timestamp, nonce, iterations
+        )
+
+
+def test_cancel_search(miner, merkle_root_with_1_transaction):
+    """ """
+    previous_hash = (0).to_bytes(32, byteorder="big")
+
+    search = mining.start_search(
+        miner, previous_hash, merkle_root_with_1_transaction, 1634700000, 0, None, 100
+    )
+    mining.cancel_search(search)
+
+    is_new_block, _, block_hash, header = mining.poll_search(search)
+
+    assert not is_new_block
+    assert block_hash is None
+    assert header is None
+    assert len(search.pending) == 0
+
+
+def test_scheduler():
+    """ """
+    scheduler = mining.init_scheduler(target_latency=0.1)
+    assert mining.next_slice_size(scheduler) == scheduler.min_slice_size
+
+    mining.record_mining(scheduler, 1000, 0.01)
+    assert mining.next_slice_size(scheduler) == 10000
+
+    # Slices shrink while messages are arriving.
+    mining.record_listening(scheduler, 0.1, True)
+    assert mining.next_slice_size(scheduler) < 10000
+
+    mining.record_listening(scheduler, 0.1, False)
+    assert scheduler.slice_counter == 1
+    assert scheduler.listening_time == pytest.approx(0.2)
+    assert "slices=1" in mining.report_scheduler(scheduler)
@@ -0,0 +1,133 @@
+from typing import Dict
+
+import pytest
+
+import balances
+import blocks
+import crypto
+import fragments
+import messages
+import node
+import storage
+import transactions as transacts
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def keychain(wallets) -> balances.Keychain:
+    """ """
+    return {wallet.address: wallet.public_key for _, wallet in wallets.items()}
+
+
+@pytest.fixture
+def blockchain_with_3_blocks(wallets) -> blocks.Blockchain:
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+
+    for port in [8000, 9000]:
+        previous_hash = blockchain.chain[-1]
+        timestamp = blockchain.blocks[previous_hash].header.timestamp + 1
+        reward = transacts.init_reward(wallets[port].address)
+
+        is_found, _, block_hash, header = blocks.run_fast_proof_of_work(
+            previous_hash, reward.hash(), timestamp
+        )
+
+        assert is_found and block_hash is not None and header is not None
+        block = blocks.Block(header=header, transactions=[reward])
+        blockchain.append(block_hash, block)
+
+    return blockchain
+
+
+@pytest.fixture
+def local_node(wallets, keychain) -> node.Node:
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+
+    return node.Node(
+        address=wallets[7000].address,
+        port=0,
+        sock=node.bind_socket("127.0.0.1", 0),
+        blockchain=blockchain,
+        balance=balances.init_balance(blockchain, keychain),
+        peers=[7000, 7100],
+    )
+
+
+def test_receive_datagrams(monkeypatch, local_node, blockchain_with_3_blocks):
+    """ """
+    replace_counter = 0
+    replace_blockchain = balances.replace_blockchain
+
+    def count_replace_blockchain(*args):
+        nonlocal replace_counter
+        replace_counter += 1
+        return replace_blockchain(*args)
+
+    monkeypatch.setattr(balances, "replace_blockchain", count_replace_blockchain)
+    monkeypatch.setattr(node, "NODE_IP", "127.0.0.1")
+
+    # Burst of the same and nested chains announced by several peers.
+    datagrams = []
+
+    for i in range(10):
+        chain = blockchain_with_3_blocks.chain[: 2 + i % 2]
+        blockchain = blocks.Blockchain(
+            chain=chain, blocks=blockchain_with_3_blocks.blocks
+        )
+        message = messages.encode_message(
+            messages.MESSAGE_BLOCKCHAIN, blockchain.encode()
+        )
+
+        for datagram in fragments.split_message(message):
+            datagrams.append((datagram, ("127.0.0.1", 7000 + i)))
+
+    is_new_tip, replies = node.receive_datagrams(local_node, datagrams)
+
+    assert is_new_tip
+    assert local_node.blockchain.chain == blockchain_with_3_blocks.chain
+    assert replace_counter == 1
+
+    # Include check on new tip relayed only to peers which did not send it.
+    tip_block = blockchain_with_3_blocks.blocks[blockchain_with_3_blocks.chain[-1]]
+    assert replies == [(messages.encode_block_message(tip_block), ("127.0.0.1", 7100))]
+
+    local_node.sock.close()
+
+
+def test_init_node_snapshot(monkeypatch, tmp_path, blockchain_with_3_blocks):
+    """ """
+    path = tmp_path / "8000"
+    store = storage.open_store(str(path))
+    storage.save_blockchain(store, blockchain_with_3_blocks)
+
+    partial_blockchain = blocks.Blockchain(
+        chain=blockchain_with_3_blocks.chain[:2], blocks=blockchain_with_3_blocks.blocks
+    )
+    snapshot_bytes = balances.encode_balance(balances.init_balance(partial_blockchain))
+    storage.save_snapshot(store, snapshot_bytes)
+    storage.close_store(store)
+
+    bind_socket = node.bind_socket
+    monkeypatch.setattr(node, "bind_socket", lambda ip, port: bind_socket(ip, 0))
+    monkeypatch.setattr(node, "NODE_IP", "127.0.0.1")
+    monkeypatch.setattr(node, "NODE_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(node, "SNAPSHOT_INTERVAL", 2)
+
+    # Restored balance is not saved again right away.
+    local_node = node.init_node(8000)
+
+    assert local_node.balance.latest_hash == blockchain_with_3_blocks.chain[-1]
+    assert local_node.snapshot_height == 2
+    assert local_node.store is not None
+    assert storage.load_snapshot(local_node.store) == snapshot_bytes
+
+    assert local_node.sock is not None
+    local_node.sock.close()
+    storage.close_store(local_node.store)
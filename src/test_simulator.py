@@ -0,0 +1,43 @@
+import blocks
+import simulator
+
+
+def test_run_simulator():
+    """ """
+    network = simulator.Network(latency=0.05, jitter=0.01, bandwidth=1e6)
+    sim = simulator.init_simulator(5, "ring", network=network, seed=0)
+    simulator.run_simulator(sim, 300)
+
+    # Mocked proof-of-work is only accepted while simulating.
+    assert blocks.DIFFICULTY_PREFIX == b"\x00\x00"
+    assert sim.mined and sim.time >= 300
+
+    # All nodes settle on the same chain, with each mined block arriving after the latency.
+    tips = {local_node.blockchain.chain[-1] for local_node in sim.nodes.values()}
+    assert len(tips) == 1
+
+    for block_hash, (miner, mined_time) in sim.mined.items():
+        for port, node_arrivals in sim.arrivals.items():
+            if port != miner and block_hash in node_arrivals:
+                assert node_arrivals[block_hash] - mined_time >= 0.05
+
+    report = simulator.report_simulator(sim)
+    assert report.startswith(f"nodes=5 time={sim.time:.1f}s mined={len(sim.mined)}")
+    assert "REPORT node=7004" in report
+
+
+def test_send():
+    """ """
+    network = simulator.Network(latency=0.1, jitter=0, loss=1.0, bandwidth=1000)
+    sim = simulator.init_simulator(2, seed=0)
+    sim.network = network
+    sim.events = []
+
+    # Uplink is busy for the serialization time of each message, even if lost.
+    simulator.send(sim, 7000, bytes(488), (simulator.SIMULATOR_IP, 7001))
+    assert sim.uplinks[7000] == 0.5 and sim.drop_counter == 1 and not sim.events
+
+    network.loss = 0.0
+    simulator.send(sim, 7000, bytes(488), (simulator.SIMULATOR_IP, 7001))
+    assert sim.uplinks[7000] == 1.0
+    assert sim.events == [(1.1, sim.event_counter - 1, 7001, (7000, bytes(488)))]
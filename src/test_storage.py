@@ -0,0 +1,147 @@
+from typing import Dict
+import hashlib
+
+import pytest
+
+import blocks
+import crypto
+import storage
+import transactions as transacts
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def blockchain_with_3_blocks(wallets) -> blocks.Blockchain:
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    reward = transacts.init_reward(wallets[8000].address)
+    merkle_root = hashlib.sha256(reward.encode()).digest()
+
+    for timestamp in [1634700600, 1634701200]:
+        _, _, block_hash, header = blocks.run_fast_proof_of_work(
+            blockchain.chain[-1], merkle_root, timestamp
+        )
+        assert block_hash is not None and header is not None
+        block = blocks.Block(header=header, transactions=[reward])
+        blockchain.append(block_hash, block)
+
+    return blockchain
+
+
+def test_save_blockchain(tmp_path, blockchain_with_3_blocks):
+    """ """
+    path = str(tmp_path)
+    blockchain = blockchain_with_3_blocks
+
+    store = storage.open_store(path)
+    assert storage.load_blockchain(store) is None
+
+    partial_blockchain = blocks.Blockchain(
+        chain=blockchain.chain[:2], blocks=blockchain.blocks
+    )
+    assert storage.save_blockchain(store, partial_blockchain) == 2
+    assert storage.save_blockchain(store, partial_blockchain) == 0
+    assert storage.save_blockchain(store, blockchain) == 1
+    storage.close_store(store)
+
+    store = storage.open_store(path)
+    stored_blockchain = storage.load_blockchain(store)
+
+    assert stored_blockchain.chain == blockchain.chain
+    assert blockchain.chain[-1] in stored_blockchain.blocks
+    assert stored_blockchain.encode() == blockchain.encode()
+
+    # Switching to a shorter chain is recorded by rewriting its tip.
+    assert storage.save_blockchain(store, partial_blockchain) == 1
+    storage.close_store(store)
+
+    store = storage.open_store(path)
+    assert store.chain == partial_blockchain.chain
+    storage.close_store(store)
+
+
+def test_open_store_with_partial_record(tmp_path, blockchain_with_3_blocks):
+    """ """
+    path = str(tmp_path)
+
+    store = storage.open_store(path)
+    storage.save_blockchain(store, blockchain_with_3_blocks)
+    storage.close_store(store)
+
+    # Simulate crash while writing the last index record.
+    with open(tmp_path / storage.INDEX_FILENAME, "r+b") as f:
+        f.truncate(3 * storage.INDEX_RECORD_SIZE - 1)
+
+    store = storage.open_store(path)
+    assert store.chain == blockchain_with_3_blocks.chain[:2]
+
+    # Block written before the crash is dropped and written again.
+    block_sizes = [
+        len(blockchain_with_3_blocks.blocks[block_hash].encode())
+        for block_hash in blockchain_with_3_blocks.chain
+    ]
+    assert store.segment_size == sum(block_sizes[:2])
+    assert storage.save_blockchain(store, blockchain_with_3_blocks) == 1
+    assert store.segment_size == sum(block_sizes)
+    storage.close_store(store)
+
+
+def test_load_blockchain(tmp_path, wallets, blockchain_with_3_blocks):
+    """ """
+    store = storage.open_store(str(tmp_path))
+    storage.save_blockchain(store, blockchain_with_3_blocks)
+
+    blockchain = storage.load_blockchain(store)
+    assert blockchain is not None
+
+    # Blocks not yet decoded are still seen by every method of the mapping.
+    stored_blocks = blockchain.blocks
+    assert isinstance(stored_blocks, storage.StoredBlocks)
+    stored_blocks.cache_size = 2
+
+    assert len(stored_blocks) == 3
+    assert list(stored_blocks) == blockchain_with_3_blocks.chain
+    assert stored_blocks.get(blockchain.chain[-1]) is not None
+    assert stored_blocks.get(bytes(32)) is None
+    assert dict(stored_blocks.items()) == blockchain_with_3_blocks.blocks
+
+    # Only the latest decoded blocks are kept in memory.
+    assert list(stored_blocks.cache) == blockchain.chain[1:]
+
+    # New block is kept in memory until saved.
+    previous_hash = blockchain.chain[-1]
+    timestamp = blockchain.blocks[previous_hash].header.timestamp + 1
+    reward = transacts.init_reward(wallets[9000].address)
+    _, _, block_hash, header = blocks.run_fast_proof_of_work(
+        previous_hash, reward.hash(), timestamp
+    )
+
+    assert block_hash is not None and header is not None
+    blockchain.append(block_hash, blocks.Block(header=header, transactions=[reward]))
+    assert len(stored_blocks) == 4 and block_hash in stored_blocks.pending
+
+    storage.save_blockchain(store, blockchain)
+    assert len(stored_blocks) == 4 and not stored_blocks.pending
+    assert stored_blocks[block_hash].header == header
+
+    storage.close_store(store)
+
+
+def test_save_snapshot(tmp_path):
+    """ """
+    store = storage.open_store(str(tmp_path))
+    assert storage.load_snapshot(store) is None
+
+    storage.save_snapshot(store, b"first")
+    storage.save_snapshot(store, b"second")
+
+    assert storage.load_snapshot(store) == b"second"
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [storage.SEGMENT_FILENAME, storage.INDEX_FILENAME, storage.SNAPSHOT_FILENAME]
+    )
+    storage.close_store(store)
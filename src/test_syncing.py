@@ -0,0 +1,137 @@
+from typing import Dict
+import dataclasses
+
+import pytest
+
+import balances
+import blocks
+import crypto
+import messages
+import syncing
+import transactions as transacts
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def keychain(wallets) -> balances.Keychain:
+    """ """
+    return {wallet.address: wallet.public_key for _, wallet in wallets.items()}
+
+
+@pytest.fixture
+def blockchain_with_4_blocks(wallets) -> blocks.Blockchain:
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+
+    for port in [7000, 8000, 9000]:
+        previous_hash = blockchain.chain[-1]
+        timestamp = blockchain.blocks[previous_hash].header.timestamp + 1
+        reward = transacts.init_reward(wallets[port].address)
+
+        is_found, _, block_hash, header = blocks.run_fast_proof_of_work(
+            previous_hash, reward.hash(), timestamp
+        )
+
+        assert is_found and block_hash is not None and header is not None
+        block = blocks.Block(header=header, transactions=[reward])
+        blockchain.append(block_hash, block)
+
+    return blockchain
+
+
+def test_init_locator():
+    """ """
+    chain = [i.to_bytes(32, byteorder="big") for i in range(100)]
+    locator = syncing.init_locator(blocks.Blockchain(chain=chain, blocks={}))
+
+    assert locator[:10] == chain[-1:-11:-1]
+    assert locator[-1] == chain[0]
+    assert len(locator) < 20
+
+    locator = syncing.init_locator(blocks.Blockchain(chain=chain[:1], blocks={}))
+    assert locator == chain[:1]
+
+
+def test_sync(wallets, keychain, blockchain_with_4_blocks):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+
+    # Headers are sent in batches, with each batch continuing from the latest header.
+    locator = syncing.init_locator(blockchain)
+    sync = None
+
+    while True:
+        message = syncing.select_headers(blockchain_with_4_blocks, locator, 2)
+        assert message is not None
+
+        _, payload = messages.decode_message(message)
+        fork_hash, headers = messages.decode_headers_message(payload)
+
+        if sync is None:
+            assert fork_hash is not None
+            sync = syncing.init_sync(blockchain, fork_hash)
+
+        assert sync is not None and syncing.extend_sync(sync, headers)
+
+        if len(headers) < 2:
+            break
+
+        locator = syncing.init_sync_locator(blockchain, sync)
+
+    assert sync.hashes == blockchain_with_4_blocks.chain[1:]
+    assert syncing.is_longer(blockchain, sync)
+
+    missing_hashes = syncing.find_missing_hashes(sync)
+    message = syncing.select_blocks(blockchain_with_4_blocks, missing_hashes)
+    assert message is not None
+
+    _, payload = messages.decode_message(message)
+    assert syncing.add_blocks(sync, messages.decode_blocks_message(payload)) == 3
+    assert syncing.find_missing_hashes(sync) == []
+
+    potential_blockchain = syncing.build_blockchain(blockchain, sync)
+    assert potential_blockchain is not None
+    assert potential_blockchain.chain == blockchain_with_4_blocks.chain
+
+    is_valid_blockchain, balance = balances.replace_blockchain(
+        potential_blockchain, blockchain, balance
+    )
+    assert is_valid_blockchain and balance is not None
+    assert balance.latest_hash == blockchain_with_4_blocks.chain[-1]
+
+
+def test_sync_invalid(wallets, blockchain_with_4_blocks):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    headers = [
+        blockchain_with_4_blocks.blocks[block_hash].header
+        for block_hash in blockchain_with_4_blocks.chain[1:]
+    ]
+
+    # Include check on headers failing proof-of-work or not forming a chain.
+    sync = syncing.init_sync(blockchain, blockchain.chain[0])
+    assert sync is not None
+    assert not syncing.extend_sync(sync, [dataclasses.replace(headers[0], nonce=0)])
+
+    sync = syncing.init_sync(blockchain, blockchain.chain[0])
+    assert sync is not None
+    assert not syncing.extend_sync(sync, headers[1:])
+
+    assert syncing.init_sync(blockchain, blockchain_with_4_blocks.chain[-1]) is None
+
+    # Include check on block bodies not matching the merkle root of the header.
+    sync = syncing.init_sync(blockchain, blockchain.chain[0])
+    assert sync is not None and syncing.extend_sync(sync, headers)
+
+    block = blockchain_with_4_blocks.blocks[sync.hashes[0]]
+    reward = transacts.init_reward(wallets[9000].address)
+    block = blocks.Block(header=block.header, transactions=[reward])
+
+    assert syncing.add_blocks(sync, [block]) == 0
+    assert syncing.build_blockchain(blockchain, sync) is None
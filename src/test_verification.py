@@ -0,0 +1,204 @@
+from typing import Dict
+import dataclasses
+
+import pytest
+
+import balances
+import blocks
+import crypto
+import hq
+import transactions as transacts
+import verification
+
+
+@pytest.fixture
+def wallets() -> Dict[int, crypto.Wallet]:
+    """ """
+    return crypto.load_demo_wallets()
+
+
+@pytest.fixture
+def keychain(wallets) -> balances.Keychain:
+    """ """
+    return {wallet.address: wallet.public_key for _, wallet in wallets.items()}
+
+
+@pytest.fixture
+def verifier():
+    """ """
+    verifier = verification.init_verifier(processes=2, chunk_size=2)
+    yield verifier
+    verification.close_verifier(verifier)
+
+
+def test_verify_signatures(wallets, verifier):
+    """ """
+    wallet = wallets[7000]
+    public_key_bytes = crypto.encode_public_key(wallet.public_key)
+    assert crypto.decode_public_key(public_key_bytes) == wallet.public_key
+
+    verifications = []
+
+    for i in range(7):
+        message = bytes([i]) * 64
+        signature = crypto.pad_signature(crypto.sign(wallet.private_key, message))
+        verifications.append((signature, public_key_bytes, message))
+
+    assert verification.verify_signatures(verifications)
+    assert verification.verify_signatures(verifications, verifier)
+
+    signature, _, message = verifications[5]
+    verifications[5] = (signature, public_key_bytes, message + b"\x00")
+    assert not verification.verify_signatures(verifications)
+    assert not verification.verify_signatures(verifications, verifier)
+
+    # Include check on signature with padding other than zero bytes.
+    message = bytes(64)
+    signature = crypto.sign(wallet.private_key, message)
+
+    while len(signature) >= transacts.SIGNATURE_SIZE:
+        signature = crypto.sign(wallet.private_key, message)
+
+    padded_signature = crypto.pad_signature(signature)
+    assert crypto.verify(padded_signature, wallet.public_key, message)
+
+    malleated_signature = padded_signature[:-1] + b"\x01"
+    assert not crypto.verify(malleated_signature, wallet.public_key, message)
+
+
+def test_cache():
+    """ """
+    cache = verification.init_cache(size=2)
+    keys = [(bytes([i]) * 32, b"key") for i in range(3)]
+
+    assert verification.lookup_cache(cache, keys[0]) is None
+    verification.update_cache(cache, keys[0], True)
+    verification.update_cache(cache, keys[1], False)
+
+    assert verification.lookup_cache(cache, keys[0]) is True
+    assert verification.lookup_cache(cache, keys[1]) is False
+
+    # Least recently used is evicted first.
+    assert verification.lookup_cache(cache, keys[0]) is True
+    verification.update_cache(cache, keys[2], True)
+    assert list(cache.results) == [keys[0], keys[2]]
+
+    assert (cache.hit_counter, cache.miss_counter) == (3, 1)
+    assert verification.compute_hit_rate(cache) == 0.75
+    assert verification.report_cache(cache) == "hits=3 misses=1 hit_rate=75.0% size=2/2"
+
+
+def test_validate_blockchain_cache(monkeypatch, wallets, keychain):
+    """ """
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+    premined_blocks = hq.premine_blocks(blockchain, balance, wallets, 4, 3)
+
+    for block_hash, block in premined_blocks:
+        blockchain.append(block_hash, block)
+
+    verify_counter = 0
+    verify = crypto.verify
+
+    def count_verify(*args):
+        nonlocal verify_counter
+        verify_counter += 1
+        return verify(*args)
+
+    monkeypatch.setattr(crypto, "verify", count_verify)
+
+    # Signatures are verified once, then looked up when validating again from genesis.
+    cache = verification.init_cache()
+    transfer_counter = sum(len(block.transactions) - 1 for _, block in premined_blocks)
+
+    for i in range(2):
+        genesis_blockchain = blocks.Blockchain(
+            chain=blockchain.chain[:1], blocks=blockchain.blocks
+        )
+        balance = balances.init_balance(genesis_blockchain, keychain, cache)
+        is_valid, _ = balances.validate_blockchain(blockchain, balance)
+
+        assert is_valid
+        assert verify_counter == transfer_counter
+        assert cache.hit_counter == i * transfer_counter
+
+
+def test_validate_blockchain_batch_cache(monkeypatch, wallets, keychain, verifier):
+    """ """
+    monkeypatch.setattr(balances, "BATCH_SIZE", 4)
+
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+    premined_blocks = hq.premine_blocks(blockchain, balance, wallets, 4, 3)
+
+    for block_hash, block in premined_blocks:
+        blockchain.append(block_hash, block)
+
+    # Signatures verified on the process pool are cached, then looked up on the second pass.
+    cache = verification.init_cache()
+    transfer_counter = sum(len(block.transactions) - 1 for _, block in premined_blocks)
+
+    for i in range(2):
+        genesis_blockchain = blocks.Blockchain(
+            chain=blockchain.chain[:1], blocks=blockchain.blocks
+        )
+        balance = balances.init_balance(genesis_blockchain, keychain, cache)
+        is_valid, _ = balances.validate_blockchain(blockchain, balance, verifier)
+
+        assert is_valid
+        assert len(cache.results) == transfer_counter
+        assert cache.hit_counter == i * transfer_counter
+        assert cache.miss_counter == transfer_counter
+
+
+def test_validate_blockchain_batch(monkeypatch, wallets, keychain, verifier):
+    """ """
+    monkeypatch.setattr(balances, "BATCH_SIZE", 4)
+
+    submissions = []
+    submit_signatures = verification.submit_signatures
+
+    def record_submit_signatures(*args):
+        submission = submit_signatures(*args)
+        submissions.append(submission)
+        return submission
+
+    monkeypatch.setattr(verification, "submit_signatures", record_submit_signatures)
+
+    blockchain = blocks.init_blockchain(wallets[7000].address)
+    balance = balances.init_balance(blockchain, keychain)
+    premined_blocks = hq.premine_blocks(blockchain, balance, wallets, 6, 3)
+
+    # Same result as the serial validator for a valid chain, and with a signature of each block
+    # in turn made invalid.
+    for invalid_index in [None] + list(range(1, 6)):
+        blockchain = blocks.init_blockchain(wallets[7000].address)
+
+        for i, (block_hash, block) in enumerate(premined_blocks):
+            if i == invalid_index:
+                transfer = dataclasses.replace(
+                    block.transactions[1], signature=bytes(72)
+                )
+                transaction_list = list(block.transactions)
+                transaction_list[1] = transfer
+                block = blocks.Block(header=block.header, transactions=transaction_list)
+
+            blockchain.append(block_hash, block)
+
+        results = []
+
+        for block_verifier in [None, verifier]:
+            genesis_blockchain = blocks.Blockchain(
+                chain=blockchain.chain[:1], blocks=blockchain.blocks
+            )
+            balance = balances.init_balance(genesis_blockchain, keychain)
+            is_valid, balance = balances.validate_blockchain(
+                blockchain, balance, block_verifier
+            )
+            results.append((is_valid, balance and dict(balance.accounts)))
+
+        assert results[0] == results[1]
+        assert results[0][0] == (invalid_index is None)
+
+        # Include check on no signatures left running on the process pool.
+        assert all(result.ready() for result, _ in submissions)
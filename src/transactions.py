@@ -1,4 +1,4 @@
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple, Union
 import dataclasses
 import hashlib
 
@@ -15,18 +15,42 @@ REWARD_SENDER: bytes = (0).to_bytes(HASH_SIZE, byteorder="big")
 REWARD_SIGNATURE: bytes = (0).to_bytes(SIGNATURE_SIZE, byteorder="big")
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True, slots=True)
 class Transaction:
-    """ """
+    """Immutable, with encoding and hash computed once on first use."""
 
     reference_hash: Hash
     sender: Hash
     receiver: Hash
     signature: bytes
+    cached_encoding: Optional[bytes] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+    cached_hash: Optional[Hash] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def encode(self) -> bytes:
+        """ """
+        encoding = self.cached_encoding
+
+        if encoding is None:
+            encoding = (
+                self.reference_hash + self.sender + self.receiver + self.signature
+            )
+            object.__setattr__(self, "cached_encoding", encoding)
+
+        return encoding
 
-    def encode(self):
+    def hash(self) -> Hash:
         """ """
-        return self.reference_hash + self.sender + self.receiver + self.signature
+        transaction_hash = self.cached_hash
+
+        if transaction_hash is None:
+            transaction_hash = hashlib.sha256(self.encode()).digest()
+            object.__setattr__(self, "cached_hash", transaction_hash)
+
+        return transaction_hash
 
 
 def decode_transaction(transaction_bytes: bytes) -> Transaction:
@@ -61,6 +85,68 @@ def decode_transactions(
     return transactions
 
 
+@dataclasses.dataclass(frozen=True, slots=True)
+class TransactionView:
+    """Read-only view of an encoded transaction, with fields copied out only when accessed."""
+
+    buffer: memoryview
+    cached_hash: Optional[Hash] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def reference_hash(self) -> Hash:
+        """ """
+        return bytes(self.buffer[:HASH_SIZE])
+
+    @property
+    def sender(self) -> Hash:
+        """ """
+        return bytes(self.buffer[HASH_SIZE : 2 * HASH_SIZE])
+
+    @property
+    def receiver(self) -> Hash:
+        """ """
+        return bytes(self.buffer[2 * HASH_SIZE : 3 * HASH_SIZE])
+
+    @property
+    def signature(self) -> bytes:
+        """ """
+        return bytes(self.buffer[3 * HASH_SIZE : TRANSACTION_SIZE])
+
+    def encode(self) -> bytes:
+        """ """
+        return bytes(self.buffer)
+
+    def hash(self) -> Hash:
+        """ """
+        transaction_hash = self.cached_hash
+
+        if transaction_hash is None:
+            transaction_hash = hashlib.sha256(self.buffer).digest()
+            object.__setattr__(self, "cached_hash", transaction_hash)
+
+        return transaction_hash
+
+
+AnyTransaction = Union[Transaction, TransactionView]
+
+
+def decode_transactions_view(
+    transaction_counter: int, transactions_buffer: memoryview
+) -> Sequence[AnyTransaction]:
+    """Decode transactions as views over the buffer, without copying."""
+    transactions: List[AnyTransaction] = []
+
+    for i in range(transaction_counter):
+        transaction_buffer = transactions_buffer[
+            i * TRANSACTION_SIZE : (i + 1) * TRANSACTION_SIZE
+        ]
+        transactions.append(TransactionView(buffer=transaction_buffer))
+
+    return transactions
+
+
 def init_reward(receiver: Hash) -> Transaction:
     """ """
     return Transaction(
@@ -71,7 +157,7 @@ def init_reward(receiver: Hash) -> Transaction:
     )
 
 
-def validate_reward(reward: Transaction) -> bool:
+def validate_reward(reward: AnyTransaction) -> bool:
     """ """
     is_valid_reference = reward.reference_hash == REWARD_HASH
     is_valid_sender = reward.sender == REWARD_SENDER
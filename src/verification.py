@@ -0,0 +1,178 @@
+from typing import Deque, List, Optional, OrderedDict, Tuple
+import collections
+import dataclasses
+import functools
+import multiprocessing
+import multiprocessing.pool
+
+import crypto
+import transactions as transacts
+
+
+# Number of signatures checked by a worker at once.
+CHUNK_SIZE: int = 64
+
+# Signature, encoded public key and signed message of a transfer.
+Verification = Tuple[bytes, bytes, bytes]
+
+# Maximum number of verification results kept, i.e. those of a few thousand full blocks.
+CACHE_SIZE: int = 1 << 18
+
+# Transaction hash and address of the sender, which the keychain maps to its public key.
+CacheKey = Tuple[transacts.Hash, transacts.Hash]
+
+# Signatures being checked on the process pool, with the cache keys of their transactions.
+Submission = Tuple[multiprocessing.pool.AsyncResult, List[CacheKey]]
+
+
+@functools.lru_cache(maxsize=1024)
+def load_public_key(public_key_bytes: bytes):
+    """Decode each public key once per worker, as there are few distinct senders."""
+    return crypto.decode_public_key(public_key_bytes)
+
+
+def split_chunks(
+    verifications: List[Verification], chunk_size: int
+) -> List[List[Verification]]:
+    """ """
+    return [
+        verifications[i : i + chunk_size]
+        for i in range(0, len(verifications), chunk_size)
+    ]
+
+
+def verify_chunk(verifications: List[Verification]) -> bool:
+    """ """
+    return all(
+        crypto.verify(signature, load_public_key(public_key_bytes), message)
+        for signature, public_key_bytes, message in verifications
+    )
+
+
+@dataclasses.dataclass
+class Verifier:
+    """ """
+
+    pool: multiprocessing.pool.Pool
+    processes: int
+    chunk_size: int
+
+
+def init_verifier(
+    processes: Optional[int] = None, chunk_size: int = CHUNK_SIZE
+) -> Verifier:
+    """ """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    pool = multiprocessing.Pool(processes)
+
+    return Verifier(pool=pool, processes=processes, chunk_size=chunk_size)
+
+
+def close_verifier(verifier: Verifier):
+    """ """
+    verifier.pool.terminate()
+    verifier.pool.join()
+
+
+def verify_signatures(
+    verifications: List[Verification], verifier: Optional[Verifier] = None
+) -> bool:
+    """Check all signatures, across the process pool of the verifier if provided. Chunks are
+    collected as they finish, so an invalid signature is reported early."""
+    if verifier is None or len(verifications) <= verifier.chunk_size:
+        return verify_chunk(verifications)
+
+    chunks = split_chunks(verifications, verifier.chunk_size)
+
+    return all(verifier.pool.imap_unordered(verify_chunk, chunks))
+
+
+@dataclasses.dataclass
+class Cache:
+    """Results of signature verification, with the least recently used evicted first."""
+
+    results: OrderedDict[CacheKey, bool]
+    size: int
+    hit_counter: int = 0
+    miss_counter: int = 0
+
+
+def init_cache(size: int = CACHE_SIZE) -> Cache:
+    """ """
+    return Cache(results=collections.OrderedDict(), size=size)
+
+
+def lookup_cache(cache: Cache, key: CacheKey) -> Optional[bool]:
+    """ """
+    result = cache.results.get(key)
+
+    if result is None:
+        cache.miss_counter += 1
+        return None
+
+    cache.hit_counter += 1
+    cache.results.move_to_end(key)
+
+    return result
+
+
+def update_cache(cache: Cache, key: CacheKey, result: bool):
+    """ """
+    cache.results[key] = result
+    cache.results.move_to_end(key)
+
+    while len(cache.results) > cache.size:
+        cache.results.popitem(last=False)
+
+
+def compute_hit_rate(cache: Cache) -> float:
+    """ """
+    lookup_counter = cache.hit_counter + cache.miss_counter
+    return cache.hit_counter / lookup_counter if lookup_counter > 0 else 0.0
+
+
+def report_cache(cache: Cache) -> str:
+    """ """
+    return (
+        f"hits={cache.hit_counter} misses={cache.miss_counter} "
+        f"hit_rate={compute_hit_rate(cache):.1%} size={len(cache.results)}/{cache.size}"
+    )
+
+
+def submit_signatures(
+    verifications: List[Verification],
+    verifier: Verifier,
+    keys: Optional[List[CacheKey]] = None,
+) -> Submission:
+    """Start checking signatures on the process pool without waiting, with the result of each
+    chunk available once all have finished."""
+    chunks = split_chunks(verifications, verifier.chunk_size)
+
+    return verifier.pool.map_async(verify_chunk, chunks), keys or []
+
+
+def wait_signatures(
+    pending: Deque[Submission], depth: int = 0, cache: Optional[Cache] = None
+) -> bool:
+    """Wait for the oldest submitted signatures until at most depth are pending, and return
+    False as soon as any is invalid. Valid signatures are recorded in the cache."""
+    while len(pending) > depth:
+        result, keys = pending.popleft()
+
+        if not all(result.get()):
+            return False
+
+        if cache is not None:
+            for key in keys:
+                update_cache(cache, key, True)
+
+    return True
+
+
+def drain_signatures(pending: Deque[Submission]):
+    """Wait for signatures still pending, without using the results."""
+    while pending:
+        result, _ = pending.popleft()
+        result.wait()